@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+    Aktivitas Pengguna
+    ~~~~~~~~~
+
+    ``Pengguna.last_seen``/``last_login`` dan audit ``aktivitas_pengguna``
+    ditulis write-behind: request hanya mencatat ke buffer di memori per
+    proses, tanpa UPDATE dan commit, sehingga request baca tidak menunggu
+    lock tulis (SQLite). Thread background menulis isi buffer setiap
+    ``interval`` detik dalam satu transaksi: ``UPDATE`` executemany per
+    kolom dan ``INSERT`` executemany untuk audit.
+
+    Buffer dibatasi ``max_users`` pengguna dan ``max_events`` event; di
+    atas batas itu catatan dibuang (``dropped``), dan flush dimulai lebih
+    awal saat buffer setengah penuh. Sisa buffer ditulis saat proses
+    berhenti (``atexit``). ``modified`` tidak ikut berubah. Tween mencatat
+    ``unauthenticated_userid`` tanpa query, jadi token pengguna nonaktif
+    ikut masuk buffer; pengguna nonaktif dilewati oleh ``UPDATE``.
+
+    Isi buffer (admin): ``GET /_status/activity``.
+
+    config.yaml::
+
+        activity:
+          enabled: True
+          interval: 5
+          max_users: 10000
+          max_events: 10000
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    activity.py
+"""
+import atexit
+import datetime
+import os
+import threading
+import time
+
+import sqlalchemy
+from baka.log import log
+from baka_tenshi import Model, DB
+
+from CircleApp.encoders import render_json
+from CircleApp.users.model import Pengguna
+
+
+INTERVAL = 5
+MAX_USERS = 10000
+MAX_EVENTS = 10000
+AGENT_LENGTH = 255
+
+
+class AktivitasPengguna(Model):
+    """Audit login/logout pengguna."""
+
+    __tablename__ = u'aktivitas_pengguna'
+
+    user_id = DB.Column('user_id', DB.Integer(), nullable=False, index=True)
+    jenis = DB.Column('jenis', DB.VARCHAR(16), nullable=False)
+    waktu = DB.Column('waktu', DB.DateTime(), nullable=False)
+    alamat = DB.Column('alamat', DB.VARCHAR(45), nullable=True)
+    agen = DB.Column('agen', DB.VARCHAR(AGENT_LENGTH), nullable=True)
+
+
+def _update(column):
+    """``UPDATE`` satu kolom waktu untuk executemany ``{_id, _waktu}``;
+    waktu tidak pernah mundur, pengguna nonaktif dilewati dan ``modified``
+    tidak diubah."""
+    table = column.table
+    return table.update().where(sqlalchemy.and_(
+        table.c.id == sqlalchemy.bindparam('_id'),
+        table.c.aktif_pengguna == sqlalchemy.true(),
+        sqlalchemy.or_(column.is_(None), column < sqlalchemy.bindparam('_waktu')),
+    )).values({
+        column.name: sqlalchemy.bindparam('_waktu'),
+        'modified': table.c.modified,
+    })
+
+
+class ActivityBuffer(object):
+    """Buffer write-behind per proses. Isi buffer diganti utuh saat flush,
+    jadi lock hanya dipegang selama operasi dict/list."""
+
+    def __init__(self, session_factory, interval=INTERVAL,
+                 max_users=MAX_USERS, max_events=MAX_EVENTS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_users = max_users
+        self.max_events = max_events
+        self.flushed = None
+        self.flushes = 0
+        self.rows = 0
+        self.dropped = 0
+        self.errors = 0
+        # user id -> waktu terakhir
+        self._seen = {}
+        self._logins = {}
+        self._events = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def seen(self, user_id, when=None):
+        self._record(user_id, when or datetime.datetime.utcnow())
+
+    def event(self, user_id, kind, request=None, when=None):
+        """Catat event audit ``kind``; ``login`` juga mengisi
+        ``last_login``."""
+        when = when or datetime.datetime.utcnow()
+        address = agent = None
+        if request is not None:
+            address = request.client_addr
+            agent = (request.user_agent or '')[:AGENT_LENGTH] or None
+        row = {
+            'user_id': user_id,
+            'jenis': kind,
+            'waktu': when,
+            'alamat': address,
+            'agen': agent,
+        }
+        self._record(user_id, when, login=kind == 'login', row=row)
+
+    def _record(self, user_id, when, login=False, row=None):
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            targets = (self._seen, self._logins) if login else (self._seen,)
+            for target in targets:
+                if user_id in target or len(target) < self.max_users:
+                    target[user_id] = when
+                else:
+                    self.dropped += 1
+            if row is not None:
+                if len(self._events) < self.max_events:
+                    self._events.append(row)
+                else:
+                    self.dropped += 1
+            full = len(self._seen) * 2 >= self.max_users or \
+                len(self._events) * 2 >= self.max_events
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Tulis isi buffer, return jumlah baris. Jika gagal isi buffer
+        dikembalikan (selama muat) dan exception diteruskan."""
+        with self._lock:
+            seen, logins, events = self._seen, self._logins, self._events
+            self._seen, self._logins, self._events = {}, {}, []
+        if not (seen or logins or events):
+            return 0
+
+        table = Pengguna.__table__
+        session = self.session_factory()
+        try:
+            for column, values in ((table.c.terlihat_terakhir, seen),
+                                   (table.c.login_terakhir, logins)):
+                if values:
+                    session.execute(_update(column), [
+                        {'_id': user_id, '_waktu': when} for user_id, when in values.items()
+                    ])
+            if events:
+                session.execute(AktivitasPengguna.__table__.insert(), events)
+            session.commit()
+        except Exception:
+            self._restore(seen, logins, events)
+            raise
+        finally:
+            session.close()
+
+        rows = len(seen) + len(logins) + len(events)
+        self.flushes += 1
+        self.rows += rows
+        self.flushed = time.time()
+        return rows
+
+    def _restore(self, seen, logins, events):
+        with self._lock:
+            for target, values in ((self._seen, seen), (self._logins, logins)):
+                for user_id, when in values.items():
+                    # catatan di buffer sekarang lebih baru
+                    if user_id in target:
+                        continue
+                    if len(target) < self.max_users:
+                        target[user_id] = when
+                    else:
+                        self.dropped += 1
+            room = max(0, self.max_events - len(self._events))
+            self._events[:0] = events[:room]
+            self.dropped += len(events) - len(events[:room])
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception:
+            log.exception('activity: flush saat berhenti gagal')
+
+    def _start(self):
+        # thread tidak ikut ke proses hasil fork, mulai lagi per pid; isi
+        # buffer proses induk sudah (atau akan) ditulis oleh induknya
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self._seen, self._logins, self._events = {}, {}, []
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='activity')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.errors += 1
+                log.exception('activity: flush gagal')
+
+    def stats(self):
+        return {
+            'users': len(self._seen),
+            'logins': len(self._logins),
+            'events': len(self._events),
+            'flushes': self.flushes,
+            'rows': self.rows,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'flushed': self.flushed,
+        }
+
+
+def record(request, kind, user_id=None):
+    """Catat event ``kind`` untuk ``user_id`` (default pengguna request)."""
+    buffer = request.registry.get('activity')
+    if user_id is None:
+        user_id = request.unauthenticated_userid
+    if buffer is not None and user_id is not None:
+        buffer.event(user_id, kind, request)
+
+
+def activity_tween_factory(handler, registry):
+    buffer = registry['activity']
+
+    def activity_tween(request):
+        response = handler(request)
+        user_id = request.unauthenticated_userid
+        if user_id is not None:
+            buffer.seen(user_id)
+        return response
+
+    return activity_tween
+
+
+def status_activity(request):
+    buffer = request.registry.get('activity')
+    return render_json(request, buffer.stats() if buffer is not None else {'enabled': False})
+
+
+def includeme(config):
+    settings = config.get_settings().get('activity') or {}
+    config.add_route('status_activity', '/_status/activity')
+    config.add_view(status_activity, route_name='status_activity', permission='admin')
+    if not settings.get('enabled', True):
+        return
+
+    buffer = ActivityBuffer(
+        config.registry['db_session'],
+        settings.get('interval', INTERVAL),
+        settings.get('max_users', MAX_USERS),
+        settings.get('max_events', MAX_EVENTS))
+    config.registry['activity'] = buffer
+    atexit.register(buffer.close)
+    # di luar pyramid_tm: tidak menambah tulis ke transaksi request
+    config.add_tween('CircleApp.activity.activity_tween_factory',
+                     over='pyramid_tm.tm_tween_factory')
@@ -1,13 +1,22 @@
+from CircleApp import startup
 from baka import Baka
 from baka.log import log
 from baka.settings import EnvSetting, database_url
 from baka_tenshi.config import CONFIG as tenshi
 from baka_armor.config import CONFIG as armor
 
+from CircleApp.config import CONFIG as circle
+
 
 ENV = [
     EnvSetting('url', 'DATABASE_URL', type=database_url),
-    EnvSetting('sqlalchemy.url', 'DATABASE_URL', type=database_url)
+    EnvSetting('sqlalchemy.url', 'DATABASE_URL', type=database_url),
+    EnvSetting('jobs.database', 'JOBS_DATABASE'),
+    EnvSetting('startup.mode', 'STARTUP_MODE'),
+    EnvSetting('profiling.secret', 'PROFILING_SECRET'),
+    EnvSetting('auth.secret', 'AUTH_SECRET'),
+    EnvSetting('reset.secret', 'RESET_SECRET'),
+    EnvSetting('session.secret', 'SESSION_SECRET'),
 ]
 options = {
     'LOGGING': True,
@@ -15,17 +24,35 @@ options = {
     'env': ENV
 }
 
+startup.mark('import')
+
 app = Baka(__name__, **options)
+startup.mark('baka')
 
-app.config.add_config_validator(tenshi.merge(armor))
-app.include('baka_tenshi')
-app.include('baka_armor')
+app.config.add_config_validator(tenshi.merge(armor).merge(circle))
+# config.yaml dibaca sebelum baka_tenshi supaya section tenshi terpakai
+app.config.get_settings_validator()
+app.include('CircleApp.startup')
+app.include('CircleApp.logs')
+app.include('CircleApp.limiter')
+app.include('CircleApp.profiling')
+app.include('CircleApp.db')
+app.include('CircleApp.auth')
+app.include('CircleApp.activity')
+app.include('CircleApp.assets')
+app.include('CircleApp.jobs')
+app.include('CircleApp.templating')
+app.include('CircleApp.pagecache')
+app.include('CircleApp.querycache')
+app.include('CircleApp.warmup')
+startup.mark('include')
 
 
 
 
 # modular aplikasi
 app.include('CircleApp.users')
+startup.mark('modules')
 
 @app.route('/', renderer='CircleApp:templates/index.html')
 def HomePage(request):
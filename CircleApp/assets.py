@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+    Assets
+    ~~~~~~~~~
+
+    Pengganti ``config.include('baka_armor')`` dengan setup yang ditunda:
+    environment webassets (termasuk membaca ``assets.yaml``) baru dibuat
+    saat pertama dipakai template, dan renderer template didaftarkan lewat
+    :mod:`CircleApp.templating` yang baru meng-import Mako/plim saat
+    template pertama dirender. Static view dan helper ``ui`` sama dengan
+    baka_armor.
+
+    Salinan ``includeme`` dari ``baka_armor`` dan ``baka_armor.assets``
+    versi ``BAKA_ARMOR_VERSION`` (0.1.dev1). Include baka_armor tidak
+    bisa dipakai: ``baka_armor.assets`` selalu meng-import pyramid_mako
+    dan plim (~300 ms startup) dan mendaftarkan renderer ``.html`` yang
+    bentrok dengan :mod:`CircleApp.templating`. Cocokkan ulang modul ini
+    setiap baka_armor di-upgrade; test gagal jika versinya berbeda.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    assets.py
+"""
+import fileinput
+import os
+import threading
+import time
+from contextlib import closing
+
+from pyramid.path import AssetResolver
+from pyramid.settings import asbool
+from pyramid.static import QueryStringConstantCacheBuster
+
+#: versi baka_armor yang ``includeme``-nya disalin modul ini
+BAKA_ARMOR_VERSION = '0.1.dev1'
+
+_lock = threading.Lock()
+
+
+def _spec(egg, path):
+    if ':' in path:
+        return path
+    return '{}:{}'.format(egg, path)
+
+
+def _abspath(spec):
+    if os.path.isabs(spec) or ':' not in spec:
+        return spec
+    return AssetResolver().resolve(spec).abspath()
+
+
+def create_environment(settings):
+    """Environment webassets dari section ``armor``, sama dengan
+    ``baka_armor.includeme``."""
+    import six
+    from baka_armor import Environment
+    from webassets.loaders import YAMLLoader
+
+    egg = settings.get('package', 'baka')
+    armors = settings.get('armor', {})
+    config_dir = _abspath(_spec(egg, armors.get('config')))
+    asset_dir = _abspath(_spec(egg, armors.get('assets')))
+
+    env = Environment(directory=asset_dir, url=armors.get('url', 'static'))
+    env.manifest = armors.get('manifest', 'file')
+    env.debug = asbool(armors.get('debug', False))
+    env.cache = asbool(armors.get('cache', False))
+    env.auto_build = asbool(armors.get('auto_build', True))
+
+    filename = os.path.join(config_dir, armors.get('bundles', 'assets.yaml'))
+    with closing(fileinput.input(filename)) as fin:
+        stream = six.StringIO('\n'.join(line.rstrip() for line in fin))
+    env.register(YAMLLoader(stream).load_bundles())
+    return env
+
+
+def get_environment(registry):
+    """Environment webassets milik ``registry``, dibuat sekali saat
+    pertama dipanggil."""
+    env = registry.get('web_env')
+    if env is None:
+        with _lock:
+            env = registry.get('web_env')
+            if env is None:
+                env = registry['web_env'] = create_environment(registry.settings)
+    return env
+
+
+def includeme(config):
+    settings = config.get_settings()
+    egg = settings.get('package', 'baka')
+    armors = settings.get('armor', {})
+    ext = armors.get('ext', '.html')
+
+    config.include('baka_armor.ui')
+
+    config.add_static_view('css', '{egg}:public/css'.format(egg=egg), cache_max_age=3600)
+    config.add_static_view('js', '{egg}:public/js'.format(egg=egg), cache_max_age=3600)
+    config.add_static_view('fonts', '{egg}:public/fonts'.format(egg=egg), cache_max_age=3600)
+    config.add_static_view(armors.get('url', 'static'),
+                           '{egg}:public'.format(egg=egg),
+                           cache_max_age=3600)
+    config.add_cache_buster('public', QueryStringConstantCacheBuster(
+        str(int(time.time()))))
+
+    def _get_assets(request, *args, **kwargs):
+        from webassets import Bundle
+        bundle = Bundle(*args, **kwargs)
+        with bundle.bind(get_environment(request.registry)):
+            return bundle.urls()
+    config.add_request_method(_get_assets, 'web_assets')
+
+    config.add_request_method(
+        lambda request: get_environment(request.registry), 'web_env', reify=True)
+
+    def _add_assets_global(event):
+        # hanya untuk template, bukan renderer json
+        request = event.get('request')
+        if request is not None and event.get('renderer_name', '').endswith(ext):
+            event['web_env'] = get_environment(request.registry)
+    config.add_subscriber(_add_assets_global, 'pyramid.events.BeforeRender')
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+    Auth
+    ~~~~~~~~~
+
+    Login tanpa session store. Mode ``token`` (default) menyimpan token
+    :mod:`CircleApp.tokens` di cookie ``circle_auth`` (atau header
+    ``Authorization: Bearer``) berisi id pengguna (``sub``), versi izin
+    (``pv``) dan id token (``jti``). Verifikasi hanya HMAC dengan key yang
+    di-cache dan lookup ke set pencabutan di memori, tanpa I/O, sehingga
+    berlaku di semua worker tanpa session bersama.
+
+    Token dicabut lewat tabel ``pencabutan_sesi``:
+
+    * logout mencabut satu ``jti``
+    * ganti kata kunci menaikkan ``Pengguna.permissions_version``, semua
+      token dengan versi lebih lama ditolak
+
+    Baris yang belum kedaluwarsa dimuat ulang ke memori setiap
+    ``sync_interval`` detik oleh thread background; pencabutan dari proses
+    ini langsung berlaku setelah commit. CSRF memakai cookie
+    (``CookieCSRFStoragePolicy``), bukan session.
+
+    Token ditandatangani dengan ``AUTH_SECRET`` (environment); mode
+    ``token`` menolak start jika secret itu tidak di-set.
+
+    Mode ``session`` memakai ``SessionAuthenticationPolicy`` Pyramid dengan
+    session cookie bertanda tangan ``SESSION_SECRET`` (environment) dan
+    serializer JSON, bukan session bawaan Baka (secret ``sekret`` dan
+    pickle); mode ini juga menolak start tanpa secret.
+
+    Pengguna dengan ``Pengguna.is_admin`` mendapat principal
+    ``group:admin`` dan permission ``admin`` (dibaca dari database saat
+    permission diperiksa, jadi mencabut admin langsung berlaku)::
+
+        DATABASE_URL=... python -m CircleApp.auth admin budi
+        DATABASE_URL=... python -m CircleApp.auth admin budi --revoke
+
+    config.yaml::
+
+        auth:
+          mode: token
+          max_age: 604800
+          sync_interval: 30
+          secure: True
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    auth.py
+"""
+import argparse
+import datetime
+import os
+import threading
+import time
+import uuid
+
+import sqlalchemy
+from baka.log import log
+from baka.settings import database_url
+from baka_tenshi import Model, DB
+from pyramid.authentication import CallbackAuthenticationPolicy, SessionAuthenticationPolicy
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.csrf import CookieCSRFStoragePolicy
+from pyramid.events import ApplicationCreated
+from pyramid.interfaces import IAuthenticationPolicy
+from pyramid.security import Allow
+from pyramid.session import JSONSerializer, SignedCookieSessionFactory
+from sqlalchemy.orm import Session, object_session
+from webob.cookies import make_cookie
+from zope.interface import implementer
+
+from CircleApp import tokens
+from CircleApp.users.model import Pengguna
+
+
+PURPOSE = 'login'
+COOKIE = 'circle_auth'
+MAX_AGE = 7 * 24 * 60 * 60
+SYNC_INTERVAL = 30
+ADMIN = 'group:admin'
+
+
+class PencabutanSesi(Model):
+    """Token login yang dicabut: satu token (``jti``), atau semua token
+    pengguna ``user_id`` dengan versi izin di bawah ``versi``."""
+
+    __tablename__ = u'pencabutan_sesi'
+
+    user_id = DB.Column('user_id', DB.Integer(), nullable=True)
+    versi = DB.Column('versi', DB.Integer(), nullable=True)
+    jti = DB.Column('jti', DB.VARCHAR(32), nullable=True)
+    #: setelah waktu ini token yang dicabut sudah kedaluwarsa sendiri
+    kedaluwarsa = DB.Column('kedaluwarsa', DB.DateTime(), nullable=False, index=True)
+
+
+class Revocations(object):
+    """Set pencabutan di memori. Dict diganti utuh saat sync, pembaca tidak
+    perlu lock."""
+
+    def __init__(self, session_factory, interval=SYNC_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.synced = None
+        self.errors = 0
+        # jti -> kedaluwarsa, user id -> (versi, kedaluwarsa)
+        self._tokens = {}
+        self._versions = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def revoked(self, payload):
+        if self._pid != os.getpid():
+            self._start()
+        if payload.get('jti') in self._tokens:
+            return True
+        version = self._versions.get(payload.get('sub'))
+        return version is not None and payload.get('pv', 0) < version[0]
+
+    def add(self, rows):
+        with self._lock:
+            tokens, versions = dict(self._tokens), dict(self._versions)
+            _merge(tokens, versions, rows)
+            self._tokens, self._versions = tokens, versions
+
+    def sync(self):
+        table = PencabutanSesi.__table__
+        now = datetime.datetime.utcnow()
+        session = self.session_factory()
+        try:
+            rows = session.execute(
+                sqlalchemy.select([table.c.user_id, table.c.versi, table.c.jti,
+                                   table.c.kedaluwarsa])
+                .where(table.c.kedaluwarsa > now)
+            ).fetchall()
+            session.execute(table.delete().where(table.c.kedaluwarsa <= now))
+            session.commit()
+        finally:
+            session.close()
+
+        tokens, versions = {}, {}
+        _merge(tokens, versions, [dict(row) for row in rows])
+        with self._lock:
+            self._tokens, self._versions = tokens, versions
+        self.synced = time.time()
+
+    def _start(self):
+        # thread tidak ikut ke proses hasil fork, mulai lagi per pid
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='auth-revocations')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sync()
+            except Exception:
+                self.errors += 1
+                log.exception('auth: sync pencabutan sesi gagal')
+
+    def stats(self):
+        return {
+            'tokens': len(self._tokens),
+            'users': len(self._versions),
+            'synced': self.synced,
+            'errors': self.errors,
+        }
+
+
+def _merge(tokens, versions, rows):
+    for row in rows:
+        if row.get('jti'):
+            tokens[row['jti']] = row['kedaluwarsa']
+        if row.get('user_id') is not None and row.get('versi') is not None:
+            current = versions.get(row['user_id'])
+            if current is None or current[0] < row['versi']:
+                versions[row['user_id']] = (row['versi'], row['kedaluwarsa'])
+
+
+@implementer(IAuthenticationPolicy)
+class TokenAuthenticationPolicy(CallbackAuthenticationPolicy):
+
+    def __init__(self, secret, revocations, max_age=MAX_AGE, cookie_name=COOKIE,
+                 secure=False, callback=None):
+        self.secret = secret
+        self.revocations = revocations
+        self.max_age = max_age
+        self.cookie_name = cookie_name
+        self.secure = secure
+        self.callback = callback
+
+    def payload(self, request):
+        """Payload token request yang valid dan tidak dicabut, atau
+        ``None``. Hasilnya disimpan di environ."""
+        environ = request.environ
+        if 'circleapp.auth' not in environ:
+            token = request.cookies.get(self.cookie_name)
+            header = request.headers.get('Authorization', '')
+            if header.startswith('Bearer '):
+                token = header[len('Bearer '):]
+            payload = tokens.unsign(token, self.secret, PURPOSE) if token else None
+            if payload is not None and self.revocations.revoked(payload):
+                payload = None
+            environ['circleapp.auth'] = payload
+        return environ['circleapp.auth']
+
+    def unauthenticated_userid(self, request):
+        payload = self.payload(request)
+        return payload.get('sub') if payload else None
+
+    def remember(self, request, userid, permissions_version=0, **kw):
+        token = tokens.sign({
+            'sub': userid,
+            'pv': permissions_version,
+            'jti': uuid.uuid4().hex,
+        }, self.secret, PURPOSE, self.max_age)
+        return [('Set-Cookie', make_cookie(
+            self.cookie_name, token, max_age=self.max_age, secure=self.secure,
+            httponly=True, samesite='Lax'))]
+
+    def forget(self, request):
+        payload = self.payload(request)
+        if payload is not None:
+            row = {
+                'jti': payload['jti'],
+                'kedaluwarsa': datetime.datetime.utcfromtimestamp(payload['exp']),
+            }
+            request.db.add(PencabutanSesi(**row))
+            request.db.info.setdefault('revocations', []).append(row)
+        return [('Set-Cookie', make_cookie(
+            self.cookie_name, None, secure=self.secure, httponly=True, samesite='Lax'))]
+
+
+def track_versions(revocations, max_age):
+    """Catat pencabutan setiap ``Pengguna.permissions_version`` naik, dan
+    terapkan ke ``revocations`` setelah commit."""
+    table = PencabutanSesi.__table__
+
+    def _after_update(mapper, connection, target):
+        if not sqlalchemy.inspect(target).attrs.permissions_version.history.has_changes():
+            return
+        row = {
+            'user_id': target.id,
+            'versi': target.permissions_version,
+            'kedaluwarsa': datetime.datetime.utcnow() + datetime.timedelta(seconds=max_age),
+        }
+        connection.execute(table.insert(), row)
+        object_session(target).info.setdefault('revocations', []).append(row)
+
+    def _after_commit(session):
+        rows = session.info.pop('revocations', None)
+        if rows:
+            revocations.add(rows)
+
+    sqlalchemy.event.listen(Pengguna, 'after_update', _after_update)
+    sqlalchemy.event.listen(Session, 'after_commit', _after_commit)
+    sqlalchemy.event.listen(
+        Session, 'after_soft_rollback',
+        lambda session, previous: session.info.pop('revocations', None))
+
+
+class Root(object):
+    """Root context: permission ``admin`` hanya untuk ``group:admin``."""
+
+    __acl__ = [(Allow, ADMIN, 'admin')]
+
+    def __init__(self, request):
+        self.request = request
+
+
+def groupfinder(userid, request):
+    """Callback policy: ``None`` jika pengguna tidak ada lagi atau
+    nonaktif, selain itu principal tambahannya."""
+    row = request.db.query(Pengguna.is_admin, Pengguna.active).filter(
+        Pengguna.id == userid).first()
+    if row is None or not row.active:
+        return None
+    return [ADMIN] if row.is_admin else []
+
+
+def set_admin(connection, username, admin=True):
+    """Beri (atau cabut) admin ``username``, return jumlah baris."""
+    table = Pengguna.__table__
+    return connection.execute(
+        table.update().where(table.c.nama_pengguna == username).values(admin_pengguna=admin)
+    ).rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Admin pengguna')
+    parser.add_argument('command', choices=['admin'])
+    parser.add_argument('username')
+    parser.add_argument('--revoke', action='store_true', help=u'cabut admin')
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL'),
+                        help=u'database url, default $DATABASE_URL')
+    args = parser.parse_args(argv)
+
+    engine = sqlalchemy.create_engine(database_url(args.url))
+    with engine.begin() as connection:
+        if not set_admin(connection, args.username, not args.revoke):
+            parser.error('pengguna {} tidak ditemukan'.format(args.username))
+    print('{}: admin {}'.format(args.username, 'dicabut' if args.revoke else 'diberikan'))
+
+
+def includeme(config):
+    settings = config.get_settings()
+    auth = settings.get('auth') or {}
+    config.set_root_factory(Root)
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    if auth.get('mode', 'token') == 'session':
+        secret = tokens.configured_secret(settings, 'session.secret', 'SESSION_SECRET')
+        config.set_session_factory(SignedCookieSessionFactory(
+            secret, secure=auth.get('secure', False), httponly=True,
+            samesite='Lax', serializer=JSONSerializer()))
+        config.set_authentication_policy(SessionAuthenticationPolicy(callback=groupfinder))
+        return
+
+    # bukan ``secret_key``: Baka mengisinya dengan default yang diketahui
+    secret = tokens.configured_secret(settings, 'auth.secret', 'AUTH_SECRET')
+    max_age = auth.get('max_age', MAX_AGE)
+    revocations = Revocations(config.registry['db_session'],
+                              auth.get('sync_interval', SYNC_INTERVAL))
+    track_versions(revocations, max_age)
+    config.registry['auth_revocations'] = revocations
+    config.set_authentication_policy(TokenAuthenticationPolicy(
+        secret, revocations, max_age,
+        secure=auth.get('secure', False), callback=groupfinder))
+    config.set_csrf_storage_policy(CookieCSRFStoragePolicy(
+        secure=auth.get('secure', False), httponly=True))
+
+    def _initial_sync(event):
+        try:
+            revocations.sync()
+        except sqlalchemy.exc.SQLAlchemyError:
+            log.warning('auth: tabel pencabutan_sesi belum ada, '
+                        'jalankan python -m CircleApp.migrations upgrade')
+
+    config.add_subscriber(_initial_sync, ApplicationCreated)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,83 @@
+import trafaret as T
 from baka_tenshi.config import CONFIG as tenshi
 from baka_armor.config import CONFIG as armor
 
 
+# section config.yaml milik CircleApp, di-merge dengan tenshi dan armor
+CONFIG = T.Dict({
+    T.Key('activity', optional=True):
+        T.Dict({
+            T.Key('enabled', default=True, optional=True): T.Bool(),
+            T.Key('interval', default=5, optional=True): T.Float(gt=0),
+            T.Key('max_users', default=10000, optional=True): T.Int(gte=1),
+            T.Key('max_events', default=10000, optional=True): T.Int(gte=1),
+        }),
+    T.Key('auth', optional=True):
+        T.Dict({
+            T.Key('mode', default='token', optional=True): T.Enum('token', 'session'),
+            T.Key('max_age', default=7 * 24 * 60 * 60, optional=True): T.Int(gte=1),
+            T.Key('sync_interval', default=30, optional=True): T.Float(gt=0),
+            T.Key('secure', default=False, optional=True): T.Bool(),
+        }),
+    T.Key('startup', optional=True):
+        T.Dict({
+            T.Key('mode', default='development', optional=True):
+                T.Enum('development', 'production'),
+        }),
+    T.Key('limiter', optional=True):
+        T.Dict({
+            T.Key('enabled', default=True, optional=True): T.Bool(),
+            T.Key('retry_after', default=5, optional=True): T.Int(gte=0),
+            T.Key('classes', optional=True): T.Mapping(
+                T.Enum('read', 'write', 'auth'),
+                T.Dict({
+                    T.Key('limit', optional=True): T.Int(gte=1),
+                    T.Key('queue', optional=True): T.Int(gte=0),
+                    T.Key('timeout', optional=True): T.Float(gte=0),
+                })),
+        }),
+    T.Key('logging', optional=True):
+        T.Dict({
+            T.Key('queue_size', default=10000, optional=True): T.Int(gte=1),
+            T.Key('json', default=True, optional=True): T.Bool(),
+            T.Key('sample', optional=True): T.Mapping(T.String(), T.Float(gte=0, lte=1)),
+            T.Key('rate_limit', optional=True): T.Mapping(T.String(), T.Float(gt=0)),
+            T.Key('redact', optional=True): T.List(T.String()),
+        }),
+    T.Key('page_cache', optional=True):
+        T.Dict({
+            T.Key('enabled', default=True, optional=True): T.Bool(),
+            T.Key('max_bytes', default=8 * 1024 * 1024, optional=True): T.Int(gte=0),
+        }),
+    T.Key('profiling', optional=True):
+        T.Dict({
+            T.Key('enabled', default=False, optional=True): T.Bool(),
+            T.Key('sample_rate', default=0, optional=True): T.Float(gte=0, lte=1),
+            T.Key('directory', optional=True): T.String(),
+        }),
+    T.Key('query_cache', optional=True):
+        T.Dict({
+            T.Key('enabled', default=True, optional=True): T.Bool(),
+            T.Key('max_entries', default=512, optional=True): T.Int(gte=0),
+            T.Key('ttl', default=30, optional=True): T.Int(gte=0),
+        }),
+    T.Key('templates', optional=True):
+        T.Dict({
+            T.Key('module_directory', optional=True): T.String(),
+            T.Key('filesystem_checks', optional=True): T.Bool(),
+        }),
+    T.Key('warmup', optional=True):
+        T.Dict({
+            T.Key('enabled', default=True, optional=True): T.Bool(),
+            T.Key('background', default=True, optional=True): T.Bool(),
+            T.Key('pool', default=5, optional=True): T.Int(gte=0),
+            T.Key('replay', optional=True): T.List(T.String()),
+        }),
+})
+
+
 def includeme(config):
     # untuk config env baka-tenshi
     config.add_config_validator(yaml=armor)
     config.add_config_validator(yaml=tenshi)
+    config.add_config_validator(yaml=CONFIG)
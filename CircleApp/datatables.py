@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+    DataTables
+    ~~~~~~~~~
+
+    Adapter server-side processing DataTables untuk :class:`QueryBuilder`.
+    Parameter ``draw/start/length/order/search/columns`` dari DataTables
+    diterjemahkan ke sorting, filtering dan paging QueryBuilder, dan baris
+    dibaca lewat jalur read only :meth:`QueryBuilder.get_collection_rows`
+    (termasuk query cache)::
+
+        builder = DataTablesQuery(request, user)
+        return render_json(request, builder.response())
+
+    ``recordsTotal`` dihitung sekali per versi tabel (query cache), dan
+    tanpa pencarian ``recordsFiltered`` memakai count yang sama.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    datatables.py
+"""
+import re
+
+import sqlalchemy
+from pyramid.httpexceptions import HTTPBadRequest
+
+from CircleApp.jsonapi import QueryBuilder
+from CircleApp.utils import model_fields
+
+
+def _escape_like(value):
+    return re.sub(r'([\\%_])', r'\\\1', value)
+
+
+class DataTablesQuery(QueryBuilder):
+
+    def __init__(self, request, model, collection_name=None, include_archived=False):
+        super(DataTablesQuery, self).__init__(
+            request, model, collection_name, include_archived)
+        self.info = self.datatables_info(request.params)
+
+    @staticmethod
+    def datatables_info(params):
+        '''Parse DataTables server-side parameters.
+
+        Returns:
+            dict: ``draw``, ``start``, ``length``, ``search``, ``columns``
+            (list of dicts with ``data``, ``searchable``, ``orderable``,
+            ``search``) and ``order`` (list of ``(column index, asc)``).
+
+        Raises:
+            HTTPBadRequest
+        '''
+        try:
+            info = {
+                'draw': int(params.get('draw', 0)),
+                'start': max(0, int(params.get('start', 0))),
+                'length': int(params.get('length', 10)),
+                'search': params.get('search[value]', ''),
+            }
+            columns = []
+            while 'columns[{}][data]'.format(len(columns)) in params:
+                prefix = 'columns[{}]'.format(len(columns))
+                columns.append({
+                    'data': params.get(prefix + '[data]'),
+                    'searchable': params.get(prefix + '[searchable]', 'true') == 'true',
+                    'orderable': params.get(prefix + '[orderable]', 'true') == 'true',
+                    'search': params.get(prefix + '[search][value]', ''),
+                })
+            order = []
+            while 'order[{}][column]'.format(len(order)) in params:
+                prefix = 'order[{}]'.format(len(order))
+                order.append((
+                    int(params.get(prefix + '[column]')),
+                    params.get(prefix + '[dir]', 'asc') != 'desc',
+                ))
+        except ValueError:
+            raise HTTPBadRequest('Invalid DataTables parameters.')
+        info['columns'] = columns
+        info['order'] = order
+        return info
+
+    def _column(self, index):
+        columns = self.info['columns']
+        if not 0 <= index < len(columns):
+            return None
+        key = columns[index]['data']
+        if key not in model_fields(self.model):
+            return None
+        return getattr(self.model, key)
+
+    def _searchable(self, column):
+        return column is not None and isinstance(column.type, sqlalchemy.String)
+
+    def filter_clauses(self):
+        '''``filter[...]`` parameters plus DataTables global search (any
+        searchable text column contains the value) and per column search.
+        '''
+        clauses = super(DataTablesQuery, self).filter_clauses()
+        search = self.info['search']
+        if search:
+            pattern = '%{}%'.format(_escape_like(search.lower()))
+            matches = [
+                sqlalchemy.func.lower(column).like(pattern, escape='\\')
+                for column in (
+                    self._column(i) for i, c in enumerate(self.info['columns'])
+                    if c['searchable'])
+                if self._searchable(column)
+            ]
+            clauses.append(sqlalchemy.or_(*matches) if matches else sqlalchemy.false())
+
+        for i, c in enumerate(self.info['columns']):
+            column = self._column(i)
+            if c['searchable'] and c['search'] and self._searchable(column):
+                clauses.append(sqlalchemy.func.lower(column).like(
+                    '%{}%'.format(_escape_like(c['search'].lower())), escape='\\'))
+        return clauses
+
+    def sort_clauses(self):
+        clauses = []
+        for index, ascending in self.info['order']:
+            column = self._column(index)
+            if column is None or not self.info['columns'][index]['orderable']:
+                continue
+            clauses.append(column if ascending else column.desc())
+        # urutan stabil untuk paging
+        clauses.append(self.key_column)
+        return clauses
+
+    def pagination(self, count):
+        length = self.info['length']
+        limit = self.max_limit if length < 0 else min(length, self.max_limit)
+        return limit, self.info['start'], {
+            'total': count,
+            'page': self.info['start'],
+            'pageSize': limit,
+        }
+
+    def query_key(self, expose_fields=None):
+        info = self.info
+        return (
+            super(DataTablesQuery, self).query_key(expose_fields),
+            'datatables', info['start'], info['length'], info['search'],
+            tuple((c['data'], c['searchable'], c['orderable'], c['search'])
+                  for c in info['columns']),
+            tuple(info['order']),
+        )
+
+    def records_total(self):
+        '''Jumlah seluruh baris tanpa filter, di-cache per versi tabel.'''
+        source, tables, _ = self.collection_source()
+
+        def count():
+            return self.session.execute(
+                sqlalchemy.select([sqlalchemy.func.count()]).select_from(source)
+            ).scalar()
+
+        cache = self.request.registry.get('query_cache')
+        if cache is None:
+            return count()
+        return cache.get_or_set(
+            ('records_total', tables, cache.version(*tables)), count)
+
+    def response(self, expose_fields=None):
+        '''Body JSON untuk DataTables: ``draw``, ``recordsTotal``,
+        ``recordsFiltered`` dan ``data``.'''
+        data, pagination = self.get_collection_rows(expose_fields)
+        filtered = pagination['total']
+        return {
+            'draw': self.info['draw'],
+            # tanpa filter total sama dengan count hasil filter
+            'recordsTotal': self.records_total() if self.filter_clauses() else filtered,
+            'recordsFiltered': filtered,
+            'data': data,
+        }
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+    DB Session
+    ~~~~~~~~~
+
+    ``request.db`` yang lazy, menggantikan request method milik
+    baka_tenshi. ``request.db`` berupa proxy; session SQLAlchemy (dan
+    registrasinya ke transaksi ``pyramid_tm``) baru dibuat pada akses
+    atribut pertama, dan koneksi baru diambil dari pool saat query pertama.
+    Route yang tidak memakai database (``HomePage``, form login dan
+    register) tidak pernah membuat session maupun checkout koneksi.
+
+    Session tanpa perubahan (tidak ada flush, bulk update/delete atau
+    ``mark_changed``) ditutup oleh zope.sqlalchemy tanpa ``COMMIT``, jadi
+    request read only hanya mengembalikan koneksi ke pool.
+
+    Jumlah request dengan dan tanpa checkout (admin): ``GET /_status/db``.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    db.py
+"""
+import threading
+
+import sqlalchemy
+import zope.sqlalchemy
+from baka_tenshi import get_tm_session
+from sqlalchemy.orm import Session
+
+from CircleApp.encoders import render_json
+
+
+class LazySession(object):
+    """Proxy session untuk ``request.db``."""
+
+    def __init__(self, request):
+        self._request = request
+        self._session = None
+
+    def _get(self):
+        if self._session is None:
+            request = self._request
+            self._session = get_tm_session(request.registry['db_session'], request)
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __contains__(self, instance):
+        return instance in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+
+def mark_changed(session):
+    """``zope.sqlalchemy.mark_changed`` yang juga menerima ``request.db``,
+    untuk statement Core yang menulis (commit tetap dijalankan)."""
+    if isinstance(session, LazySession):
+        session = session._get()
+    session.info['written'] = True
+    zope.sqlalchemy.mark_changed(session)
+
+
+class SessionStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.no_session = 0
+        self.no_checkout = 0
+        self.read_only = 0
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def record(self, request):
+        proxy = request.__dict__.get('db')
+        session = proxy._session if proxy is not None else None
+        info = session.info if session is not None else {}
+        with self._lock:
+            self.requests += 1
+            if session is None:
+                self.no_session += 1
+            if not info.get('checkout'):
+                self.no_checkout += 1
+            elif info.get('written'):
+                self.written += 1
+            else:
+                self.read_only += 1
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'no_session': self.no_session,
+            'no_checkout': self.no_checkout,
+            'read_only': self.read_only,
+            'written': self.written,
+        }
+
+
+def _track_sessions():
+    def _after_begin(session, transaction, connection):
+        session.info['checkout'] = True
+
+    def _written(session):
+        session.info['written'] = True
+
+    sqlalchemy.event.listen(Session, 'after_begin', _after_begin)
+    sqlalchemy.event.listen(Session, 'after_flush', lambda session, context: _written(session))
+    sqlalchemy.event.listen(Session, 'after_bulk_update', lambda context: _written(context.session))
+    sqlalchemy.event.listen(Session, 'after_bulk_delete', lambda context: _written(context.session))
+
+
+def db_stats_tween_factory(handler, registry):
+    stats = registry['db_stats']
+
+    def db_stats_tween(request):
+        try:
+            return handler(request)
+        finally:
+            stats.record(request)
+
+    return db_stats_tween
+
+
+def status_db(request):
+    return render_json(request, request.registry['db_stats'].stats())
+
+
+def includeme(config):
+    config.include('baka_tenshi')
+    # menimpa ``request.db`` dari baka_tenshi (action dari include ini
+    # menang karena baka_tenshi di-include di dalamnya)
+    config.add_request_method(LazySession, 'db', reify=True)
+
+    _track_sessions()
+    config.registry['db_stats'] = SessionStats()
+    # di luar pyramid_tm: session sudah ditutup saat dihitung
+    config.add_tween('CircleApp.db.db_stats_tween_factory',
+                     over='pyramid_tm.tm_tween_factory')
+    config.add_route('status_db', '/_status/db')
+    config.add_view(status_db, route_name='status_db', permission='admin')
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+    JSON Encoder
+    ~~~~~~~~~
+
+    Encoder JSON untuk response API. Memakai ``orjson`` jika terinstall,
+    yang menangani datetime dan UUID secara native, selain itu kembali ke
+    ``json`` bawaan. Hasil encode selalu ``bytes`` dan langsung ditulis ke
+    body response tanpa melalui renderer.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    encoders.py
+"""
+import json
+import uuid
+from datetime import datetime, date, time
+from decimal import Decimal
+
+from baka._compat import text_type
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, (Decimal, uuid.UUID)):
+        return text_type(o)
+    if hasattr(o, 'serialize'):
+        return o.serialize()
+    raise TypeError('{!r} is not JSON serializable'.format(o))
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(
+        obj, default=_default, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, default=_default)
+
+
+ENCODERS = {
+    'json': _stdlib_dumps,
+}
+if orjson is not None:
+    ENCODERS['orjson'] = _orjson_dumps
+
+# urutan prioritas encoder yang dipakai jika tersedia
+PREFERRED = ('orjson', 'json')
+
+_encoder = None
+
+
+def register_encoder(name, dumps):
+    """Tambah encoder, ``dumps(obj)`` harus mengembalikan ``bytes``."""
+    ENCODERS[name] = dumps
+
+
+def use_encoder(name=None):
+    """Pilih encoder berdasarkan nama, atau yang terbaik yang tersedia."""
+    global _encoder
+    if name is None:
+        name = next(n for n in PREFERRED if n in ENCODERS)
+    _encoder = ENCODERS[name]
+    return name
+
+
+def dumps(obj):
+    """Encode ``obj`` ke JSON ``bytes``."""
+    if _encoder is None:
+        use_encoder()
+    return _encoder(obj)
+
+
+def render_json(request, value):
+    """Tulis ``value`` sebagai JSON langsung ke ``request.response``.
+
+    View yang mengembalikan hasil fungsi ini melewati renderer ``json``::
+
+        return render_json(request, resp.to_json(_in, data=data))
+    """
+    response = request.response
+    response.content_type = 'application/json'
+    response.charset = 'utf-8'
+    response.body = dumps(value)
+    return response
@@ -9,7 +9,15 @@
 
     forms.py
 """
+import threading
+
 import colander
+from pyramid.csrf import get_csrf_token
+
+# request yang sedang divalidasi, di-set oleh BaseForm.validate
+_local = threading.local()
+# schema yang sudah dibangun, satu instance per kelas schema
+_schemas = {}
 
 
 class SelectEnumInt(colander.String):
@@ -46,18 +54,41 @@ class SelectEnumInt(colander.String):
         return val
 
 
-@colander.deferred
-def csrf_token_validator(node, kw):
-    request = kw.get('request')
+def get_current_request():
+    """Request yang sedang divalidasi oleh :meth:`BaseForm.validate`."""
+    return getattr(_local, 'request', None)
+
+
+class request_validator(object):
+    """Validator that is resolved against the current request at validate
+    time, a replacement for ``colander.deferred`` which needs the schema to
+    be cloned by ``bind`` on every request.
+
+    The wrapped function receives ``(node, value, request)``::
+
+        @request_validator
+        def validator(node, value, request):
+            ...
+    """
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    def __call__(self, node, value):
+        return self.wrapped(node, value, get_current_request())
+
+
+@request_validator
+def _csrf_token(node, value, request):
+    # lewat storage policy CSRF: session, atau cookie pada mode auth token
+    if value != get_csrf_token(request):
+        raise colander.Invalid(
+            node,
+            u'Invalid CSRF token',
+        )
 
-    def validator(_node, value):
-        if value != request.session.get_csrf_token():
-            raise colander.Invalid(
-                _node,
-                u'Invalid CSRF token',
-            )
 
-    return colander.All(colander.Length(max=255), validator, )
+csrf_token_validator = colander.All(colander.Length(max=255), _csrf_token, )
 
 
 class CSRFSchema(colander.Schema):
@@ -86,9 +117,20 @@ class BaseForm(object):
     def __init__(self, request):
         assert self._schema, u'Set _schema class attribute'
         self.request = request
-        self.schema = self._schema().bind(request=self.request)
+        self.schema = self.get_schema()
+
+    @classmethod
+    def get_schema(cls):
+        """Schema dibangun sekali per kelas lalu dipakai ulang, nilai yang
+        bergantung pada request di-resolve saat validate.
+        """
+        schema = _schemas.get(cls._schema)
+        if schema is None:
+            schema = _schemas[cls._schema] = cls._schema()
+        return schema
 
     def validate(self):
+        _local.request = self.request
         try:
             self._controls = self.schema.deserialize(
                 self.request.params.mixed()
@@ -97,6 +139,8 @@ class BaseForm(object):
         except colander.Invalid as e:
             self._errors = e.asdict()
             return False
+        finally:
+            _local.request = None
 
     @property
     def errors(self):
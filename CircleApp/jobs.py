@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+    Antrian Tugas
+    ~~~~~~~~~
+
+    Antrian tugas durable berbasis SQLite untuk pekerjaan lambat (kirim
+    email, notifikasi) supaya view bisa langsung return. Tugas dijalankan
+    oleh worker pool di proses terpisah::
+
+        python -m CircleApp.jobs worker --processes 2
+
+    Tugas yang gagal diulang dengan exponential backoff sampai
+    ``MAX_ATTEMPTS``, lalu ditandai ``gagal``.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    jobs.py
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from baka.log import log
+
+
+DATABASE = 'jobs.db'
+MAX_ATTEMPTS = 5
+# detik, dikali 2 ** percobaan
+BACKOFF = 30
+# tugas yang diambil worker tapi tidak selesai dalam LEASE detik
+# dianggap worker-nya mati dan diambil ulang
+LEASE = 600
+BATCH_SIZE = 50
+POLL_INTERVAL = 1.0
+# modul yang mendaftarkan handler tugas, di-import oleh worker
+TASK_MODULES = ('CircleApp.mail', 'CircleApp.users.arsip')
+
+TASKS = {}
+
+
+def task(name, batch=False):
+    """Daftarkan handler untuk tugas ``name``.
+
+    Handler biasa dipanggil ``handler(payload)`` per tugas. Dengan
+    ``batch=True`` handler dipanggil sekali untuk beberapa tugas sekaligus,
+    ``handler(payloads)``, dan mengembalikan list error (``None`` jika
+    berhasil) sepanjang ``payloads``; tugas yang tidak punya hasil dianggap
+    gagal::
+
+        @task('email', batch=True)
+        def send_batch(payloads):
+            ...
+    """
+    def decorator(wrapped):
+        TASKS[name] = (wrapped, batch)
+        return wrapped
+    return decorator
+
+
+class JobQueue(object):
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS antrian_tugas ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' nama VARCHAR(140) NOT NULL,'
+        ' payload TEXT NOT NULL,'
+        " status VARCHAR(10) NOT NULL DEFAULT 'antri',"
+        ' percobaan INTEGER NOT NULL DEFAULT 0,'
+        ' jadwal REAL NOT NULL,'
+        ' diambil REAL,'
+        ' pekerja VARCHAR(140),'
+        ' kesalahan TEXT,'
+        ' dibuat REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_antrian_tugas_status_jadwal'
+        ' ON antrian_tugas (status, jadwal)',
+    )
+
+    def __init__(self, path=None):
+        self.path = path or DATABASE
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        # satu koneksi per thread, dan tidak boleh dibawa lintas fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            for sql in self.SCHEMA:
+                conn.execute(sql)
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def enqueue(self, name, payload=None, delay=0):
+        """Masukkan tugas ke antrian, return id tugas."""
+        now = time.time()
+        cur = self.conn.execute(
+            'INSERT INTO antrian_tugas (nama, payload, jadwal, dibuat)'
+            ' VALUES (?, ?, ?, ?)',
+            (name, json.dumps(payload), now + delay, now)
+        )
+        return cur.lastrowid
+
+    def claim(self, worker, limit=BATCH_SIZE):
+        """Ambil maksimal ``limit`` tugas yang sudah waktunya dijalankan.
+
+        Returns:
+            list: ``[(id, nama, payload, percobaan), ...]``
+        """
+        now = time.time()
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, nama, payload, percobaan FROM antrian_tugas'
+                " WHERE (status = 'antri' AND jadwal <= ?)"
+                " OR (status = 'jalan' AND diambil < ?)"
+                ' ORDER BY jadwal LIMIT ?',
+                (now, now - LEASE, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE antrian_tugas SET status = 'jalan', diambil = ?,"
+                ' pekerja = ? WHERE id = ?',
+                [(now, worker, row[0]) for row in rows]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [
+            (job_id, name, json.loads(payload), attempts)
+            for job_id, name, payload, attempts in rows
+        ]
+
+    def done(self, job_ids):
+        self.conn.executemany(
+            "UPDATE antrian_tugas SET status = 'selesai' WHERE id = ?",
+            [(job_id,) for job_id in job_ids]
+        )
+
+    def fail(self, job_id, attempts, error):
+        """Jadwalkan ulang dengan backoff, atau tandai ``gagal``."""
+        attempts += 1
+        if attempts >= MAX_ATTEMPTS:
+            status, run_at = 'gagal', time.time()
+        else:
+            status, run_at = 'antri', time.time() + BACKOFF * 2 ** (attempts - 1)
+        self.conn.execute(
+            'UPDATE antrian_tugas SET status = ?, percobaan = ?, jadwal = ?,'
+            ' kesalahan = ? WHERE id = ?',
+            (status, attempts, run_at, repr(error), job_id)
+        )
+
+    def stats(self):
+        """Jumlah tugas per status."""
+        return dict(self.conn.execute(
+            'SELECT status, count(*) FROM antrian_tugas GROUP BY status'
+        ).fetchall())
+
+
+def run_jobs(queue, jobs):
+    """Jalankan tugas hasil :meth:`JobQueue.claim`, dikelompokkan per nama
+    supaya handler batch dipanggil sekali per kelompok."""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job[1], []).append(job)
+
+    for name, group in groups.items():
+        handler, batch = TASKS.get(name, (None, False))
+        if handler is None:
+            errors = [LookupError('No task registered: {}'.format(name))] * len(group)
+        elif batch:
+            try:
+                errors = list(handler([job[2] for job in group]) or ())
+            except Exception as e:
+                errors = [e] * len(group)
+            if len(errors) != len(group):
+                # tugas tanpa hasil gagal, bukan dianggap selesai
+                missing = RuntimeError('Task {} returned {} results for {} jobs'.format(
+                    name, len(errors), len(group)))
+                errors = (errors + [missing] * len(group))[:len(group)]
+        else:
+            errors = []
+            for job in group:
+                try:
+                    handler(job[2])
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+
+        for (job_id, _, _, attempts), error in zip(group, errors):
+            if error is not None:
+                log.warning('tugas %s #%s gagal: %r', name, job_id, error)
+                queue.fail(job_id, attempts, error)
+        queue.done([job[0] for job, error in zip(group, errors) if error is None])
+
+
+def work(path=None, once=False):
+    """Loop worker: ambil tugas, jalankan, ulangi. ``once=True`` berhenti
+    saat antrian kosong."""
+    queue = JobQueue(path)
+    worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+    while True:
+        jobs = queue.claim(worker)
+        if jobs:
+            run_jobs(queue, jobs)
+        elif once:
+            return
+        else:
+            time.sleep(POLL_INTERVAL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Worker antrian tugas')
+    parser.add_argument('command', choices=['worker', 'stats'])
+    parser.add_argument('--database', default=os.environ.get('JOBS_DATABASE', DATABASE))
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--once', action='store_true',
+                        help=u'berhenti saat antrian kosong')
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        print(JobQueue(args.database).stats())
+        return
+
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+    if args.processes < 2:
+        return work(args.database, args.once)
+
+    pool = [
+        multiprocessing.Process(target=work, args=(args.database, args.once))
+        for _ in range(args.processes)
+    ]
+    for p in pool:
+        p.start()
+    try:
+        for p in pool:
+            p.join()
+    except KeyboardInterrupt:
+        for p in pool:
+            p.terminate()
+
+
+def includeme(config):
+    settings = config.get_settings()
+    queue = JobQueue(settings.get('jobs.database'))
+    config.registry['jobs'] = queue
+    config.add_request_method(lambda request: queue, 'jobs', reify=True)
+
+
+if __name__ == '__main__':
+    # jalankan lewat modul CircleApp.jobs, bukan __main__, supaya task yang
+    # didaftarkan TASK_MODULES masuk ke registry TASKS yang sama
+    from CircleApp.jobs import main
+    main()
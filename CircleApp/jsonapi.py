@@ -15,18 +15,138 @@ import re
 from pyramid.httpexceptions import HTTPBadRequest
 import sqlalchemy
 from sqlalchemy.orm import RelationshipProperty, load_only
+from sqlalchemy.orm.interfaces import ONETOMANY
+from sqlalchemy.sql.util import ClauseAdapter
+from sqlalchemy.util import asbool
+
+from CircleApp.utils import MAX_LIMIT, DEFAULT_LIMIT, model_fields
+
+
+FILTER_OPERATORS = {}
+
+
+def filter_operator(*names):
+    """Register a filter operator for ``filter[<attribute>:<op>]``.
+
+    The operator is called as ``operator(prop, value)`` where ``value`` is
+    the parameter value, or a list of values when the parameter is repeated,
+    and must return a SQL clause::
+
+        @filter_operator('eq')
+        def _eq(prop, val):
+            return prop == val
+    """
+    def decorator(wrapped):
+        for name in names:
+            FILTER_OPERATORS[name] = wrapped
+        return wrapped
+    return decorator
+
+
+def _split_values(val):
+    """Values of a multi-value filter, comma separated and/or repeated."""
+    vals = val if isinstance(val, list) else [val]
+    return [v for item in vals for v in item.split(',') if v != '']
+
+
+def _expanding(values):
+    # satu bind parameter untuk seluruh list, sehingga teks SQL tetap sama
+    # berapapun jumlah nilainya dan statement tetap bisa di-cache
+    return sqlalchemy.bindparam(None, values, expanding=True)
+
+
+def _simple_operator(method):
+    def operator(prop, val):
+        op_func = getattr(prop, method)
+        if isinstance(val, list):
+            return sqlalchemy.or_(*[op_func(_v) for _v in val])
+        return op_func(val)
+    return operator
+
+
+for _name, _method in (
+        ('startswith', 'startswith'),
+        ('endswith', 'endswith'),
+        ('contains', 'contains'),
+        ('lt', '__lt__'),
+        ('gt', '__gt__'),
+        ('le', '__le__'),
+        ('ge', '__ge__')):
+    filter_operator(_name)(_simple_operator(_method))
+
+
+@filter_operator('eq')
+def _eq(prop, val):
+    if isinstance(val, list):
+        return prop.in_(_expanding(val))
+    return prop == val
+
+
+@filter_operator('ne')
+def _ne(prop, val):
+    if isinstance(val, list):
+        return ~prop.in_(_expanding(val))
+    return prop != val
+
+
+def _like_operator(method):
+    like = _simple_operator(method)
+
+    def operator(prop, val):
+        if isinstance(val, list):
+            val = [re.sub(r'\*', '%', _v) for _v in val]
+        else:
+            val = re.sub(r'\*', '%', val)
+        return like(prop, val)
+    return operator
+
+
+filter_operator('like')(_like_operator('like'))
+filter_operator('ilike')(_like_operator('ilike'))
+
+
+@filter_operator('in')
+def _in(prop, val):
+    return prop.in_(_expanding(_split_values(val)))
+
+
+@filter_operator('nin')
+def _nin(prop, val):
+    return ~prop.in_(_expanding(_split_values(val)))
+
+
+@filter_operator('between')
+def _between(prop, val):
+    values = _split_values(val)
+    if len(values) != 2:
+        raise HTTPBadRequest(
+            "Filter operator 'between' takes two values: '<low>,<high>'"
+        )
+    return prop.between(*values)
+
+
+@filter_operator('null')
+def _null(prop, val):
+    if asbool(val[-1] if isinstance(val, list) else val):
+        return prop.is_(None)
+    return prop.isnot(None)
 
 
 class QueryBuilder(object):
+    max_limit = MAX_LIMIT
+    default_limit = DEFAULT_LIMIT
+
     def __init__(self, request, model,
-                 collection_name=None):
+                 collection_name=None, include_archived=False):
         self.request = request
         self.model = model
         self.attributes = {}
+        self.relationships = {}
         self.fields = {}
         self.key_column = sqlalchemy.inspect(model).primary_key[0]
         self.collection_name = model.__tablename__ if collection_name is None else collection_name
         self.session = request.db
+        self.include_archived = include_archived
 
     def allowed_object(self, obj):
         '''Whether or not current action is allowed on object.
@@ -45,6 +165,16 @@ class QueryBuilder(object):
         '''
         return set(self.fields)
 
+    @property
+    def bulk_update_fields(self):
+        '''Set of fields :py:meth:`bulk_update` may write, from the
+        model's ``__bulk_update__`` allowlist (empty when not declared).
+
+        Returns:
+            set: set of updatable field names.
+        '''
+        return set(getattr(self.model, '__bulk_update__', ())) & self.allowed_fields
+
     @property
     @functools.lru_cache(maxsize=128)
     def requested_field_names(self):
@@ -122,6 +252,18 @@ class QueryBuilder(object):
             fields.update(rels)
             self.fields = fields
 
+    def attribute(self, key):
+        '''Model attribute named in a ``sort`` or ``filter[...]`` parameter.
+
+        Raises:
+            HTTPBadRequest: unknown attribute or one listed in
+            ``model.__private__`` (e.g. password hashes).
+        '''
+        if key.startswith('_') or key in getattr(self.model, '__private__', ()) \
+                or not hasattr(self.model, key):
+            raise HTTPBadRequest("No such attribute: '{}'".format(key))
+        return getattr(self.model, key)
+
     def query_add_sorting(self, q):
         '''Add sorting to query.
 
@@ -141,10 +283,20 @@ class QueryBuilder(object):
         Returns:
             sqlalchemy.orm.query.Query: query with ``order_by`` clause.
         '''
+        return q.order_by(*self.sort_clauses())
+
+    def sort_clauses(self):
+        '''``order_by`` clauses from the ``sort`` query parameter, shared by
+        :py:func:`query_add_sorting` and :py:func:`get_collection_rows`.
+
+        Returns:
+            list: sqlalchemy order by expressions.
+        '''
         # Get info for query.
         qinfo = self.collection_query_info(self.request, self.key_column)
 
         # Sorting.
+        clauses = []
         for key_info in qinfo['_sort']:
             sort_keys = key_info['key'].split('.')
             # We are using 'id' to stand in for the key column, whatever that
@@ -152,13 +304,13 @@ class QueryBuilder(object):
             main_key = sort_keys[0]
             if main_key == 'id':
                 main_key = self.key_column.name
-            order_att = getattr(self.model, main_key)
+            order_att = self.attribute(main_key)
             if key_info['ascending']:
-                q = q.order_by(order_att)
+                clauses.append(order_att)
             else:
-                q = q.order_by(order_att.desc())
+                clauses.append(order_att.desc())
 
-        return q
+        return clauses
 
     def query_add_filtering(self, q):
         '''Add filtering clauses to query.
@@ -191,6 +343,15 @@ class QueryBuilder(object):
             * ``ge`` as sqlalchemy ``__ge__``
             * ``like`` or ``ilike`` as sqlalchemy ``like`` or ``ilike``, except
               replace any '*' with '%' (so that '*' acts as a wildcard)
+            * ``in`` or ``nin`` as sqlalchemy ``in_`` or ``~in_`` with comma
+              separated values, bound as a single expanding parameter
+            * ``between`` as sqlalchemy ``between`` with ``<low>,<high>``
+            * ``null`` as ``IS NULL`` for a true value, ``IS NOT NULL``
+              otherwise
+
+        Repeated ``eq``/``ne`` parameters compile to ``IN``/``NOT IN``, other
+        repeated operators are combined with ``OR``. More operators can be
+        added with :py:func:`filter_operator`.
 
         See Also:
             ``_filters`` key from :py:func:`collection_query_info`
@@ -218,53 +379,50 @@ class QueryBuilder(object):
 
                 http GET http://localhost:6543/posts?filter[published_at:gt]=2015-01-03
 
+            Get people by id:
+
+            .. parsed-literal::
+
+                http GET http://localhost:6543/people?filter[id:in]=1,2,3
+
         Todo:
             Support dotted (relationship) attribute specifications.
         '''
+        for clause in self.filter_clauses():
+            q = q.filter(clause)
+        return q
+
+    def filter_clauses(self):
+        '''``WHERE`` clauses from the ``filter`` query parameters, see
+        :py:func:`query_add_filtering`.
+
+        Returns:
+            list: sqlalchemy boolean expressions.
+
+        Raises:
+            HTTPBadRequest
+        '''
         qinfo = self.collection_query_info(self.request, self.key_column)
+        clauses = []
         # Filters
         for p, finfo in qinfo['_filters'].items():
             val = finfo['value']
             colspec = finfo['colspec']
             op = finfo['op']
-            prop = getattr(self.model, colspec[0])
+            prop = self.attribute(colspec[0])
             if isinstance(prop.property, RelationshipProperty):
                 # TODO(Colin): deal with relationships properly.
                 pass
-            if op == 'eq':
-                op_func = getattr(prop, '__eq__')
-            elif op == 'ne':
-                op_func = getattr(prop, '__ne__')
-            elif op == 'startswith':
-                op_func = getattr(prop, 'startswith')
-            elif op == 'endswith':
-                op_func = getattr(prop, 'endswith')
-            elif op == 'contains':
-                op_func = getattr(prop, 'contains')
-            elif op == 'lt':
-                op_func = getattr(prop, '__lt__')
-            elif op == 'gt':
-                op_func = getattr(prop, '__gt__')
-            elif op == 'le':
-                op_func = getattr(prop, '__le__')
-            elif op == 'ge':
-                op_func = getattr(prop, '__ge__')
-            elif op == 'like' or op == 'ilike':
-                op_func = getattr(prop, op)
-                val = re.sub(r'\*', '%', val)
-            else:
+            # operator di-resolve sekali per kolom, lalu dipakai untuk semua
+            # nilai filter tersebut
+            op_func = FILTER_OPERATORS.get(op)
+            if op_func is None:
                 raise HTTPBadRequest(
                     "No such filter operator: '{}'".format(op)
                 )
-            _filters = op_func(val)
-            if isinstance(val, list):
-                _ops = []
-                for _v in val:
-                    _ops.append(op_func(_v))
-                _filters = sqlalchemy.or_(*_ops)
-            q = q.filter(_filters)
+            clauses.append(op_func(prop, val))
 
-        return q
+        return clauses
 
     @classmethod
     @functools.lru_cache(maxsize=128)
@@ -447,13 +605,253 @@ class QueryBuilder(object):
             raise HTTPBadRequest(
                 'An error occurred querying the database. Server logs may have details.'
             )
+        limit, offset, pagination = self.pagination(count)
+        q = q.offset(offset)
+        q = q.limit(limit)
+        return q, pagination
+
+    def pagination(self, count):
+        '''Limit and offset from ``page[limit]``/``page[offset]``.
+
+        Returns:
+            tuple: ``(limit, offset, pagination)`` where ``pagination`` is
+            the dict returned with the collection.
+        '''
         qinfo = self.collection_query_info(self.request, self.key_column)
         limit = int(qinfo['page[limit]'])
         offset = int(qinfo['page[offset]']) * int(limit) if qinfo.get('page[offset]', None) else 0
-        q = q.offset(offset)
-        q = q.limit(limit)
-        return q, {
+        return limit, offset, {
             'total': count,
             'page': qinfo['page[offset]'],
             'pageSize': qinfo['page[limit]']
         }
+
+    def requested_columns(self, expose_fields=None):
+        '''Column expressions for the read only collection, labelled with the
+        same keys :py:func:`CircleApp.utils.mapper_alchemy` returns.
+
+        Only the fields named in ``fields[<collection>]`` are selected when
+        that parameter is given.
+
+        Returns:
+            list: labelled column expressions.
+
+        Raises:
+            HTTPBadRequest
+        '''
+        if expose_fields is not None:
+            expose_fields = frozenset(expose_fields)
+        keys = model_fields(self.model, expose_fields)
+        param = self.request.params.get(
+            'fields[{}]'.format(self.collection_name)
+        )
+        if param is not None:
+            requested = set(param.split(',')) - {''}
+            unknown = requested - set(keys)
+            if unknown:
+                raise HTTPBadRequest(
+                    'Invalid fields: {}'.format(', '.join(sorted(unknown)))
+                )
+            keys = [k for k in keys if k in requested]
+        return [getattr(self.model, k).label(k) for k in keys]
+
+    def get_collection_rows(self, expose_fields=None):
+        '''Read only variant of :py:func:`get_collection_query`.
+
+        Selects only the requested columns with a Core ``select()`` executed
+        on the session connection, so rows never become ORM instances (no
+        identity map, instrumentation or unit of work). Filtering, sorting
+        and paging are the same as :py:func:`get_collection_query`.
+
+        Results are served from the registry ``query_cache`` (see
+        :py:mod:`CircleApp.querycache`) when it is enabled, keyed by
+        :py:func:`query_key` and the version of the model table. Cached
+        results are shared between requests and must not be modified.
+
+        Returns:
+            tuple: ``(data, pagination)`` where ``data`` is a list of dicts
+            with raw values, see :py:func:`CircleApp.utils.mapper_alchemy`.
+
+        Raises:
+            HTTPBadRequest
+        '''
+        cache = self.request.registry.get('query_cache')
+        if cache is None:
+            return self._collection_rows(expose_fields)
+        _, tables, _ = self.collection_source()
+        key = (self.query_key(expose_fields), cache.version(*tables))
+        return cache.get_or_set(key, lambda: self._collection_rows(expose_fields))
+
+    def collection_source(self):
+        '''Selectable read by :py:func:`get_collection_rows`.
+
+        With ``include_archived`` and a model that has an ``__archive__``
+        table (see :py:mod:`CircleApp.users.arsip`) this is a
+        ``UNION ALL`` of the model table and the archive, otherwise the
+        model table. Bulk actions and :py:func:`get_collection_query`
+        always use the model table only.
+
+        Returns:
+            tuple: ``(selectable, table names, adapt)`` where ``adapt``
+            rewrites model column expressions against the selectable.
+        '''
+        table = sqlalchemy.inspect(self.model).local_table
+        archive = getattr(self.model, '__archive__', None)
+        if not self.include_archived or archive is None:
+            return table, (table.name,), lambda clause: clause
+        names = [c.name for c in table.columns]
+        source = sqlalchemy.union_all(
+            sqlalchemy.select([table.c[name] for name in names]),
+            sqlalchemy.select([archive.c[name] for name in names]),
+        ).alias(table.name)
+        adapter = ClauseAdapter(source)
+
+        def adapt(clause):
+            if hasattr(clause, '__clause_element__'):
+                clause = clause.__clause_element__()
+            return adapter.traverse(clause)
+
+        return source, (table.name, archive.name), adapt
+
+    def query_key(self, expose_fields=None):
+        '''Normalized collection query: collection, filters, sort, fields and
+        page, independent of parameter order.
+
+        Returns:
+            tuple: hashable key.
+        '''
+        qinfo = self.collection_query_info(self.request, self.key_column)
+        filters = tuple(sorted(
+            (p, tuple(v) if isinstance(v, list) else v)
+            for p, v in ((p, f['value']) for p, f in qinfo['_filters'].items())
+        ))
+        return (
+            self.collection_name,
+            filters,
+            qinfo['sort'],
+            self.request.params.get('fields[{}]'.format(self.collection_name)),
+            frozenset(expose_fields) if expose_fields is not None else None,
+            qinfo['page[limit]'],
+            qinfo['page[offset]'],
+            self.include_archived,
+        )
+
+    def _collection_rows(self, expose_fields=None):
+        table, _, adapt = self.collection_source()
+        columns = [adapt(c) for c in self.requested_columns(expose_fields)]
+        where = adapt(sqlalchemy.and_(*self.filter_clauses()))
+        try:
+            count = self.session.execute(
+                sqlalchemy.select([sqlalchemy.func.count()])
+                .select_from(table).where(where)
+            ).scalar()
+        except sqlalchemy.exc.ProgrammingError as e:
+            raise HTTPBadRequest(
+                'An error occurred querying the database. Server logs may have details.'
+            )
+        limit, offset, pagination = self.pagination(count)
+        if not columns:
+            return [{} for _ in range(max(0, min(limit, count - offset)))], pagination
+
+        result = self.session.execute(
+            sqlalchemy.select(columns).select_from(table).where(where)
+            .order_by(*[adapt(c) for c in self.sort_clauses()])
+            .offset(offset).limit(limit)
+        )
+        keys = [c.key for c in columns]
+        return [dict(zip(keys, row)) for row in result], pagination
+
+    def get_bulk_query(self):
+        '''Query for set-based actions on the collection.
+
+        Only filtering is applied; at least one ``filter[...]`` parameter is
+        required so a bulk action never silently targets the whole table.
+
+        Returns:
+            sqlalchemy.orm.query.Query: filtered query.
+
+        Raises:
+            HTTPBadRequest
+        '''
+        qinfo = self.collection_query_info(self.request, self.key_column)
+        if not qinfo['_filters']:
+            raise HTTPBadRequest(
+                'Bulk actions require at least one filter parameter.'
+            )
+        return self.query_add_filtering(self.session.query(self.model))
+
+    def bulk_update(self, values, dry_run=False):
+        '''Update every item matching the filters with a single
+        ``UPDATE ... WHERE`` statement.
+
+        Parameters:
+            values (dict): new values keyed by field name, only
+                :py:attr:`bulk_update_fields` may be updated.
+            dry_run (bool): only count the matching items.
+
+        Returns:
+            int: number of matched (or updated) items.
+
+        Raises:
+            HTTPBadRequest
+        '''
+        unknown = set(values) - self.bulk_update_fields
+        if not values or unknown:
+            raise HTTPBadRequest(
+                'Invalid fields for update: {}'.format(
+                    ', '.join(sorted(unknown)) or '(none)')
+            )
+        for key, value in values.items():
+            if not self._valid_value(self.fields[key], value):
+                raise HTTPBadRequest('Invalid value for {}'.format(key))
+        q = self.get_bulk_query()
+        if dry_run:
+            return q.count()
+        return q.update(
+            {self.fields[k]: v for k, v in values.items()},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def _valid_value(column, value):
+        '''Whether ``value`` fits ``column`` without a database error.'''
+        if value is None:
+            return column.nullable
+        try:
+            expected = column.type.python_type
+        except NotImplementedError:
+            return True
+        return isinstance(value, expected)
+
+    def bulk_delete(self, dry_run=False):
+        '''Delete every item matching the filters with a single
+        ``DELETE ... WHERE`` statement.
+
+        Rows of one-to-many relationships (e.g. ``profile.user_id``) are
+        deleted first, one statement per relationship, since the bulk delete
+        bypasses ORM cascades.
+
+        Parameters:
+            dry_run (bool): only count the matching items.
+
+        Returns:
+            tuple: ``(total, cascade)`` where ``cascade`` maps related table
+            names to the number of dependent rows.
+        '''
+        q = self.get_bulk_query()
+        cascade = {}
+        for rel in sqlalchemy.inspect(self.model).relationships:
+            if rel.direction is not ONETOMANY:
+                continue
+            (local, remote), = rel.local_remote_pairs
+            dependent = self.session.query(rel.mapper).filter(
+                remote.in_(q.with_entities(local))
+            )
+            # quoted_name (subclass str) tidak diterima encoder orjson
+            name = str(rel.mapper.local_table.name)
+            cascade[name] = dependent.count() if dry_run else \
+                dependent.delete(synchronize_session=False)
+
+        total = q.count() if dry_run else \
+            q.delete(synchronize_session=False)
+        return total, cascade
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+    Limiter
+    ~~~~~~~~~
+
+    Tween pembatas request yang berjalan bersamaan per kelas route:
+
+    * ``auth``: path login, lupa dan reset kunci
+    * ``write``: method selain GET/HEAD/OPTIONS
+    * ``read``: sisanya
+
+    Jika kelas sudah penuh, request menunggu di antrian maksimal
+    ``timeout`` detik. Antrian penuh atau waktu habis langsung dijawab
+    503 dengan ``Retry-After``, supaya server tetap responsif saat
+    traffic naik dan tidak semua request timeout bersamaan.
+
+    Jumlah in-flight dan antrian per kelas (admin): ``GET /_status/limiter``.
+
+    config.yaml::
+
+        limiter:
+          enabled: True
+          retry_after: 5
+          classes:
+            read: {limit: 8, queue: 16, timeout: 2}
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    limiter.py
+"""
+import threading
+import time
+
+from pyramid.httpexceptions import HTTPServiceUnavailable
+from pyramid.tweens import INGRESS
+
+from CircleApp.encoders import render_json
+
+
+CLASSES = {
+    'read': {'limit': 8, 'queue': 16, 'timeout': 2.0},
+    'write': {'limit': 4, 'queue': 8, 'timeout': 2.0},
+    'auth': {'limit': 2, 'queue': 8, 'timeout': 1.0},
+}
+AUTH_PATHS = ('/login', '/forgot', '/reset/')
+EXEMPT_PATHS = ('/static/', '/css/', '/js/', '/fonts/', '/_status/', '/ready')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_AFTER = 5
+
+
+class Gate(object):
+    """Maksimal ``limit`` request bersamaan dan ``queue`` request menunggu."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+
+            deadline = time.monotonic() + self.timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'limit': self.limit,
+            'queue': self.queue,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+
+def route_class(request):
+    path = request.path_info
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith(AUTH_PATHS):
+        return 'auth'
+    if request.method in READ_METHODS:
+        return 'read'
+    return 'write'
+
+
+def limiter_tween_factory(handler, registry):
+    gates = registry['limiter']
+    retry_after = str(registry.settings.get('limiter', {}).get('retry_after', RETRY_AFTER))
+
+    def limiter_tween(request):
+        gate = gates.get(route_class(request))
+        if gate is None:
+            return handler(request)
+        if not gate.acquire():
+            return HTTPServiceUnavailable(headers={'Retry-After': retry_after})
+        try:
+            return handler(request)
+        finally:
+            gate.release()
+
+    return limiter_tween
+
+
+def status_limiter(request):
+    return render_json(request, {
+        name: gate.stats() for name, gate in request.registry['limiter'].items()
+    })
+
+
+def includeme(config):
+    settings = config.get_settings().get('limiter') or {}
+    if not settings.get('enabled', True):
+        return
+    classes = settings.get('classes') or {}
+    config.registry['limiter'] = {
+        name: Gate(**dict(defaults, **classes.get(name, {})))
+        for name, defaults in CLASSES.items()
+    }
+    config.add_tween('CircleApp.limiter.limiter_tween_factory', under=INGRESS)
+    config.add_route('status_limiter', '/_status/limiter')
+    config.add_view(status_limiter, route_name='status_limiter', permission='admin')
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+    Logging
+    ~~~~~~~~~
+
+    Logging asinkron dan terstruktur untuk logger ``baka.log``.
+
+    Record diserahkan ke thread background lewat antrian berukuran tetap;
+    jika antrian penuh record dibuang (dan dihitung), request tidak pernah
+    menunggu disk. Output berupa satu baris JSON per record, lengkap dengan
+    ``request_id`` (header ``X-Request-ID`` atau dibuat baru, dikembalikan
+    di response).
+
+    Sampling dan rate limit per logger dijalankan sebelum record masuk
+    antrian. Sampling hanya untuk level di bawah WARNING. Nilai dengan key
+    sensitif (``password``, ``kunci``, ``token``, ...) di argumen, ``extra``
+    dan teks pesan diganti ``***``.
+
+    config.yaml::
+
+        logging:
+          queue_size: 10000
+          json: True
+          sample:
+            Baka: 0.1          # 10% record INFO/DEBUG
+          rate_limit:
+            Baka: 200          # record per detik
+          redact: [nik]        # key sensitif tambahan
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    logs.py
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from baka.log import log
+from pyramid.events import NewResponse
+from pyramid.threadlocal import get_current_request
+
+
+QUEUE_SIZE = 10000
+REDACTED = '***'
+SENSITIVE = ('password', 'kunci', 'token', 'secret', 'csrf', 'authorization', 'cookie')
+
+# atribut standar LogRecord, selain ini dianggap ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+
+class Redactor(object):
+    """Ganti nilai dengan key sensitif, di mapping maupun teks pesan
+    (``password=...``, ``'password': '...'``)."""
+
+    def __init__(self, keys=()):
+        self.keys = tuple(k.lower() for k in SENSITIVE + tuple(keys))
+        self.pattern = re.compile(
+            r"""(?i)((?:{})[\w-]*['"]?\s*[:=]\s*['"]?)[^'"&,;\s}}]+""".format(
+                '|'.join(re.escape(k) for k in self.keys)))
+
+    def sensitive(self, key):
+        key = str(key).lower()
+        return any(k in key for k in self.keys)
+
+    def value(self, value):
+        if hasattr(value, 'items') and callable(value.items):
+            return {
+                k: REDACTED if self.sensitive(k) else self.value(v)
+                for k, v in value.items()
+            }
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.value(v) for v in value)
+        if isinstance(value, str):
+            return self.text(value)
+        return value
+
+    def text(self, text):
+        return self.pattern.sub(r'\1' + REDACTED, text)
+
+
+class RateFilter(logging.Filter):
+    """Sampling dan rate limit (token bucket) per nama logger."""
+
+    def __init__(self, sample=None, rate_limit=None):
+        super(RateFilter, self).__init__()
+        self.sample = sample or {}
+        self.rate_limit = rate_limit or {}
+        self.sampled = 0
+        self.limited = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.sample.get(record.name)
+        if rate is not None and record.levelno < logging.WARNING \
+                and random.random() >= rate:
+            self.sampled += 1
+            return False
+
+        limit = self.rate_limit.get(record.name)
+        if limit is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(record.name, (limit, now))
+            tokens = min(limit, tokens + (now - last) * limit)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now)
+                self.limited += 1
+                return False
+            self._buckets[record.name] = (tokens - 1, now)
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """``QueueHandler`` dengan antrian terbatas yang tidak pernah blocking.
+
+    :meth:`prepare` berjalan di thread pemanggil: pesan di-format (setelah
+    redaksi) supaya thread background tidak menyentuh objek milik request.
+    """
+
+    def __init__(self, redactor, queue_size=QUEUE_SIZE):
+        super(AsyncHandler, self).__init__(queue.Queue(queue_size))
+        self.redactor = redactor
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        redactor = self.redactor
+        data = dict(vars(record))
+        args = record.args
+        if args:
+            if isinstance(args, tuple):
+                args = tuple(redactor.value(a) for a in args)
+            else:
+                args = redactor.value(args)
+        msg = str(redactor.value(record.msg))
+        try:
+            msg = msg % args if args else msg
+        except (TypeError, ValueError):
+            msg = '{} {!r}'.format(msg, args)
+        data['msg'] = redactor.text(msg)
+        data['args'] = None
+        if record.exc_info:
+            data['exc_text'] = logging.Formatter().formatException(record.exc_info)
+        data['exc_info'] = None
+        for key in set(data) - _RECORD_ATTRS:
+            if redactor.sensitive(key):
+                data[key] = REDACTED
+            else:
+                data[key] = redactor.value(data[key])
+
+        request = get_current_request()
+        data['request_id'] = getattr(request, 'request_id', None) if request else None
+        return logging.makeLogRecord(data)
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'pid': record.process,
+            'request_id': getattr(record, 'request_id', None),
+            'message': record.getMessage(),
+        }
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            data[key] = getattr(record, key)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def setup(logger, queue_size=QUEUE_SIZE, use_json=True, sample=None,
+          rate_limit=None, redact=()):
+    """Pindahkan handler ``logger`` ke thread background, return
+    ``(handler, listener)``. Listener dihentikan (antrian di-flush) saat
+    proses keluar."""
+    targets = [h for h in logger.handlers if not isinstance(h, AsyncHandler)]
+    if not targets:
+        targets = [logging.StreamHandler()]
+    for target in targets:
+        if use_json:
+            target.setFormatter(JSONFormatter())
+        logger.removeHandler(target)
+
+    handler = AsyncHandler(Redactor(redact), queue_size)
+    handler.addFilter(RateFilter(sample, rate_limit))
+    listener = QueueListener(handler.queue, *targets, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop, listener)
+    logger.addHandler(handler)
+    return handler, listener
+
+
+def _stop(listener):
+    # QueueListener.stop tidak bisa dipanggil dua kali
+    if listener._thread is not None:
+        listener.stop()
+
+
+def stats(handler):
+    rate = handler.filters[0]
+    return {
+        'queued': handler.queue.qsize(),
+        'dropped': handler.dropped,
+        'sampled': rate.sampled,
+        'limited': rate.limited,
+    }
+
+
+def request_id(request):
+    value = request.headers.get('X-Request-ID', '')
+    if not re.match(r'^[\w.-]{1,64}$', value):
+        value = '{}-{}'.format(os.getpid(), uuid.uuid4().hex)
+    return value
+
+
+def _response_request_id(event):
+    event.response.headers['X-Request-ID'] = event.request.request_id
+
+
+def includeme(config):
+    settings = config.get_settings().get('logging') or {}
+    config.add_request_method(request_id, 'request_id', reify=True)
+    config.add_subscriber(_response_request_id, NewResponse)
+
+    handler, listener = setup(
+        log,
+        queue_size=settings.get('queue_size', QUEUE_SIZE),
+        use_json=settings.get('json', True),
+        sample=settings.get('sample'),
+        rate_limit=settings.get('rate_limit'),
+        redact=tuple(settings.get('redact') or ()))
+    config.registry['log_handler'] = handler
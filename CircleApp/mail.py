@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+    Email
+    ~~~~~~~~~
+
+    Kirim email lewat antrian tugas :mod:`CircleApp.jobs`. View cukup
+    memanggil :func:`send`, worker mengirim email yang terkumpul dalam satu
+    koneksi SMTP.
+
+    Konfigurasi worker lewat environment: ``MAIL_HOST``, ``MAIL_PORT``,
+    ``MAIL_USERNAME``, ``MAIL_PASSWORD``, ``MAIL_TLS``, ``MAIL_SENDER``.
+    ``MAIL_HOST=dummy`` memakai :class:`DummySMTP` yang tidak mengirim
+    apapun, untuk test dan development.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    mail.py
+"""
+import os
+import smtplib
+from email.message import EmailMessage
+
+from baka.log import log
+from pyramid.settings import asbool
+
+from CircleApp.jobs import task
+
+
+def mail_settings(environ):
+    """Setting email dari environment, format sama dengan
+    ``baka.settings.mandrill_settings``."""
+    return {
+        'mail.host': environ.get('MAIL_HOST', 'localhost'),
+        'mail.port': int(environ.get('MAIL_PORT', 25)),
+        'mail.username': environ.get('MAIL_USERNAME'),
+        'mail.password': environ.get('MAIL_PASSWORD'),
+        'mail.tls': asbool(environ.get('MAIL_TLS', False)),
+        'mail.sender': environ.get('MAIL_SENDER', 'noreply@circle-app.id'),
+        'mail.outbox': environ.get('MAIL_OUTBOX'),
+    }
+
+
+class DummySMTP(object):
+    """Pengganti ``smtplib.SMTP`` untuk test: email disimpan di ``outbox``
+    dan, jika ``MAIL_OUTBOX`` di-set, ditulis sebagai file ``.eml`` supaya
+    bisa diperiksa dari proses lain."""
+
+    outbox = []
+
+    def __init__(self, host='', port=0, directory=None):
+        self.directory = directory
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def send_message(self, message):
+        self.outbox.append(message)
+        if self.directory:
+            name = '{}-{}.eml'.format(os.getpid(), len(self.outbox))
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(message.as_bytes())
+
+    def quit(self):
+        pass
+
+
+def connect(settings):
+    if settings['mail.host'] == 'dummy':
+        return DummySMTP(directory=settings['mail.outbox'])
+
+    smtp = smtplib.SMTP(settings['mail.host'], settings['mail.port'])
+    if settings['mail.tls']:
+        smtp.starttls()
+    if settings['mail.username']:
+        smtp.login(settings['mail.username'], settings['mail.password'])
+    return smtp
+
+
+def message(settings, payload):
+    msg = EmailMessage()
+    msg['From'] = settings['mail.sender']
+    msg['To'] = payload['to']
+    msg['Subject'] = payload['subject']
+    msg.set_content(payload['body'])
+    return msg
+
+
+def send(request, to, subject, body):
+    """Masukkan email ke antrian, return id tugas."""
+    return request.jobs.enqueue('email', {
+        'to': to,
+        'subject': subject,
+        'body': body,
+    })
+
+
+@task('email', batch=True)
+def send_batch(payloads):
+    """Kirim ``payloads`` dalam satu koneksi SMTP. Return satu hasil per
+    email, ``None`` atau exception-nya, jadi hanya email yang gagal yang
+    diulang. Koneksi yang putus dibuka lagi untuk email berikutnya; jika
+    koneksi gagal dibuka, semua email sisanya gagal dengan error itu."""
+    settings = mail_settings(os.environ)
+    smtp = None
+    errors = []
+    try:
+        for index, payload in enumerate(payloads):
+            if smtp is None:
+                try:
+                    smtp = connect(settings)
+                except Exception as e:
+                    errors.extend([e] * (len(payloads) - index))
+                    break
+            try:
+                smtp.send_message(message(settings, payload))
+                errors.append(None)
+            except smtplib.SMTPServerDisconnected as e:
+                errors.append(e)
+                smtp = None
+            except Exception as e:
+                errors.append(e)
+    finally:
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception as e:
+                # email sudah diterima server, hasilnya tidak berubah
+                log.warning('email: quit gagal: %r', e)
+    return errors
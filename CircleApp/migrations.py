@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+    Migrations
+    ~~~~~~~~~
+
+    Migrasi schema. ``upgrade`` membuat tabel yang belum ada lalu
+    membawa tabel lama ke schema model sekarang. Mode startup
+    ``production`` (:mod:`CircleApp.startup`) tidak menjalankan
+    ``create_all``, jadi ``upgrade`` wajib dijalankan sebelum deploy, untuk
+    database baru maupun lama. Setiap migrasi idempotent sehingga
+    ``upgrade`` aman dijalankan berulang::
+
+        DATABASE_URL=sqlite:///circleapp.db python -m CircleApp.migrations upgrade
+        DATABASE_URL=... python -m CircleApp.migrations upgrade --dry-run
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    migrations.py
+"""
+import argparse
+import os
+
+import sqlalchemy
+from baka.settings import database_url
+from baka_tenshi import Model
+
+from CircleApp.activity import AktivitasPengguna
+from CircleApp.auth import PencabutanSesi
+# event after_create rollup pendaftaran
+from CircleApp.users import rekap  # noqa
+from CircleApp.users.model import Pengguna, Profile, pengguna_arsip, profile_arsip
+
+
+def tabel_baru(connection, dry_run=False):
+    """Buat semua tabel model yang belum ada di database, dengan schema
+    sekarang (migrasi berikutnya tidak mengubahnya lagi). Rollup
+    ``rekap_pendaftaran`` yang baru dibuat diisi dari ``pengguna`` oleh
+    event ``after_create`` di :mod:`CircleApp.users.rekap`. Return jumlah
+    tabel yang (akan) dibuat."""
+    existing = set(sqlalchemy.inspect(connection).get_table_names())
+    tables = [t for t in Model.metadata.sorted_tables if t.name not in existing]
+    if not dry_run:
+        Model.metadata.create_all(connection, tables=tables)
+    return len(tables)
+
+
+def _has_index(connection, table, name):
+    inspector = sqlalchemy.inspect(connection)
+    return any(index['name'] == name for index in inspector.get_indexes(table))
+
+
+def profile_user_id_unique(connection, dry_run=False):
+    """Satu ``profile`` per pengguna: hapus duplikat (yang paling baru
+    diubah dipertahankan) lalu buat unique index ``profile.user_id``."""
+    table = Profile.__table__
+    index = next(i for i in table.indexes if i.name == 'uq_profile_user_id')
+    if _has_index(connection, table.name, index.name):
+        return 0
+
+    newer = table.alias('newer')
+    keep = sqlalchemy.select([newer.c.id]).where(
+        newer.c.user_id == table.c.user_id
+    ).order_by(newer.c.modified.desc(), newer.c.id.desc()).limit(1).as_scalar()
+    duplicate = sqlalchemy.and_(table.c.user_id.isnot(None), table.c.id != keep)
+    if dry_run:
+        return connection.execute(
+            sqlalchemy.select([sqlalchemy.func.count()]).where(duplicate)
+        ).scalar()
+
+    removed = connection.execute(table.delete().where(duplicate)).rowcount
+    index.create(connection)
+    return removed
+
+
+def pengguna_permissions_version(connection, dry_run=False):
+    """Kolom ``pengguna.versi_izin`` dan tabel ``pencabutan_sesi`` untuk
+    token login (:mod:`CircleApp.auth`)."""
+    table = Pengguna.__table__
+    columns = [c['name'] for c in sqlalchemy.inspect(connection).get_columns(table.name)]
+    if dry_run:
+        return 0
+    if 'versi_izin' not in columns:
+        connection.execute(
+            'ALTER TABLE {} ADD COLUMN versi_izin INTEGER DEFAULT 0 NOT NULL'.format(
+                connection.dialect.identifier_preparer.quote(table.name)))
+    PencabutanSesi.__table__.create(connection, checkfirst=True)
+    return 0
+
+
+def tabel_arsip(connection, dry_run=False):
+    """Tabel ``pengguna_arsip`` dan ``profile_arsip`` untuk
+    :mod:`CircleApp.users.arsip`."""
+    if not dry_run:
+        pengguna_arsip.create(connection, checkfirst=True)
+        profile_arsip.create(connection, checkfirst=True)
+    return 0
+
+
+def _add_columns(connection, table, names):
+    """``ALTER TABLE ADD COLUMN`` untuk kolom ``names`` milik ``table`` yang
+    belum ada di database, dengan DDL kolom dari model."""
+    existing = [c['name'] for c in sqlalchemy.inspect(connection).get_columns(table.name)]
+    for name in names:
+        if name not in existing:
+            connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                connection.dialect.identifier_preparer.quote(table.name),
+                sqlalchemy.schema.CreateColumn(table.c[name]).compile(dialect=connection.dialect)))
+
+
+def pengguna_aktivitas(connection, dry_run=False):
+    """Kolom ``login_terakhir``/``terlihat_terakhir`` di ``pengguna`` dan
+    ``pengguna_arsip``, dan tabel ``aktivitas_pengguna``
+    (:mod:`CircleApp.activity`)."""
+    if dry_run:
+        return 0
+    for table in (Pengguna.__table__, pengguna_arsip):
+        _add_columns(connection, table, ('login_terakhir', 'terlihat_terakhir'))
+    AktivitasPengguna.__table__.create(connection, checkfirst=True)
+    return 0
+
+
+def pengguna_admin(connection, dry_run=False):
+    """Kolom ``admin_pengguna`` untuk permission ``admin``
+    (:mod:`CircleApp.auth`)."""
+    if not dry_run:
+        for table in (Pengguna.__table__, pengguna_arsip):
+            _add_columns(connection, table, ('admin_pengguna',))
+    return 0
+
+
+def pengguna_aktif(connection, dry_run=False):
+    """Kolom ``aktif_pengguna``, satu-satunya kolom bulk update
+    ``PATCH /users/list``."""
+    if not dry_run:
+        for table in (Pengguna.__table__, pengguna_arsip):
+            _add_columns(connection, table, ('aktif_pengguna',))
+    return 0
+
+
+MIGRATIONS = (
+    tabel_baru,
+    profile_user_id_unique,
+    pengguna_permissions_version,
+    tabel_arsip,
+    pengguna_aktivitas,
+    pengguna_admin,
+    pengguna_aktif,
+)
+
+
+def upgrade(connection, dry_run=False):
+    return [(m.__name__, m(connection, dry_run=dry_run)) for m in MIGRATIONS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Migrasi schema CircleApp')
+    parser.add_argument('command', choices=['upgrade'])
+    parser.add_argument('--dry-run', action='store_true',
+                        help=u'hanya hitung tabel dan baris yang akan diubah')
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL'),
+                        help=u'database url, default $DATABASE_URL')
+    args = parser.parse_args(argv)
+
+    engine = sqlalchemy.create_engine(database_url(args.url))
+    with engine.begin() as connection:
+        for name, rows in upgrade(connection, args.dry_run):
+            print('{}: {}'.format(name, rows))
+
+
+if __name__ == '__main__':
+    main()
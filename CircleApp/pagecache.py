@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+    Page Cache
+    ~~~~~~~~~
+
+    Cache hasil render template (halaman utuh atau fragment) di memori
+    proses, LRU dengan batas ukuran total ``max_bytes``.
+
+    Setiap entry diberi tag baris database ``(tabel, id)`` yang dipakai saat
+    render. Entry dibuang begitu baris tersebut di-flush (insert, update,
+    delete), dan key halaman memuat kolom ``modified`` baris, sehingga
+    perubahan dari proses lain juga tidak pernah menyajikan halaman lama::
+
+        @ProfilePage.GET()
+        def profile_get(page, request):
+            user = ...
+            cached = pagecache.cached_page(request, user, user.profile)
+            if cached is not None:
+                return cached
+            ...
+
+    config.yaml::
+
+        page_cache:
+          enabled: True
+          max_bytes: 8388608
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    pagecache.py
+"""
+import threading
+from collections import OrderedDict
+
+import sqlalchemy
+from pyramid.events import NewResponse
+from pyramid.response import Response
+from sqlalchemy.orm import Session
+
+
+MAX_BYTES = 8 * 1024 * 1024
+
+
+def row_tag(row):
+    return (row.__table__.name, row.id)
+
+
+class PageCache(object):
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (body, tags), urutan LRU: paling lama dipakai di depan
+        self._entries = OrderedDict()
+        # tag -> set(key)
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, body, tags=()):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (body, tuple(tags))
+            self.size += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def fragment(self, key, render, tags=()):
+        """Fragment dari cache, atau hasil ``render()`` yang lalu disimpan."""
+        body = self.get(key)
+        if body is None:
+            body = render()
+            self.set(key, body, tags)
+        return body
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def invalidate_table(self, table):
+        with self._lock:
+            for tag in [tag for tag in self._tags if tag[0] == table]:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        body, tags = entry
+        self.size -= len(body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def invalidate_on(cache, *models):
+    """Buang entry ``cache`` setiap baris ``models`` di-flush, termasuk
+    bulk update/delete lewat ``Query`` (seluruh tabel)."""
+    tables = set(model.__table__.name for model in models)
+
+    def _flushed(mapper, connection, target):
+        cache.invalidate(row_tag(target))
+
+    for model in models:
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            sqlalchemy.event.listen(model, name, _flushed)
+
+    def _bulk(update_context):
+        table = update_context.mapper.local_table.name
+        if table in tables:
+            cache.invalidate_table(table)
+
+    sqlalchemy.event.listen(Session, 'after_bulk_update', _bulk)
+    sqlalchemy.event.listen(Session, 'after_bulk_delete', _bulk)
+
+
+def page_key(request, rows):
+    return (
+        request.matched_route.name, request.url, request.locale_name,
+        tuple((row_tag(row), row.modified) for row in rows),
+    )
+
+
+def cached_page(request, *rows):
+    """Response dari cache untuk halaman ``request`` yang dirender dari
+    ``rows``. Jika belum ada, return ``None`` dan response hasil render
+    view ini disimpan ke cache."""
+    cache = request.registry.get('page_cache')
+    if cache is None:
+        return None
+    rows = [row for row in rows if row is not None]
+    key = page_key(request, rows)
+    body = cache.get(key)
+    if body is None:
+        request.environ['circleapp.page_cache'] = (key, [row_tag(row) for row in rows])
+        return None
+    response = Response(body=body, content_type='text/html', charset='utf-8')
+    response.headers['X-Page-Cache'] = 'hit'
+    return response
+
+
+def _store_page(event):
+    pending = event.request.environ.pop('circleapp.page_cache', None)
+    response = event.response
+    if pending is None or response.status_code != 200 \
+            or response.content_type != 'text/html':
+        return
+    key, tags = pending
+    event.request.registry['page_cache'].set(key, response.body, tags)
+    response.headers['X-Page-Cache'] = 'miss'
+
+
+def includeme(config):
+    settings = config.get_settings().get('page_cache') or {}
+    if not settings.get('enabled', True):
+        return
+    config.registry['page_cache'] = PageCache(settings.get('max_bytes', MAX_BYTES))
+    config.add_subscriber(_store_page, NewResponse)
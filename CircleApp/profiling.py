@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+    Profiling
+    ~~~~~~~~~
+
+    Tween opt-in untuk profiling request di production. Request diprofile
+    jika terpilih ``sample_rate`` atau membawa header ``X-Profile`` berisi
+    token yang ditandatangani dengan ``PROFILING_SECRET``::
+
+        PROFILING_SECRET=... python -m CircleApp.profiling token --max-age 3600
+        curl -H "X-Profile: <token>" https://.../users/list
+
+    View dan render template dijalankan di bawah ``cProfile`` dan
+    ``tracemalloc``, hasilnya ditulis ke ``directory``:
+
+    * ``<nama>.collapsed``: stack collapsed (mikrodetik) untuk
+      ``flamegraph.pl``/speedscope, diturunkan dari call graph cProfile
+    * ``<nama>.prof``: data pstats, untuk snakeviz/``pstats``
+    * ``<nama>.alloc.txt``: alokasi memori terbesar per baris
+
+    Hanya satu request diprofile pada satu waktu; request lain berjalan
+    normal. Nama file dikembalikan di header ``X-Profile``.
+
+    config.yaml::
+
+        profiling:
+          enabled: True
+          sample_rate: 0.001
+          directory: /var/log/circleapp/profiles
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    profiling.py
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+
+from pyramid.tweens import INGRESS
+
+from CircleApp import tokens
+
+
+PURPOSE = 'profiling'
+HEADER = 'X-Profile'
+DIRECTORY = '.profiles'
+TOP = 30
+# stack dengan waktu di bawah ini (mikrodetik) tidak ditulis
+MIN_US = 1
+
+_lock = threading.Lock()
+
+
+def _frame(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name.replace(';', ',')
+    return '{}:{}:{}'.format(
+        os.path.basename(filename), lineno, name).replace(';', ',')
+
+
+def collapsed_stacks(stats):
+    """Stack collapsed ``{'a;b;c': mikrodetik}`` dari ``pstats.Stats``.
+
+    cProfile hanya mencatat pasangan caller/callee, jadi waktu fungsi
+    dibagi ke setiap jalur pemanggil sebanding dengan waktu yang
+    dihabiskan lewat caller tersebut (cara yang sama dengan flameprof).
+    """
+    data = stats.stats
+    children = {}
+    for func, (cc, nc, tt, ct, callers) in data.items():
+        for caller, caller_stat in callers.items():
+            children.setdefault(caller, []).append((func, caller_stat[3]))
+
+    out = {}
+
+    def walk(func, path, seen, share):
+        tt, ct = data[func][2], data[func][3]
+        path = path + (_frame(func),)
+        us = int(tt * share * 1e6)
+        if us >= MIN_US:
+            key = ';'.join(path)
+            out[key] = out.get(key, 0) + us
+        for child, child_ct in children.get(func, ()):
+            total = data[child][3]
+            if child in seen or not total:
+                continue
+            child_share = share * child_ct / total
+            if total * child_share * 1e6 >= MIN_US:
+                walk(child, path, seen | {child}, child_share)
+
+    for func, stat in data.items():
+        if not stat[4]:
+            walk(func, (), {func}, 1.0)
+    return out
+
+
+def write_report(directory, name, profile, snapshot, peak):
+    """Tulis ``.prof``, ``.collapsed`` dan ``.alloc.txt``, return path
+    tanpa ekstensi."""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    profile.dump_stats(base + '.prof')
+
+    stacks = collapsed_stacks(pstats.Stats(profile))
+    with open(base + '.collapsed', 'w') as f:
+        for stack, us in sorted(stacks.items()):
+            f.write('{} {}\n'.format(stack, us))
+
+    if snapshot is not None:
+        top = snapshot.statistics('lineno')
+        with open(base + '.alloc.txt', 'w') as f:
+            f.write('total {:.1f} KiB, peak {:.1f} KiB\n\n'.format(
+                sum(stat.size for stat in top) / 1024, peak / 1024))
+            for stat in top[:TOP]:
+                f.write('{}\n'.format(stat))
+    return base
+
+
+def requested(request, settings):
+    secret = request.registry.settings.get('profiling.secret')
+    token = request.headers.get(HEADER)
+    if token and secret and tokens.unsign(token, secret, PURPOSE) is not None:
+        return True
+    rate = settings.get('sample_rate', 0)
+    return bool(rate) and random.random() < rate
+
+
+def profiling_tween_factory(handler, registry):
+    settings = registry.settings.get('profiling') or {}
+    directory = settings.get('directory', DIRECTORY)
+
+    def profiling_tween(request):
+        if not requested(request, settings) or not _lock.acquire(False):
+            return handler(request)
+        try:
+            profile = cProfile.Profile()
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+            profile.enable()
+            try:
+                response = handler(request)
+            finally:
+                profile.disable()
+                snapshot = tracemalloc.take_snapshot() if tracing else None
+                peak = tracemalloc.get_traced_memory()[1] if tracing else 0
+                if tracing:
+                    tracemalloc.stop()
+
+            name = '{}-{}-{}'.format(
+                time.strftime('%Y%m%d-%H%M%S'),
+                re.sub(r'\W+', '_', request.path_info.strip('/')) or 'index',
+                getattr(request, 'request_id', os.getpid()))
+            write_report(directory, name, profile, snapshot, peak)
+            response.headers[HEADER] = name
+            return response
+        finally:
+            _lock.release()
+
+    return profiling_tween
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Token header X-Profile')
+    parser.add_argument('command', choices=['token'])
+    parser.add_argument('--max-age', type=int, default=3600)
+    parser.add_argument('--secret', default=os.environ.get('PROFILING_SECRET'),
+                        help=u'default $PROFILING_SECRET')
+    args = parser.parse_args(argv)
+    if not args.secret:
+        parser.error('PROFILING_SECRET is not set')
+    print(tokens.sign({}, args.secret, PURPOSE, args.max_age))
+
+
+def includeme(config):
+    settings = config.get_settings().get('profiling') or {}
+    if settings.get('enabled', False):
+        # di bawah limiter: waktu menunggu antrian tidak ikut diprofile
+        config.add_tween('CircleApp.profiling.profiling_tween_factory', under=(
+            'CircleApp.limiter.limiter_tween_factory', INGRESS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    Query Cache
+    ~~~~~~~~~
+
+    Cache hasil :meth:`CircleApp.jsonapi.QueryBuilder.get_collection_rows`
+    (data dan total) di memori proses, LRU dengan batas jumlah entry.
+
+    Key berisi query yang dinormalisasi (collection, filter, sort, fields,
+    page) dan versi tabel. Versi tabel dinaikkan setiap flush, bulk
+    update/delete, commit dan rollback yang menyentuh tabel tersebut,
+    sehingga entry lama tidak pernah cocok lagi dan hilang lewat LRU.
+    Versi hanya berlaku di proses ini; ``ttl`` membatasi umur entry untuk
+    perubahan dari worker lain.
+
+    Hit/miss dan jumlah entry (admin): ``GET /_status/query_cache``.
+
+    config.yaml::
+
+        query_cache:
+          enabled: True
+          max_entries: 512
+          ttl: 30
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    querycache.py
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+from CircleApp.encoders import render_json
+
+
+MAX_ENTRIES = 512
+TTL = 30
+
+
+class QueryCache(object):
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._versions = {}
+        # key -> (waktu, value), urutan LRU: paling lama dipakai di depan
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, *tables):
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl and time.time() - entry[0] > self.ttl):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, create):
+        """Value dari cache, atau hasil ``create()`` yang lalu disimpan.
+
+        ``key`` harus sudah memuat :meth:`version` tabel yang dibaca, dan
+        diambil sebelum query dijalankan."""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            # quoted_name (subclass str) tidak diterima encoder orjson
+            'versions': {str(k): v for k, v in self._versions.items()},
+        }
+
+
+def _tables(objects):
+    return set(
+        sqlalchemy.inspect(obj).mapper.local_table.name for obj in objects
+    )
+
+
+def track_flushes(cache):
+    """Naikkan versi tabel di ``cache`` dari event ``Session``.
+
+    Versi dinaikkan saat flush dan sekali lagi saat commit/rollback, supaya
+    hasil query yang dibaca request lain di antara flush dan commit (masih
+    data lama, tapi dengan versi baru) juga tidak terpakai."""
+
+    def _after_flush(session, flush_context):
+        tables = _tables(session.new) | _tables(session.dirty) | _tables(session.deleted)
+        if tables:
+            session.info.setdefault('query_cache_tables', set()).update(tables)
+            cache.bump(*tables)
+
+    def _bulk(update_context):
+        table = update_context.mapper.local_table.name
+        update_context.session.info.setdefault('query_cache_tables', set()).add(table)
+        cache.bump(table)
+
+    def _end(session):
+        tables = session.info.pop('query_cache_tables', None)
+        if tables:
+            cache.bump(*tables)
+
+    sqlalchemy.event.listen(Session, 'after_flush', _after_flush)
+    sqlalchemy.event.listen(Session, 'after_bulk_update', _bulk)
+    sqlalchemy.event.listen(Session, 'after_bulk_delete', _bulk)
+    sqlalchemy.event.listen(Session, 'after_commit', _end)
+    sqlalchemy.event.listen(Session, 'after_soft_rollback', lambda session, previous: _end(session))
+
+
+def status_query_cache(request):
+    cache = request.registry.get('query_cache')
+    return render_json(request, cache.stats() if cache is not None else {'enabled': False})
+
+
+def includeme(config):
+    settings = config.get_settings().get('query_cache') or {}
+    config.add_route('status_query_cache', '/_status/query_cache')
+    config.add_view(status_query_cache, route_name='status_query_cache', permission='admin')
+    if not settings.get('enabled', True):
+        return
+    cache = QueryCache(
+        settings.get('max_entries', MAX_ENTRIES), settings.get('ttl', TTL))
+    track_flushes(cache)
+    config.registry['query_cache'] = cache
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+    Startup
+    ~~~~~~~~~
+
+    Mode startup dan catatan waktu per fase startup worker.
+
+    config.yaml (atau env ``STARTUP_MODE``)::
+
+        startup:
+          mode: production
+
+    Mode ``production`` tidak menjalankan ``create_all``/``drop_all`` (dan
+    reflection tabel) milik baka_tenshi setiap proses start; schema dibuat
+    lewat migrasi. Mode ``development`` mengikuti ``tenshi.should_create_all``.
+
+    Breakdown fase startup dan waktu import per package::
+
+        python -m CircleApp.startup report
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    startup.py
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+from baka.log import log
+from pyramid.events import ApplicationCreated
+
+
+MODES = ('development', 'production')
+
+# [(fase, detik), ...] sejak modul ini di-import
+PHASES = []
+_last = [time.perf_counter()]
+
+
+def mark(name):
+    """Catat fase ``name``: waktu sejak :func:`mark` sebelumnya."""
+    now = time.perf_counter()
+    PHASES.append((name, now - _last[0]))
+    _last[0] = now
+
+
+def startup_mode(settings):
+    mode = settings.get('startup.mode') or \
+        (settings.get('startup') or {}).get('mode', 'development')
+    if mode not in MODES:
+        raise ValueError('startup mode must be one of {}: {!r}'.format(MODES, mode))
+    return mode
+
+
+def breakdown():
+    """Fase startup dalam milidetik, ditambah ``total``."""
+    phases = [(name, round(seconds * 1000, 1)) for name, seconds in PHASES]
+    phases.append(('total', round(sum(ms for _, ms in phases), 1)))
+    return phases
+
+
+def import_times(module='CircleApp.app', top=15):
+    """Waktu import (self, milidetik) per top-level package saat import
+    ``module``, dari ``python -X importtime`` di proses terpisah."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)', line)
+        if match:
+            package = match.group(2).split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match.group(1))
+    return [
+        (package, round(us / 1000, 1))
+        for package, us in sorted(packages.items(), key=lambda i: -i[1])[:top]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Breakdown waktu startup')
+    parser.add_argument('command', choices=['report'])
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    from CircleApp.app import app
+    app.config.make_wsgi_app()
+    print('fase startup (ms):')
+    for name, ms in breakdown():
+        print('  {:<24} {:>8}'.format(name, ms))
+    print('import per package (ms, proses baru):')
+    for package, ms in import_times(top=args.top):
+        print('  {:<24} {:>8}'.format(package, ms))
+
+
+def includeme(config):
+    settings = config.get_settings()
+    mode = startup_mode(settings)
+    if mode == 'production':
+        # include sebelum baka_tenshi supaya bind_engine tidak create/drop
+        settings['tenshi'] = dict(
+            settings.get('tenshi') or {},
+            should_create_all=False,
+            should_drop_all=False)
+    config.registry['startup_mode'] = mode
+
+    def _ready(event):
+        mark('commit')
+        event.app.registry['startup_phases'] = breakdown()
+        log.info('startup %s: %s', mode, ', '.join(
+            '{} {}ms'.format(name, ms) for name, ms in breakdown()))
+
+    config.add_subscriber(_ready, ApplicationCreated)
+
+
+if __name__ == '__main__':
+    # lewat modul CircleApp.startup supaya PHASES yang dicatat app.py sama
+    from CircleApp.startup import main
+    main()
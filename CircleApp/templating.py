@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+    Template Cache
+    ~~~~~~~~~
+
+    Renderer template ``.html`` (plim/Mako) dan cache modul Python hasil
+    compile template di disk, dipakai bersama oleh semua worker. Nama modul
+    diturunkan dari hash isi template (plus versi Mako/plim dan opsi
+    lookup), jadi template yang berubah otomatis mendapat modul baru dan
+    modul lama tidak pernah dipakai ulang.
+
+    config.yaml::
+
+        templates:
+          module_directory: /var/cache/circleapp/mako
+          filesystem_checks: True
+
+    Dengan ``filesystem_checks`` mati template yang sudah di-load tidak
+    di-stat lagi setiap render. Default hidup di mode startup
+    ``development`` (template yang diedit langsung terpakai); mode
+    ``production`` selalu mematikannya, apapun isi config. Precompile
+    semua template saat build::
+
+        python -m CircleApp.templating compile
+
+    Mako, pyramid_mako dan plim baru di-import saat template pertama
+    dirender; plim bahkan hanya saat template perlu di-compile, sehingga
+    dengan cache modul yang sudah terisi plim tidak pernah di-import.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    templating.py
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+
+import pkg_resources
+from pyramid.interfaces import IRendererFactory
+from pyramid.path import AssetResolver, DottedNameResolver
+from pyramid.settings import asbool
+
+from CircleApp.startup import startup_mode
+
+
+def _version(dist):
+    try:
+        return pkg_resources.get_distribution(dist).version
+    except pkg_resources.DistributionNotFound:
+        return ''
+
+
+class HashedModuleName(object):
+    """``modulename_callable`` untuk Mako ``TemplateLookup``: path modul
+    ``<module_directory>/<uri>-<hash isi template>.py``."""
+
+    def __init__(self, module_directory, lookup):
+        import mako
+        self.module_directory = module_directory
+        args = lookup.template_args
+        self.salt = repr((
+            mako.__version__, _version('plim'),
+            args.get('default_filters'), args.get('imports'),
+            args.get('strict_undefined'), args.get('preprocessor') is not None,
+        )).encode('utf-8')
+
+    def __call__(self, filename, uri):
+        digest = hashlib.sha1(self.salt)
+        with open(filename, 'rb') as f:
+            digest.update(f.read())
+        name = re.sub(r'\W', '_', uri.lstrip('/'))
+        return os.path.join(
+            self.module_directory,
+            '{}-{}.py'.format(name, digest.hexdigest()[:16]))
+
+
+def plim_preprocessor(source):
+    from plim import preprocessor
+    return preprocessor(source)
+
+
+class TemplateRendererFactory(object):
+    """Renderer factory seperti ``add_plim_renderer``/``add_mako_renderer``
+    milik pyramid_mako, tapi ``TemplateLookup`` baru dibuat saat pertama
+    dipakai."""
+
+    def __init__(self, registry, plim=True, settings_prefix='mako.'):
+        self.registry = registry
+        self.plim = plim
+        self.settings_prefix = settings_prefix
+        self._lookup = None
+        self._lock = threading.Lock()
+
+    @property
+    def lookup(self):
+        if self._lookup is None:
+            with self._lock:
+                if self._lookup is None:
+                    self._lookup = self.create_lookup()
+        return self._lookup
+
+    def create_lookup(self):
+        from pyramid_mako import (
+            PkgResourceTemplateLookup, parse_options_from_settings)
+        settings = dict(self.registry.settings)
+        if self.plim:
+            settings[self.settings_prefix + 'preprocessor'] = plim_preprocessor
+        opts = parse_options_from_settings(
+            settings, self.settings_prefix, DottedNameResolver().maybe_resolve)
+        lookup = PkgResourceTemplateLookup(**opts)
+        configure_lookup(self.registry, lookup)
+        return lookup
+
+    def __call__(self, info):
+        from pyramid_mako import MakoRendererFactory
+        factory = MakoRendererFactory()
+        factory.lookup = self.lookup
+        return factory(info)
+
+
+def renderer_lookup(registry):
+    """``TemplateLookup`` milik renderer template (``.html``)."""
+    ext = registry.settings.get('armor', {}).get('ext', '.html')
+    factory = registry.queryUtility(IRendererFactory, name=ext)
+    return getattr(factory, 'lookup', None)
+
+
+def configure_lookup(registry, lookup):
+    settings = registry.settings.get('templates') or {}
+    lookup.filesystem_checks = startup_mode(registry.settings) != 'production' and \
+        settings.get('filesystem_checks', True)
+    module_directory = settings.get('module_directory')
+    if module_directory:
+        if ':' in module_directory and not os.path.isabs(module_directory):
+            module_directory = AssetResolver().resolve(module_directory).abspath()
+        os.makedirs(module_directory, exist_ok=True)
+        lookup.template_args['module_directory'] = module_directory
+        lookup.modulename_callable = HashedModuleName(module_directory, lookup)
+
+
+def template_uris(package, ext='.html'):
+    """Semua template di folder ``templates`` dalam ``package``, sebagai
+    asset spec ``package:path/file.html``."""
+    root = AssetResolver(package).resolve('').abspath()
+    for dirpath, dirnames, filenames in os.walk(root):
+        if os.path.basename(dirpath) != 'templates':
+            continue
+        for filename in sorted(filenames):
+            if filename.endswith(ext):
+                relpath = os.path.relpath(os.path.join(dirpath, filename), root)
+                yield '{}:{}'.format(package, relpath.replace(os.sep, '/'))
+
+
+def compile_all(registry):
+    """Compile semua template ke ``module_directory``, return list uri."""
+    lookup = renderer_lookup(registry)
+    package = registry.settings.get('package', 'CircleApp')
+    ext = registry.settings.get('armor', {}).get('ext', '.html')
+    uris = list(template_uris(package, ext))
+    for uri in uris:
+        lookup.get_template(uri)
+    return uris
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Precompile template')
+    parser.add_argument('command', choices=['compile'])
+    parser.parse_args(argv)
+
+    from CircleApp.app import app
+    app.config.commit()
+    for uri in compile_all(app.config.registry):
+        print(uri)
+
+
+def includeme(config):
+    armors = config.get_settings().get('armor', {})
+    config.add_renderer(armors.get('ext', '.html'), TemplateRendererFactory(
+        config.registry, plim=asbool(armors.get('plim', True))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+    Token
+    ~~~~~~~~~
+
+    Token kecil yang ditandatangani (HMAC-SHA256) dan punya waktu
+    kedaluwarsa, format ``<payload base64url>.<signature base64url>``.
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    tokens.py
+"""
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import time
+
+from pyramid.exceptions import ConfigurationError
+
+
+#: ``session_key`` bawaan ``Baka``, diketahui semua orang
+DEFAULT_SECRET = 'sekret'
+MIN_SECRET_LENGTH = 16
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    data = data.encode('ascii')
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+@functools.lru_cache(maxsize=32)
+def _key(secret, purpose):
+    # dipanggil setiap verifikasi token login, key turunan cukup dihitung sekali
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, purpose.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign(payload, secret, purpose, max_age):
+    """Buat token dari dict ``payload`` yang berlaku ``max_age`` detik.
+
+    ``purpose`` membedakan token untuk keperluan berbeda (mis. reset kunci)
+    supaya tidak bisa dipakai di tempat lain.
+    """
+    payload = dict(payload, exp=int(time.time()) + max_age)
+    body = _b64encode(json.dumps(
+        payload, separators=(',', ':'), sort_keys=True
+    ).encode('utf-8'))
+    sig = hmac.new(_key(secret, purpose), body.encode('ascii'), hashlib.sha256)
+    return '{}.{}'.format(body, _b64encode(sig.digest()))
+
+
+def unsign(token, secret, purpose):
+    """Payload dari token yang valid dan belum kedaluwarsa, selain itu
+    ``None``."""
+    try:
+        body, sig = token.split('.')
+        expected = hmac.new(
+            _key(secret, purpose), body.encode('ascii'), hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64decode(sig)):
+            return None
+        payload = json.loads(_b64decode(body).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if payload.get('exp', 0) < time.time():
+        return None
+    return payload
+
+
+def configured_secret(settings, name, varname):
+    """Secret ``settings[name]`` yang diisi dari environment ``varname``.
+    Aplikasi tidak boleh start dengan secret kosong, terlalu pendek, atau
+    secret bawaan Baka, karena siapa pun bisa membuat token yang valid."""
+    secret = settings.get(name)
+    if not secret or secret == DEFAULT_SECRET or len(secret) < MIN_SECRET_LENGTH:
+        raise ConfigurationError(
+            '{} must be set to a random value of at least {} characters'.format(
+                varname, MIN_SECRET_LENGTH))
+    return secret
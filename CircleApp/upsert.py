@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+    Upsert
+    ~~~~~~~~~
+
+    ``INSERT ... ON CONFLICT (...) DO UPDATE`` untuk SQLite (>= 3.24) dan
+    PostgreSQL. SQLAlchemy 1.3 hanya menyediakan
+    ``postgresql.insert().on_conflict_do_update``; konstruksi ini memakai
+    sintaks ``excluded.<kolom>`` yang sama di kedua database::
+
+        stmt = upsert(Profile.__table__, ['user_id'], ['nama_depan', 'modified'])
+        session.execute(stmt.values(...))
+
+    Default kolom (``pid``, ``created``, ``modified``) tetap diisi seperti
+    insert biasa, kolom ``update`` diambil dari baris yang gagal di-insert.
+    Kolom ``increment`` dijumlahkan dengan nilai baru
+    (``jumlah = rekap.jumlah + excluded.jumlah``), atomik tanpa
+    ``UPDATE`` lalu ``INSERT``::
+
+        upsert(RekapPendaftaran.__table__, ['tanggal'], ['modified'], ['jumlah'])
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    upsert.py
+"""
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Insert
+
+
+class Upsert(Insert):
+
+    def __init__(self, table, index_elements, update, increment=(), **kwargs):
+        super(Upsert, self).__init__(table, **kwargs)
+        self.index_elements = tuple(index_elements)
+        self.update_columns = tuple(update)
+        self.increment_columns = tuple(increment)
+
+
+def upsert(table, index_elements, update, increment=()):
+    """Insert ke ``table``; jika bentrok di unique ``index_elements``
+    (nama kolom), update kolom ``update`` dengan nilai baru dan tambahkan
+    nilai baru ke kolom ``increment``."""
+    return Upsert(table, index_elements, update, increment)
+
+
+@compiles(Upsert)
+def _compile_upsert(element, compiler, **kw):
+    raise CompileError(
+        'Upsert is not supported by dialect {}'.format(compiler.dialect.name))
+
+
+@compiles(Upsert, 'sqlite')
+@compiles(Upsert, 'postgresql')
+def _compile_on_conflict(element, compiler, **kw):
+    quote = compiler.preparer.quote
+    table = compiler.preparer.format_table(element.table)
+    return '{} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        compiler.visit_insert(element, **kw),
+        ', '.join(quote(name) for name in element.index_elements),
+        ', '.join(['{0} = excluded.{0}'.format(quote(name))
+                   for name in element.update_columns] +
+                  ['{0} = {1}.{0} + excluded.{0}'.format(quote(name), table)
+                   for name in element.increment_columns]))
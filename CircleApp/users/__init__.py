@@ -1,5 +1,12 @@
 
 
+from CircleApp import tokens
+
+
 def includeme(config):
+    # link reset kunci ditandatangani dengan RESET_SECRET, bukan secret_key
+    tokens.configured_secret(config.get_settings(), 'reset.secret', 'RESET_SECRET')
     config.include('.model')
+    config.include('.rekap')
+    config.include('.typeahead')
     config.include('.view')
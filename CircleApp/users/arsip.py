@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    Arsip Pengguna
+    ~~~~~~~~~
+
+    Pengguna yang tidak aktif (``modified`` dan ``last_seen`` lebih lama
+    dari ``--days`` hari) dipindahkan beserta profile-nya ke tabel
+    ``pengguna_arsip`` dan ``profile_arsip`` (:mod:`CircleApp.users.model`),
+    supaya list, count, pencarian dan unique index hanya membaca pengguna
+    aktif.
+
+    Pemindahan berjalan di worker :mod:`CircleApp.jobs`, per batch
+    ``--batch-size`` pengguna dalam satu transaksi. Satu tugas memproses
+    paling banyak ``MAX_BATCHES`` batch lalu mengantri lanjutannya, jadi
+    tidak ada transaksi atau tugas yang panjang::
+
+        DATABASE_URL=... python -m CircleApp.users.arsip enqueue --days 365
+        DATABASE_URL=... python -m CircleApp.users.arsip run --days 365 --dry-run
+
+    ``Pengguna.get_by_username``/``get_by_email`` tetap memeriksa arsip
+    untuk cek unik; login, atau reset kata kunci saat link dipakai,
+    memindahkan pengguna yang diarsipkan kembali.
+    ``include_archived=1`` pada ``/users/list`` dan ``/users/table``
+    membaca kedua tabel.
+
+    Worker tidak memperbarui cache query dan index typeahead proses web:
+    pengguna yang diarsipkan hilang dari cache setelah TTL, dan dari
+    typeahead setelah index dimuat ulang.
+
+    arsip.py
+"""
+import argparse
+import datetime
+import os
+import time
+
+import sqlalchemy
+from baka.log import log
+from baka.settings import database_url
+
+from CircleApp.jobs import JobQueue, task
+from CircleApp.users.model import Pengguna, arsipkan_pengguna, pengguna_arsip, profile_arsip
+
+
+TASK = 'arsip_pengguna'
+INACTIVE_DAYS = 365
+BATCH_SIZE = 500
+MAX_BATCHES = 20
+# detik di antara batch, memberi kesempatan penulis lain (lock SQLite)
+PAUSE = 0.1
+
+_engine = None
+
+
+def engine():
+    """Engine worker dari ``DATABASE_URL``, dibuat di proses worker."""
+    global _engine
+    if _engine is None:
+        _engine = sqlalchemy.create_engine(database_url(os.environ.get('DATABASE_URL')))
+    return _engine
+
+
+def tidak_aktif(table, cutoff):
+    last_seen = table.c.terlihat_terakhir
+    return sqlalchemy.and_(
+        table.c.modified < cutoff,
+        sqlalchemy.or_(last_seen.is_(None), last_seen < cutoff),
+    )
+
+
+def batch(connection, cutoff, batch_size=BATCH_SIZE, after_id=0, dry_run=False):
+    """Arsipkan paling banyak ``batch_size`` pengguna tidak aktif dengan id
+    di atas ``after_id``.
+
+    Returns:
+        tuple: ``(jumlah, id terakhir)``
+    """
+    table = Pengguna.__table__
+    ids = [row[0] for row in connection.execute(
+        sqlalchemy.select([table.c.id]).where(sqlalchemy.and_(
+            table.c.id > after_id, tidak_aktif(table, cutoff),
+        )).order_by(table.c.id).limit(batch_size).with_for_update()
+    )]
+    if ids and not dry_run:
+        arsipkan_pengguna(connection, ids)
+    return len(ids), ids[-1] if ids else after_id
+
+
+def arsipkan(bind, cutoff, batch_size=BATCH_SIZE, after_id=0,
+             max_batches=None, dry_run=False):
+    """Jalankan :func:`batch` berulang, setiap batch dalam transaksinya
+    sendiri.
+
+    Returns:
+        tuple: ``(jumlah, id terakhir)``, id ``None`` jika tidak ada lagi
+        pengguna yang perlu diarsipkan.
+    """
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        if batches:
+            time.sleep(PAUSE)
+        with bind.begin() as connection:
+            count, after_id = batch(connection, cutoff, batch_size, after_id, dry_run)
+        total += count
+        batches += 1
+        if count < batch_size:
+            return total, None
+    return total, after_id
+
+
+def enqueue(queue, days=INACTIVE_DAYS, batch_size=BATCH_SIZE, after_id=0, cutoff=None):
+    """Antri tugas arsip, return id tugas. ``cutoff`` (timestamp UTC)
+    dihitung sekali dan dibawa oleh tugas lanjutan."""
+    if cutoff is None:
+        cutoff = time.time() - days * 24 * 60 * 60
+    return queue.enqueue(TASK, {
+        'cutoff': cutoff,
+        'batch_size': batch_size,
+        'after_id': after_id,
+    })
+
+
+@task(TASK)
+def arsipkan_tugas(payload):
+    total, after_id = arsipkan(
+        engine(), datetime.datetime.utcfromtimestamp(payload['cutoff']),
+        payload['batch_size'], payload['after_id'], MAX_BATCHES)
+    log.info('arsip pengguna: %s diarsipkan sampai id %s', total, after_id)
+    if after_id is not None:
+        enqueue(JobQueue(os.environ.get('JOBS_DATABASE')),
+                batch_size=payload['batch_size'], after_id=after_id,
+                cutoff=payload['cutoff'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Arsip pengguna tidak aktif')
+    parser.add_argument('command', choices=['enqueue', 'run'])
+    parser.add_argument('--days', type=int, default=INACTIVE_DAYS,
+                        help=u'tidak aktif lebih dari sekian hari')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true',
+                        help=u'run: hanya hitung pengguna yang akan diarsipkan')
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL'),
+                        help=u'database url, default $DATABASE_URL')
+    parser.add_argument('--database', default=os.environ.get('JOBS_DATABASE'),
+                        help=u'database antrian tugas, default $JOBS_DATABASE')
+    args = parser.parse_args(argv)
+
+    if args.command == 'enqueue':
+        print('tugas #{}'.format(enqueue(JobQueue(args.database), args.days, args.batch_size)))
+        return
+
+    bind = sqlalchemy.create_engine(database_url(args.url))
+    pengguna_arsip.create(bind, checkfirst=True)
+    profile_arsip.create(bind, checkfirst=True)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=args.days)
+    total, _ = arsipkan(bind, cutoff, args.batch_size, dry_run=args.dry_run)
+    print('pengguna_arsip: {} pengguna'.format(total))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,56 +11,57 @@ USERNAME_PATTERN = '(?i)^[A-Z0-9._]+$'
 EMAIL_MAX_LENGTH = 100
 PASSWORD_MIN_LENGTH = 4
 
-@colander.deferred
-def email_validator(node, kw):
-    request = kw.get('request')
-    is_edit = request.params.get('is_edit', False)
+USERNAME_REGEX = re.compile(USERNAME_PATTERN)
+
+# validator statis cukup dibuat sekali
+_email = validators.Email()
+_username_length = validators.Length(min=USERNAME_MIN_LENGTH, max=USERNAME_MAX_LENGTH)
+_password_length = validators.Length(min=PASSWORD_MIN_LENGTH)
+
 
-    def validator(_node, value):
-        User = request.find_model('pengguna')
-        user = User.get_by_email(request.db, value)
-        if not asbool(is_edit) and user and str(user.email) == request.params.get('email'):
-            raise colander.Invalid(
-                _node,
-                u'Email is invalid or already taken',
-            )
-    return colander.All(validators.Email(), validator,)
+@forms.request_validator
+def _email_taken(node, value, request):
+    is_edit = request.params.get('is_edit', False)
+    User = request.find_model('pengguna')
+    user = User.get_by_email(request.db, value)
+    if not asbool(is_edit) and user and str(user.email) == request.params.get('email'):
+        raise colander.Invalid(
+            node,
+            u'Email is invalid or already taken',
+        )
 
 
-@colander.deferred
-def user_validator(node, kw):
-    request = kw.get('request')
+@forms.request_validator
+def _username_taken(node, value, request):
     is_edit = request.params.get('is_edit', False)
+    User = request.find_model('pengguna')
+    user = User.get_by_username(request.db, value)
+    username = request.params.get('username', '')
+    if not USERNAME_REGEX.match(username):
+        raise colander.Invalid(
+            node,
+            u'username must have only letters, numbers, periods, and underscores.',
+        )
+
+    if not asbool(is_edit) and user and str(user.username).lower() == username.lower():
+        raise colander.Invalid(
+            node,
+            u'Username is already taken',
+        )
+
 
-    def validator(_node, value):
-        User = request.find_model('pengguna')
-        user = User.get_by_username(request.db, value)
-        username = request.params.get('username', '')
-        if not re.match(USERNAME_PATTERN, username):
-            raise colander.Invalid(
-                _node,
-                u'username must have only letters, numbers, periods, and underscores.',
-            )
-
-        if not asbool(is_edit) and user and str(user.username).lower() == username.lower():
-            raise colander.Invalid(
-                _node,
-                u'Username is already taken',
-            )
-    return colander.All(validators.Length(min=USERNAME_MIN_LENGTH, max=USERNAME_MAX_LENGTH), validator,)
-
-
-@colander.deferred
-def password_validator(node, kw):
-    request = kw.get('request')
-
-    def validator(_node, value):
-        if value and request.params.get('password_confirm') != value:
-            raise colander.Invalid(
-                _node,
-                u'Password and confirm is not equal',
-            )
-    return colander.All(validators.Length(min=PASSWORD_MIN_LENGTH), validator,)
+@forms.request_validator
+def _password_confirm(node, value, request):
+    if value and request.params.get('password_confirm') != value:
+        raise colander.Invalid(
+            node,
+            u'Password and confirm is not equal',
+        )
+
+
+email_validator = colander.All(_email, _email_taken,)
+user_validator = colander.All(_username_length, _username_taken,)
+password_validator = colander.All(_password_length, _password_confirm,)
 
 
 class _UserEditSchema(forms.BaseSchema):
@@ -110,4 +111,67 @@ class UserAddForm(_UserForm):
 
 
 class UserEditForm(_UserForm):
-    _schema = _UserEditSchema
\ No newline at end of file
+    _schema = _UserEditSchema
+
+
+class _ForgotSchema(forms.BaseSchema):
+    email_or_username = colander.SchemaNode(
+        colander.String(),
+        validator=validators.Length(max=EMAIL_MAX_LENGTH)
+    )
+
+
+class _LoginSchema(forms.BaseSchema):
+    email_or_username = colander.SchemaNode(
+        colander.String(),
+        validator=validators.Length(max=EMAIL_MAX_LENGTH)
+    )
+    password = colander.SchemaNode(
+        colander.String()
+    )
+
+
+class _ResetSchema(forms.BaseSchema):
+    password = colander.SchemaNode(
+        colander.String(),
+        validator=password_validator
+    )
+    password_confirm = colander.SchemaNode(
+        colander.String()
+    )
+
+
+class ForgotForm(forms.BaseForm):
+    _schema = _ForgotSchema
+
+    def get_user(self, restore=False):
+        value = self._controls.get('email_or_username')
+        User = self.request.find_model('pengguna')
+        if '@' in value:
+            return User.get_by_email(self.request.db, value, restore=restore)
+        return User.get_by_username(self.request.db, value, restore=restore)
+
+    def submit(self, model=None):
+        # pengguna dari arsip tetap di arsip sampai link reset dipakai
+        return self.get_user()
+
+
+class LoginForm(ForgotForm):
+    _schema = _LoginSchema
+
+    def submit(self, model=None):
+        user = self.get_user()
+        if user is None or not user.active or \
+                not user.check_password(self._controls.get('password')):
+            return None
+        if user.archived:
+            user = self.request.find_model('pengguna').restore(self.request.db, user.id)
+        return user
+
+
+class ResetForm(forms.BaseForm):
+    _schema = _ResetSchema
+
+    def submit(self, model=None):
+        model.password = self._controls.get('password')
+        return model
@@ -1,20 +1,44 @@
 import datetime
 
+import bcrypt
 import sqlalchemy
 from baka_tenshi import Model, DB, util
 from baka_tenshi.type import PasswordType, GUID
 from sqlalchemy.ext.hybrid import hybrid_property
 
+from CircleApp.db import mark_changed
+from CircleApp.upsert import upsert
+
 
 EMAIL_MAX_LENGTH = 100
 
 
+class _PasswordType(PasswordType):
+    """PasswordType yang membandingkan hash apa adanya. ``Password.__eq__``
+    meng-hash operand lain dengan bcrypt, sehingga deteksi perubahan saat
+    flush gagal ketika kata kunci pengguna yang sudah ada diganti."""
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return str.__eq__(str(x), str(y))
+
+
 class Pengguna(Model):
 
     __tablename__ = u'pengguna'
 
     prefix = u'usr-'
 
+    #: tidak pernah di-expose :func:`CircleApp.utils.model_fields` (list,
+    #: DataTables) dan tidak bisa dipakai filter/sort; ``__bulk_update__``
+    #: tetap bisa ditulis lewat bulk update
+    __private__ = ('password', '_password', 'is_admin', 'active', 'permissions_version',
+                   'last_login', 'last_seen')
+
+    #: satu-satunya kolom yang boleh diubah bulk ``PATCH /users/list``
+    __bulk_update__ = ('active',)
+
     # Normalised user identifier
     uid = DB.Column('uid', GUID())
 
@@ -31,12 +55,32 @@ class Pengguna(Model):
                                 server_default=DB.func.now(),
                                 nullable=False)
 
-    _password = DB.Column('kunci_pengguna', PasswordType(), nullable=False)
+    _password = DB.Column('kunci_pengguna', _PasswordType(), nullable=False)
 
     password_updated = DB.Column('kunci_ubah_pengguna', DB.DateTime(), nullable=True)
 
+    #: Naik setiap kata kunci diganti, token login dengan versi lama ditolak
+    permissions_version = DB.Column('versi_izin', DB.Integer(), nullable=False,
+                                    default=0, server_default='0')
+
+    #: principal ``group:admin`` (:mod:`CircleApp.auth`), untuk aksi bulk
+    is_admin = DB.Column('admin_pengguna', DB.Boolean(name='admin'), nullable=False,
+                         default=False, server_default=sqlalchemy.false())
+
+    #: pengguna nonaktif tidak bisa login dan token lamanya tidak lagi
+    #: diautentikasi (:mod:`CircleApp.auth`)
+    active = DB.Column('aktif_pengguna', DB.Boolean(name='aktif'), nullable=False,
+                       default=True, server_default=sqlalchemy.true())
+
+    #: ditulis write-behind oleh :mod:`CircleApp.activity`
+    last_login = DB.Column('login_terakhir', DB.DateTime(), nullable=True)
+    last_seen = DB.Column('terlihat_terakhir', DB.DateTime(), nullable=True)
+
     profile = DB.relationship('Profile', uselist=False, back_populates="user")
 
+    #: ``True`` untuk instance transient dari ``pengguna_arsip``
+    archived = False
+
     def __init__(self):
         self.uid = util.guid()
 
@@ -56,20 +100,77 @@ class Pengguna(Model):
     def password(self, value):
         self._password = value
         self.password_updated = datetime.datetime.utcnow()
+        self.permissions_version = (self.permissions_version or 0) + 1
+
+    def check_password(self, value):
+        """Cocokkan ``value`` dengan hash bcrypt kata kunci."""
+        if not self._password or not value:
+            return False
+        return bcrypt.checkpw(value.encode('utf-8'), str(self._password).encode('utf-8'))
+
+    @classmethod
+    def get_by_email(cls, session, email, restore=False):
+        """Fetch a user by email address, see :meth:`_lookup`."""
+        return cls._lookup(
+            session,
+            sqlalchemy.func.lower(cls.email) == email.lower(),
+            sqlalchemy.func.lower(pengguna_arsip.c.email_pengguna) == email.lower(),
+            restore)
+
+    @classmethod
+    def get_by_username(cls, session, username, restore=False):
+        """Fetch a user by username, see :meth:`_lookup`."""
+        return cls._lookup(
+            session,
+            cls.username == username,
+            pengguna_arsip.c.nama_pengguna == username,
+            restore)
 
     @classmethod
-    def get_by_email(cls, session, email):
-        """Fetch a user by email address."""
-        return session.query(cls).filter(
-            sqlalchemy.func.lower(cls.email) == email.lower()
+    def get_by_uid(cls, session, uid, restore=False):
+        """Fetch a user by uid, see :meth:`_lookup`."""
+        return cls._lookup(session, cls.uid == uid, pengguna_arsip.c.uid == uid, restore)
+
+    @classmethod
+    def _lookup(cls, session, criterion, archived, restore):
+        """Cari di ``pengguna`` lalu di ``pengguna_arsip``. Pengguna dari
+        arsip dikembalikan sebagai instance transient dengan
+        ``archived=True`` (cukup untuk cek unik dan cek kata kunci), atau
+        dipindahkan kembali ke ``pengguna`` jika ``restore``."""
+        user = session.query(cls).filter(criterion).first()
+        if user is not None:
+            return user
+        row = session.execute(
+            sqlalchemy.select([pengguna_arsip]).where(archived).limit(1)
         ).first()
+        if row is None:
+            return None
+        if restore:
+            return cls.restore(session, row.id)
+        user = cls.__mapper__.class_manager.new_instance()
+        for column in cls.__table__.columns:
+            prop = cls.__mapper__.get_property_by_column(column)
+            setattr(user, prop.key, row[column.name])
+        user.archived = True
+        return user
 
     @classmethod
-    def get_by_username(cls, session, username):
-        """Fetch a user by username."""
-        return session.query(cls).filter(
-            cls.username == username
+    def restore(cls, session, id_):
+        """Pindahkan pengguna ``id_`` dari arsip ke ``pengguna`` dalam
+        transaksi ``session``, return instance-nya."""
+        row = session.execute(
+            sqlalchemy.select([pengguna_arsip.c.uid, pengguna_arsip.c.nama_pengguna,
+                               pengguna_arsip.c.email_pengguna])
+            .where(pengguna_arsip.c.id == id_)
         ).first()
+        if row is not None:
+            pulihkan_pengguna(session, [id_])
+            mark_changed(session)
+            # statement Core tidak terlihat oleh event querycache dan typeahead
+            session.info.setdefault('query_cache_tables', set()).update(
+                str(table.name) for table in ARCHIVES)
+            session.info.setdefault('typeahead', []).append((id_,) + tuple(row))
+        return session.query(cls).get(id_)
 
 
 class Profile(Model):
@@ -78,6 +179,11 @@ class Profile(Model):
 
     prefix = u'prf-'
 
+    # satu profile per pengguna, juga target ON CONFLICT di :meth:`upsert`
+    __table_args__ = (
+        DB.Index('uq_profile_user_id', 'user_id', unique=True),
+    )
+
     # Normalised user identifier
     uid = DB.Column('uid', GUID())
 
@@ -96,6 +202,105 @@ class Profile(Model):
     def __init__(self):
         self.uid = util.guid()
 
+    @classmethod
+    def upsert(cls, session, user_uid, values):
+        """Simpan profile pengguna ``user_uid`` dalam satu statement:
+        ``INSERT ... SELECT`` dari ``pengguna``, atau update jika pengguna
+        sudah punya profile. ``values`` berisi nama atribut dan nilainya.
+
+        Return jumlah baris, 0 jika pengguna tidak ditemukan."""
+        names = [getattr(cls, key).property.columns[0].name for key in values]
+        select = sqlalchemy.select(
+            [sqlalchemy.literal(util.guid(), GUID()), Pengguna.id] +
+            [sqlalchemy.literal(value, getattr(cls, key).type)
+             for key, value in values.items()]
+        ).where(Pengguna.uid == user_uid)
+        stmt = upsert(cls.__table__, ['user_id'], names + ['modified']).from_select(
+            ['uid', 'user_id'] + names, select)
+        result = session.execute(stmt)
+        # statement Core tidak terlihat oleh unit of work
+        mark_changed(session)
+        return result.rowcount
+
+
+class RekapPendaftaran(Model):
+    """Jumlah pendaftaran pengguna per hari, di-update incremental oleh
+    :mod:`CircleApp.users.rekap`."""
+
+    __tablename__ = u'rekap_pendaftaran'
+
+    tanggal = DB.Column('tanggal', DB.Date(), nullable=False, unique=True)
+    jumlah = DB.Column('jumlah', DB.Integer(), nullable=False, default=0)
+
+
+def _tabel_arsip(table, name, *args):
+    """Tabel arsip dengan kolom ``table`` tanpa constraint selain primary
+    key. ``created``/``modified`` ditambahkan baka_tenshi dan nilainya
+    disalin apa adanya. ``server_default`` ikut disalin supaya kolom
+    ``NOT NULL`` baru bisa ditambahkan ke tabel arsip yang sudah berisi."""
+    columns = [
+        sqlalchemy.Column(c.name, c.type, primary_key=c.primary_key,
+                          nullable=c.nullable, autoincrement=False,
+                          server_default=c.server_default.arg if c.server_default is not None else None)
+        for c in table.columns if c.name not in ('created', 'modified')
+    ]
+    columns.append(sqlalchemy.Column('diarsipkan', sqlalchemy.DateTime(), nullable=False))
+    return sqlalchemy.Table(name, Model.metadata, *(columns + list(args)))
+
+
+#: pengguna tidak aktif, lihat :mod:`CircleApp.users.arsip`
+pengguna_arsip = _tabel_arsip(
+    Pengguna.__table__, u'pengguna_arsip',
+    sqlalchemy.Index('ix_pengguna_arsip_nama_pengguna', 'nama_pengguna'),
+)
+sqlalchemy.Index('ix_pengguna_arsip_email_pengguna',
+                 sqlalchemy.func.lower(pengguna_arsip.c.email_pengguna))
+
+profile_arsip = _tabel_arsip(
+    Profile.__table__, u'profile_arsip',
+    sqlalchemy.Index('ix_profile_arsip_user_id', 'user_id'),
+)
+
+#: tabel arsip, dipakai ``QueryBuilder(include_archived=True)``
+Pengguna.__archive__ = pengguna_arsip
+Profile.__archive__ = profile_arsip
+
+ARCHIVES = (Pengguna.__table__, pengguna_arsip, Profile.__table__, profile_arsip)
+
+
+def _pindahkan(connection, source, target, where, **values):
+    """``INSERT ... SELECT`` baris ``source`` yang cocok dengan ``where``
+    ke ``target`` lalu hapus dari ``source``. ``values`` menimpa nilai
+    kolom. Return jumlah baris yang dipindahkan."""
+    names = [c.name for c in target.columns if c.name in values or c.name in source.c]
+    select = sqlalchemy.select([
+        sqlalchemy.literal(values[name], target.c[name].type) if name in values
+        else source.c[name]
+        for name in names
+    ]).where(where)
+    connection.execute(target.insert().from_select(names, select))
+    return connection.execute(source.delete().where(where)).rowcount
+
+
+def arsipkan_pengguna(connection, ids):
+    """Pindahkan pengguna ``ids`` beserta profile-nya ke tabel arsip."""
+    now = datetime.datetime.utcnow()
+    profile = Profile.__table__
+    _pindahkan(connection, profile, profile_arsip, profile.c.user_id.in_(ids), diarsipkan=now)
+    table = Pengguna.__table__
+    return _pindahkan(connection, table, pengguna_arsip, table.c.id.in_(ids), diarsipkan=now)
+
+
+def pulihkan_pengguna(connection, ids):
+    """Kebalikan :func:`arsipkan_pengguna`; ``modified`` di-set sekarang
+    supaya pengguna tidak langsung diarsipkan lagi."""
+    now = datetime.datetime.utcnow()
+    count = _pindahkan(connection, pengguna_arsip, Pengguna.__table__,
+                       pengguna_arsip.c.id.in_(ids), modified=now)
+    _pindahkan(connection, profile_arsip, Profile.__table__,
+               profile_arsip.c.user_id.in_(ids))
+    return count
+
 
 def includeme(config):
     config.register_model(__name__)
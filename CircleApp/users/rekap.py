@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+    Rekap Pendaftaran
+    ~~~~~~~~~
+
+    Rollup jumlah pendaftaran pengguna per hari. Tabel ``rekap_pendaftaran``
+    di-update incremental setiap ``Pengguna`` di-insert atau di-delete lewat
+    ORM, sehingga statistik dashboard cukup membaca rollup tanpa GROUP BY
+    ke seluruh tabel ``pengguna``.
+
+    Tabel rollup yang baru dibuat (``create_all`` mode development atau
+    migrasi ``tabel_baru``) langsung diisi dari ``pengguna`` yang sudah ada.
+    Rebuild manual dari tabel ``pengguna``::
+
+        DATABASE_URL=sqlite:///circleapp.db python -m CircleApp.users.rekap rebuild
+
+    rekap.py
+"""
+import argparse
+import datetime
+import os
+
+import sqlalchemy
+from baka.settings import database_url
+
+from CircleApp.upsert import upsert
+from CircleApp.users.model import Pengguna, RekapPendaftaran
+
+
+PERIODS = ('hari', 'minggu')
+DEFAULT_DAYS = 30
+
+
+def _tanggal(value):
+    if value is None:
+        value = datetime.datetime.utcnow()
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def tambah(connection, tanggal, delta):
+    """Tambah (atau kurangi) jumlah pendaftaran pada ``tanggal``. Tambah
+    memakai satu upsert, jadi dua pendaftaran pertama pada hari yang sama
+    tidak bisa sama-sama meng-insert baris baru."""
+    table = RekapPendaftaran.__table__
+    if delta > 0:
+        connection.execute(
+            upsert(table, ['tanggal'], ['modified'], ['jumlah']).values(
+                tanggal=tanggal, jumlah=delta)
+        )
+    elif delta < 0:
+        # baris sudah ada sejak pengguna yang dihapus didaftarkan
+        connection.execute(
+            table.update().where(
+                table.c.tanggal == tanggal
+            ).values(jumlah=table.c.jumlah + delta)
+        )
+
+
+@sqlalchemy.event.listens_for(Pengguna, 'after_insert')
+def _pengguna_insert(mapper, connection, target):
+    tambah(connection, _tanggal(target.registered_date), 1)
+
+
+@sqlalchemy.event.listens_for(Pengguna, 'before_delete')
+def _pengguna_delete(mapper, connection, target):
+    # before_delete: baris masih ada jika registered_date perlu di-load
+    tambah(connection, _tanggal(target.registered_date), -1)
+
+
+@sqlalchemy.event.listens_for(RekapPendaftaran.__table__, 'after_create')
+def _rekap_create(table, connection, **kw):
+    # create_all bisa membuat rollup sebelum pengguna, yang berarti kosong
+    if connection.dialect.has_table(connection, Pengguna.__table__.name):
+        rebuild(connection)
+
+
+def kurangi(session, query):
+    """Kurangi rollup untuk pengguna dari ``query`` yang akan dihapus lewat
+    bulk delete, karena bulk delete tidak memicu event ORM."""
+    tanggal = sqlalchemy.func.date(Pengguna.registered_date)
+    rows = query.with_entities(
+        tanggal, sqlalchemy.func.count()
+    ).group_by(tanggal).all()
+    connection = session.connection()
+    for t, n in rows:
+        tambah(connection, _parse_date(t), -n)
+
+
+def rebuild(connection):
+    """Hitung ulang seluruh rollup dari tabel ``pengguna``."""
+    table = RekapPendaftaran.__table__
+    tanggal = sqlalchemy.func.date(Pengguna.registered_date)
+    rows = connection.execute(
+        sqlalchemy.select([
+            tanggal, sqlalchemy.func.count()
+        ]).select_from(Pengguna.__table__).group_by(tanggal)
+    ).fetchall()
+
+    connection.execute(table.delete())
+    if rows:
+        connection.execute(table.insert(), [
+            {'tanggal': _parse_date(t), 'jumlah': n} for t, n in rows
+        ])
+    return len(rows)
+
+
+def _parse_date(value):
+    # sqlite mengembalikan date() sebagai string
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    return _tanggal(value)
+
+
+def statistik(session, period='hari', start=None, end=None):
+    """Jumlah pendaftaran per hari atau per minggu (senin) antara ``start``
+    dan ``end``, hanya membaca tabel rollup. Tanggal dalam UTC, sama dengan
+    ``registered_date``; default ``end`` hari ini (UTC).
+
+    Returns:
+        list: ``[{'tanggal': date, 'jumlah': int}, ...]`` urut tanggal.
+    """
+    end = end or datetime.datetime.utcnow().date()
+    start = start or end - datetime.timedelta(days=DEFAULT_DAYS - 1)
+    rows = session.query(
+        RekapPendaftaran.tanggal, RekapPendaftaran.jumlah
+    ).filter(
+        RekapPendaftaran.tanggal.between(start, end)
+    ).order_by(RekapPendaftaran.tanggal).all()
+
+    if period == 'hari':
+        return [{'tanggal': t, 'jumlah': n} for t, n in rows]
+
+    weeks = {}
+    for t, n in rows:
+        monday = t - datetime.timedelta(days=t.weekday())
+        weeks[monday] = weeks.get(monday, 0) + n
+    return [{'tanggal': t, 'jumlah': n} for t, n in sorted(weeks.items())]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'Rekap pendaftaran pengguna')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL'),
+                        help=u'database url, default $DATABASE_URL')
+    args = parser.parse_args(argv)
+
+    engine = sqlalchemy.create_engine(database_url(args.url))
+    RekapPendaftaran.__table__.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        days = rebuild(connection)
+    print('rekap_pendaftaran: {} hari'.format(days))
+
+
+def includeme(config):
+    pass
+
+
+if __name__ == '__main__':
+    main()
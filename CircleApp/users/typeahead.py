@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+    Typeahead Pengguna
+    ~~~~~~~~~
+
+    Index prefix di memori untuk autocomplete pengguna di layar admin.
+    Username dan email yang dinormalisasi (``casefold``) disimpan dalam
+    array terurut; pencarian prefix cukup ``bisect`` lalu membaca maju
+    sampai prefix tidak cocok lagi, tanpa query ke database::
+
+        GET /users/typeahead?q=bud&limit=10
+
+    Hanya untuk admin. Email ikut dicari tapi tidak dikembalikan, hasil
+    hanya ``uid`` dan ``username``.
+
+    Index dimuat sekali saat start (satu scan kolom ``pengguna``) dan
+    di-update dari event ORM insert/update/delete ``Pengguna`` setelah
+    commit. Bulk update/delete lewat ``Query`` memuat ulang index. Index
+    per proses: perubahan dari worker lain baru terlihat setelah reload.
+
+    typeahead.py
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+import sqlalchemy
+from baka.log import log
+from pyramid.events import ApplicationCreated
+from sqlalchemy.orm import Session, object_session
+
+from CircleApp.users.model import Pengguna
+
+
+LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(value):
+    return (value or '').strip().casefold()
+
+
+class PrefixIndex(object):
+    """Array key terurut dengan array id paralel, plus
+    ``id -> (uid, username, email)`` untuk hasil."""
+
+    def __init__(self):
+        self._keys = []
+        self._ids = []
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, rows):
+        """Bangun ulang index dari ``(id, uid, username, email)``."""
+        entries = {}
+        pairs = []
+        for id_, uid, username, email in rows:
+            entries[id_] = (str(uid), username, email)
+            pairs.extend((key, id_) for key in _keys(username, email))
+        pairs.sort()
+        with self._lock:
+            self._keys = [key for key, _ in pairs]
+            self._ids = [id_ for _, id_ in pairs]
+            self._entries = entries
+
+    def add(self, id_, uid, username, email):
+        with self._lock:
+            self._remove(id_)
+            self._entries[id_] = (str(uid), username, email)
+            for key in _keys(username, email):
+                i = bisect_right(self._keys, key)
+                self._keys.insert(i, key)
+                self._ids.insert(i, id_)
+
+    def remove(self, id_):
+        with self._lock:
+            self._remove(id_)
+
+    def _remove(self, id_):
+        entry = self._entries.pop(id_, None)
+        if entry is None:
+            return
+        for key in _keys(entry[1], entry[2]):
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._ids[i] == id_:
+                    del self._keys[i]
+                    del self._ids[i]
+                    break
+                i += 1
+
+    def search(self, prefix, limit=LIMIT):
+        """Maksimal ``limit`` pengguna (``uid``, ``username``) yang
+        username atau emailnya diawali ``prefix``, urut key."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        result, seen = [], set()
+        with self._lock:
+            keys, ids = self._keys, self._ids
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and len(result) < limit and keys[i].startswith(prefix):
+                id_ = ids[i]
+                if id_ not in seen:
+                    seen.add(id_)
+                    uid, username, _ = self._entries[id_]
+                    result.append({'uid': uid, 'username': username})
+                i += 1
+        return result
+
+
+def _keys(username, email):
+    return set(key for key in (normalize(username), normalize(email)) if key)
+
+
+def load(index, session):
+    table = Pengguna.__table__
+    index.load(session.execute(sqlalchemy.select([
+        table.c.id, table.c.uid, table.c.nama_pengguna, table.c.email_pengguna,
+    ])).fetchall())
+
+
+def track_changes(index, session_factory):
+    """Terapkan insert/update/delete ``Pengguna`` ke ``index`` setelah
+    commit; bulk update/delete memuat ulang seluruh index."""
+
+    def _changed(mapper, connection, target):
+        object_session(target).info.setdefault('typeahead', []).append(
+            (target.id, target.uid, target.username, target.email))
+
+    def _deleted(mapper, connection, target):
+        object_session(target).info.setdefault('typeahead', []).append(
+            (target.id, None, None, None))
+
+    def _bulk(update_context):
+        if update_context.mapper.local_table is Pengguna.__table__:
+            update_context.session.info['typeahead_reload'] = True
+
+    def _after_commit(session):
+        changes = session.info.pop('typeahead', None)
+        if session.info.pop('typeahead_reload', False):
+            reload_session = session_factory()
+            try:
+                load(index, reload_session)
+            finally:
+                reload_session.close()
+            return
+        for id_, uid, username, email in changes or ():
+            if uid is None:
+                index.remove(id_)
+            else:
+                index.add(id_, uid, username, email)
+
+    def _rollback(session, previous):
+        session.info.pop('typeahead', None)
+        session.info.pop('typeahead_reload', None)
+
+    sqlalchemy.event.listen(Pengguna, 'after_insert', _changed)
+    sqlalchemy.event.listen(Pengguna, 'after_update', _changed)
+    sqlalchemy.event.listen(Pengguna, 'after_delete', _deleted)
+    sqlalchemy.event.listen(Session, 'after_bulk_update', _bulk)
+    sqlalchemy.event.listen(Session, 'after_bulk_delete', _bulk)
+    sqlalchemy.event.listen(Session, 'after_commit', _after_commit)
+    sqlalchemy.event.listen(Session, 'after_soft_rollback', _rollback)
+
+
+def includeme(config):
+    index = PrefixIndex()
+    session_factory = config.registry['db_session']
+    track_changes(index, session_factory)
+    config.registry['user_index'] = index
+
+    def _load(event):
+        session = session_factory()
+        try:
+            load(index, session)
+        except sqlalchemy.exc.SQLAlchemyError:
+            log.warning('typeahead: index pengguna gagal dimuat')
+        finally:
+            session.close()
+
+    config.add_subscriber(_load, ApplicationCreated)
@@ -1,12 +1,45 @@
+import datetime
+import hashlib
+import uuid
+
 from baka.log import log
 from baka.response import JSONAPIResponse
-from pyramid.httpexceptions import HTTPFound
+from pyramid.httpexceptions import HTTPFound, HTTPNotFound
+from pyramid.security import forget, remember
+from pyramid.settings import asbool
 
+from CircleApp import activity, mail, pagecache, tokens
 from CircleApp.app import app
+from CircleApp.datatables import DataTablesQuery
+from CircleApp.encoders import render_json
 from CircleApp.jsonapi import QueryBuilder
-from CircleApp.users.form import UserAddForm
+from CircleApp.users import rekap, typeahead
+from CircleApp.users.form import UserAddForm, ForgotForm, LoginForm, ResetForm
+from CircleApp.users.model import Pengguna, Profile
 from CircleApp.utils import MAX_LIMIT, DEFAULT_LIMIT, mapper_alchemy
 
+PROFILE_FIELDS = ('display_name', 'first_name', 'last_name', 'description')
+RESET_PURPOSE = 'reset-kunci'
+RESET_MAX_AGE = 60 * 60
+RESET_EMAIL = u"""Halo {username},
+
+Kami menerima permintaan reset kata kunci untuk akun anda. Buka link
+berikut untuk membuat kata kunci baru (berlaku 1 jam):
+
+{url}
+
+Abaikan email ini jika anda tidak meminta reset kata kunci.
+"""
+
+
+def _uid(request):
+    """``uid`` dari URL sebagai UUID; format yang salah 404, bukan error
+    saat bind ke kolom GUID."""
+    try:
+        return uuid.UUID(request.matchdict.get('uid', ''))
+    except ValueError:
+        raise HTTPNotFound()
+
 
 @app.route('/users/list', route_name='daftar_pengguna')
 def daftar_pengguna(request):
@@ -18,21 +51,134 @@ def daftar_pengguna(request):
         if user:
             QueryBuilder.max_limit = MAX_LIMIT
             QueryBuilder.default_limit = DEFAULT_LIMIT
+            query_builder = QueryBuilder(
+                request, user,
+                include_archived=asbool(request.params.get('include_archived')))
+            # read only: baris kolom lewat Core select, tanpa instance ORM
+            data, pagination = query_builder.get_collection_rows()
+
+            _in = u'Success'
+            code, status = JSONAPIResponse.OK
+
+    return render_json(request, resp.to_json(
+        _in, code=code,
+        status=status,
+        data=data,
+        total=pagination.get('total', 0)))
+
+
+@app.route('/users/table', route_name='tabel_pengguna')
+def tabel_pengguna(request):
+    """Server-side processing DataTables untuk tabel pengguna di index."""
+    user = request.find_model('pengguna')
+    DataTablesQuery.max_limit = MAX_LIMIT
+    query_builder = DataTablesQuery(
+        request, user,
+        include_archived=asbool(request.params.get('include_archived')))
+    return render_json(request, query_builder.response())
+
+
+@app.route('/users/typeahead', route_name='cari_pengguna', permission='admin')
+def cari_pengguna(request):
+    """Autocomplete pengguna dari index prefix di memori, tanpa query
+    database. Hanya admin."""
+    try:
+        limit = min(int(request.params.get('limit', typeahead.LIMIT)), typeahead.MAX_LIMIT)
+    except ValueError:
+        limit = typeahead.LIMIT
+    index = request.registry['user_index']
+    return render_json(request, {
+        'data': index.search(request.params.get('q', ''), limit)
+    })
+
+
+@app.route('/users/list', route_name='daftar_pengguna', request_method='PATCH',
+           permission='admin', require_csrf=True)
+def ubah_daftar_pengguna(request):
+    """Bulk update pengguna yang cocok dengan ``filter[...]`` dalam satu
+    statement. Body JSON berisi nilai baru, hanya kolom
+    ``Pengguna.__bulk_update__`` (``{"active": false}``), ``dry_run=1``
+    hanya menghitung. Hanya admin, dengan token CSRF di header ``X-CSRF-Token``.
+    """
+    user = request.find_model('pengguna')
+    with JSONAPIResponse(request.response) as resp:
+        try:
+            values = request.json_body
+        except ValueError:
+            values = None
+
+        total = 0
+        _in = u'Failed'
+        code, status = JSONAPIResponse.BAD_REQUEST
+        if isinstance(values, dict):
             query_builder = QueryBuilder(request, user)
-            query, pagination = query_builder.get_collection_query()
-            rows = query.all()
-            data = [mapper_alchemy(
-                user, row)
-                for row in rows]
+            query_builder.get_fields(None)
+            total = query_builder.bulk_update(
+                values, dry_run=asbool(request.params.get('dry_run')))
 
             _in = u'Success'
             code, status = JSONAPIResponse.OK
 
-    return resp.to_json(
+    return render_json(request, resp.to_json(
+        _in, code=code,
+        status=status,
+        total=total))
+
+
+@app.route('/users/list', route_name='daftar_pengguna', request_method='DELETE',
+           permission='admin', require_csrf=True)
+def hapus_daftar_pengguna(request):
+    """Bulk delete pengguna yang cocok dengan ``filter[...]`` beserta
+    profile-nya, ``dry_run=1`` hanya menghitung. Hanya admin, dengan token
+    CSRF di header ``X-CSRF-Token``.
+    """
+    user = request.find_model('pengguna')
+    dry_run = asbool(request.params.get('dry_run'))
+    with JSONAPIResponse(request.response) as resp:
+        query_builder = QueryBuilder(request, user)
+        if not dry_run:
+            rekap.kurangi(request.db, query_builder.get_bulk_query())
+        total, cascade = query_builder.bulk_delete(dry_run=dry_run)
+
+    return render_json(request, resp.to_json(
+        u'Success', code=JSONAPIResponse.OK[0],
+        status=JSONAPIResponse.OK[1],
+        total=total,
+        cascade=cascade))
+
+
+@app.route('/users/stats', route_name='rekap_pengguna')
+def rekap_pengguna(request):
+    """Statistik pendaftaran untuk dashboard, dibaca dari rollup.
+
+    ``periode=hari|minggu``, ``dari`` dan ``sampai`` dalam format YYYY-MM-DD
+    (tanggal UTC).
+    """
+    data = []
+    with JSONAPIResponse(request.response) as resp:
+        _in = u'Failed'
+        code, status = JSONAPIResponse.BAD_REQUEST
+        period = request.params.get('periode', 'hari')
+        try:
+            start, end = [
+                datetime.datetime.strptime(request.params[k], '%Y-%m-%d').date()
+                if request.params.get(k) else None
+                for k in ('dari', 'sampai')
+            ]
+        except ValueError:
+            start = end = period = None
+
+        if period in rekap.PERIODS:
+            data = rekap.statistik(request.db, period, start, end)
+
+            _in = u'Success'
+            code, status = JSONAPIResponse.OK
+
+    return render_json(request, resp.to_json(
         _in, code=code,
         status=status,
         data=data,
-        total=pagination.get('total', 0))
+        total=sum(row['jumlah'] for row in data)))
 
 
 @app.resource(
@@ -81,13 +227,16 @@ class UbahPengguna(object):
 
 @UbahPengguna.GET()
 def ubah_pengguna_get(page, request):
-    data = {}
     s = request.db
-    user = s.query(page.user).filter_by(
-        uid=request.matchdict.get('uid')).first()
+    user = s.query(page.user).filter_by(uid=_uid(request)).first()
+    if user is None:
+        raise HTTPNotFound()
 
-    if user:
-        data = mapper_alchemy(page.user, user)
+    cached = pagecache.cached_page(request, user)
+    if cached is not None:
+        return cached
+
+    data = mapper_alchemy(page.user, user)
 
     return {
         'title': page._title,
@@ -121,11 +270,136 @@ def login_get(page, request):
 
 @LoginPengguna.POST()
 def login_post(page, request):
-    params = request.params
-    log.info(params)
+    form = LoginForm(request)
+    user = form.submit() if form.validate() else None
+    if user is None:
+        return {
+            'title': page._title,
+            'error_message': u'Akun atau kata kunci salah',
+            'errors': form.errors
+        }
+
+    # mode token: cookie bertanda tangan, tanpa tulis ke session store
+    headers = remember(request, user.id, permissions_version=user.permissions_version)
+    activity.record(request, 'login', user.id)
+    return HTTPFound(request.route_url('HomePage'), headers=headers)
+
+
+@app.route('/logout', route_name='logout_pengguna', request_method='POST')
+def logout_pengguna(request):
+    activity.record(request, 'logout')
+    return HTTPFound(request.route_url('login_pengguna'), headers=forget(request))
+
+
+def _password_hash(user):
+    # token otomatis tidak berlaku lagi setelah kata kunci diganti
+    return hashlib.sha256(str(user.password).encode('utf-8')).hexdigest()[:16]
+
+
+def reset_token(request, user):
+    return tokens.sign(
+        {'uid': str(user.uid), 'pw': _password_hash(user)},
+        request.registry.settings['reset.secret'],
+        RESET_PURPOSE, RESET_MAX_AGE)
+
+
+def user_from_reset_token(request, token):
+    """Pengguna dari link reset yang valid. Pengguna di arsip dikembalikan
+    sebagai instance transient (``archived=True``), belum dipulihkan."""
+    payload = tokens.unsign(
+        token, request.registry.settings['reset.secret'], RESET_PURPOSE)
+    if payload is None:
+        return None
+    User = request.find_model('pengguna')
+    user = User.get_by_uid(request.db, payload['uid'])
+    if user is None or payload['pw'] != _password_hash(user):
+        return None
+    return user
+
+
+@app.resource(
+    '/forgot',
+    route_name='lupa_kunci',
+    renderer='CircleApp:users/templates/forgot.html')
+class LupaKunci(object):
+    def __init__(self, request):
+        self._title = 'Lupa Kunci'
+
+
+@LupaKunci.GET()
+def lupa_kunci_get(page, request):
     return { 'title': page._title }
 
 
+@LupaKunci.POST()
+def lupa_kunci_post(page, request):
+    form = ForgotForm(request)
+    if not form.validate():
+        return {
+            'title': page._title,
+            'error_message': u'Please, check errors',
+            'errors': form.errors
+        }
+
+    user = form.submit()
+    if user:
+        # email dikirim oleh worker antrian tugas, request langsung selesai
+        mail.send(
+            request, user.email, u'Reset kata kunci',
+            RESET_EMAIL.format(
+                username=user.username,
+                url=request.route_url('reset_kunci', token=reset_token(request, user))))
+    # pesan yang sama walau akun tidak ada, supaya tidak bocor
+    return {
+        'title': page._title,
+        'message': u'Jika akun ditemukan, link reset kata kunci sudah dikirim ke email anda.'
+    }
+
+
+@app.resource(
+    '/reset/{token}',
+    route_name='reset_kunci',
+    renderer='CircleApp:users/templates/reset.html')
+class ResetKunci(object):
+    def __init__(self, request):
+        self._title = 'Reset Kata Kunci'
+
+
+@ResetKunci.GET()
+def reset_kunci_get(page, request):
+    user = user_from_reset_token(request, request.matchdict.get('token'))
+    return {
+        'title': page._title,
+        'readonly': user is None,
+        'error_message': None if user else u'Link reset tidak valid atau sudah kedaluwarsa'
+    }
+
+
+@ResetKunci.POST()
+def reset_kunci_post(page, request):
+    user = user_from_reset_token(request, request.matchdict.get('token'))
+    if user is None:
+        return {
+            'title': page._title,
+            'readonly': True,
+            'error_message': u'Link reset tidak valid atau sudah kedaluwarsa'
+        }
+
+    form = ResetForm(request)
+    if not form.validate():
+        return {
+            'title': page._title,
+            'error_message': u'Please, check errors',
+            'errors': form.errors
+        }
+    if user.archived:
+        # dipulihkan hanya saat link reset benar-benar dipakai
+        user = request.find_model('pengguna').restore(request.db, user.id)
+    form.submit(user)
+    request.db.flush()
+    return HTTPFound(request.route_url('login_pengguna'))
+
+
 # /profile/{uid:.*}
 @app.resource(
     '/profile/{uid:.*}',
@@ -142,10 +416,15 @@ class ProfilePage(object):
 def profile_get(page, request):
     data = {}
     s = request.db
-    user = s.query(page.user).filter_by(
-        uid=request.matchdict.get('uid')).first()
+    user = s.query(page.user).filter_by(uid=_uid(request)).first()
+    if user is None:
+        raise HTTPNotFound()
 
     profile = user.profile
+    cached = pagecache.cached_page(request, user, profile)
+    if cached is not None:
+        return cached
+
     if profile:
         data = mapper_alchemy(page.profile, profile)
     log.info(user.username)
@@ -159,21 +438,23 @@ def profile_get(page, request):
 
 @ProfilePage.POST()
 def profile_post(page, request):
-    s = request.db
+    values = {
+        key: request.POST[key] for key in PROFILE_FIELDS if key in request.POST
+    }
+    uid = _uid(request)
+    # satu statement: insert, atau update profile yang sudah ada
+    if not page.profile.upsert(request.db, uid, values):
+        raise HTTPNotFound()
+    log.info(uid)
 
-    user = s.query(page.user).filter_by(
-        uid=request.matchdict.get('uid')).first()
-
-    profile = page.profile()
-    profile.display_name = ' Surya Kencana Bond'
-    profile.first_name = 'Surya'
-    profile.last_name = 'Kencana'
-    profile.description = 'Hahahahaha'
-    profile.user = user
-    log.info(request.matchdict.get('uid'))
-    s.add(profile)
-    return { 'title': page._title }
+    cache = request.registry.get('page_cache')
+    if cache is not None:
+        # upsert lewat Core tidak memicu event mapper ``invalidate_on``
+        cache.invalidate_table(Profile.__tablename__)
+    return HTTPFound(request.route_url('profile_page', uid=uid))
 
 
 def includeme(config):
-    pass
+    cache = config.registry.get('page_cache')
+    if cache is not None:
+        pagecache.invalidate_on(cache, Pengguna, Profile)
@@ -1,3 +1,4 @@
+import functools
 import uuid
 from datetime import datetime, date, time
 from decimal import Decimal
@@ -26,30 +27,46 @@ def serialize(value):
     return value
 
 
-def mapper_alchemy(model, item, expose_fields=None, primary_key=False):
-    atts = {}
-    fields = {}
-
-    for key, col in sqlalchemy.inspect(model).mapper.all_orm_descriptors.items():
+@functools.lru_cache(maxsize=128)
+def model_fields(model, expose_fields=None, primary_key=False):
+    """Nama atribut ``model`` yang di-expose :func:`mapper_alchemy`: hybrid
+    property dan kolom selain primary key, foreign key dan
+    ``model.__private__``. Hasil di-cache per model, ``expose_fields``
+    harus hashable (tuple/frozenset).
+    """
+    fields = []
+    mapper = sqlalchemy.inspect(model).mapper
+    private = getattr(model, '__private__', ())
 
+    for key, col in mapper.all_orm_descriptors.items():
+        if key in private:
+            continue
         if expose_fields is None or key in expose_fields:
             if col.extension_type == HYBRID_PROPERTY:
-                atts[key] = col
-                fields[key] = col
+                fields.append(key)
 
-    for key, col in sqlalchemy.inspect(model).mapper.columns.items():
+    for key, col in mapper.columns.items():
         if key == sqlalchemy.inspect(model).primary_key[0].name and not primary_key:
             continue
 
-        if len(col.foreign_keys) > 0:
+        if len(col.foreign_keys) > 0 or key in private:
             continue
 
-        if expose_fields is None or key in expose_fields:
-            atts[key] = col
-            fields[key] = col
-
-    atts = {
-        key: serialize(getattr(item, key))
-        for key, val in atts.items()
-    }
-    return atts
+        if (expose_fields is None or key in expose_fields) and key not in fields:
+            fields.append(key)
+    return tuple(fields)
+
+
+def mapper_alchemy(model, item, expose_fields=None, primary_key=False, raw=False):
+    """Ubah ``item`` menjadi dict. Dengan ``raw=True`` nilai tidak dikonversi
+    lewat :func:`serialize`, untuk dipakai bersama :mod:`CircleApp.encoders`
+    yang menangani datetime/UUID/Decimal sendiri.
+    """
+    if expose_fields is not None:
+        expose_fields = frozenset(expose_fields)
+    fields = model_fields(model, expose_fields, primary_key)
+
+    if raw:
+        return {key: getattr(item, key) for key in fields}
+
+    return {key: serialize(getattr(item, key)) for key in fields}
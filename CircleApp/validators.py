@@ -13,12 +13,14 @@ class BaseEmail(object):
     # max length for domain name labels is 63 characters per RFC 1034
     DOMAIN_REGEX = r'((?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+)(?:[A-Z0-9-]{2,63}(?<!-))\Z'
 
+    # compiled once per class, shared by every instance
+    user_regex = re.compile(USER_REGEX, re.IGNORECASE)
+    domain_regex = re.compile(DOMAIN_REGEX, re.IGNORECASE)
+
     def __init__(self, msg=None):
         if msg is None:
             msg = "Invalid email address"
         self.msg = msg
-        self.user_regex = re.compile(self.USER_REGEX, re.IGNORECASE)
-        self.domain_regex = re.compile(self.DOMAIN_REGEX, re.IGNORECASE)
 
     def __call__(self, node, value):
         if not value or '@' not in value:
@@ -94,14 +96,12 @@ class BaseUrl(object):
         u"$",
         re.UNICODE | re.IGNORECASE
     )
-
+    pattern = regex
 
     def __init__(self, msg=None):
         if msg is None:
             msg = "Invalid URL address"
         self.msg = msg
-        self.pattern = re.compile(self.regex)
-
 
     def __call__(self, node, value):
         if not self.pattern.match(value):
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+    Warm-up
+    ~~~~~~~~~
+
+    Tahap warm-up worker setelah aplikasi dibuat, supaya request pertama
+    tidak membayar inisialisasi lazy:
+
+    * ``mappers``: ``configure_mappers()`` SQLAlchemy
+    * ``forms``: schema colander semua form (lihat :class:`CircleApp.forms.BaseForm`)
+    * ``templates``: load/compile semua template (:func:`CircleApp.templating.compile_all`)
+    * ``assets``: environment webassets dan manifest bundle
+    * ``pool``: buka ``pool`` koneksi database lalu kembalikan ke pool
+    * ``replay``: GET ke path ``replay`` lewat router (tweens ikut jalan)
+
+    ``GET /ready`` menjawab 200 hanya setelah warm-up selesai di proses
+    ini, selain itu 503, untuk health check load balancer. Pada server yang
+    fork setelah aplikasi dibuat, warm-up dijalankan ulang per proses
+    (dipicu ``/ready``) dan koneksi warisan proses induk dibuang.
+
+    config.yaml::
+
+        warmup:
+          enabled: True
+          background: True
+          pool: 5
+          replay: [/, /users/list]
+
+    :author: nanang.jobs@gmail.com
+    :copyright: (c) 2017 by Nanang Suryadi.
+    :license: BSD, see LICENSE for more details.
+
+    warmup.py
+"""
+import os
+import threading
+import time
+
+import sqlalchemy
+from baka.log import log
+from pyramid.events import ApplicationCreated
+from pyramid.request import Request
+
+from CircleApp import assets, forms, templating
+from CircleApp.encoders import render_json
+
+
+POOL = 5
+RETRY_AFTER = '2'
+
+
+def _subclasses(cls):
+    for sub in cls.__subclasses__():
+        yield sub
+        for subsub in _subclasses(sub):
+            yield subsub
+
+
+def warm_mappers(app, settings):
+    sqlalchemy.orm.configure_mappers()
+
+
+def warm_forms(app, settings):
+    for form in _subclasses(forms.BaseForm):
+        if form._schema is not None:
+            form.get_schema()
+
+
+def warm_templates(app, settings):
+    templating.compile_all(app.registry)
+
+
+def warm_assets(app, settings):
+    env = assets.get_environment(app.registry)
+    for bundle in env:
+        bundle.urls()
+
+
+def warm_pool(app, settings):
+    engine = app.registry['db_session'].kw['bind']
+    size = settings.get('pool', POOL)
+    if hasattr(engine.pool, 'size'):
+        size = min(size, engine.pool.size())
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connection.scalar(sqlalchemy.select([1]))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_replay(app, settings):
+    for path in settings.get('replay') or ():
+        # lewat WSGI supaya request extension (``request.db``, ...) terpasang
+        response = Request.blank(path).get_response(app)
+        if response.status_code >= 500:
+            raise RuntimeError('{} {}'.format(path, response.status))
+
+
+STEPS = (
+    ('mappers', warm_mappers),
+    ('forms', warm_forms),
+    ('templates', warm_templates),
+    ('assets', warm_assets),
+    ('pool', warm_pool),
+    ('replay', warm_replay),
+)
+
+
+class Warmup(object):
+    """Status warm-up per proses."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.app = None
+        self.pid = None
+        self.ready = False
+        self.steps = []
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Jalankan warm-up untuk proses ini (sekali per pid)."""
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # hasil fork: koneksi pool milik proses induk tidak dipakai
+                app.registry['db_session'].kw['bind'].dispose()
+            self.app = app
+            self.pid = os.getpid()
+            self.ready = False
+            self.steps = []
+        if self.settings.get('background', True):
+            thread = threading.Thread(target=self.run, name='warmup')
+            thread.daemon = True
+            thread.start()
+        else:
+            self.run()
+
+    def run(self):
+        for name, step in STEPS:
+            started = time.perf_counter()
+            error = None
+            try:
+                step(self.app, self.settings)
+            except Exception as e:
+                # warm-up tidak boleh membuat worker gagal start
+                error = '{}: {}'.format(type(e).__name__, e)
+                log.warning('warmup %s gagal: %s', name, error)
+            self.steps.append({
+                'step': name,
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'error': error,
+            })
+        self.ready = True
+        log.info('warmup selesai: %s', ', '.join(
+            '{} {}ms'.format(s['step'], s['ms']) for s in self.steps))
+
+    def stats(self):
+        return {'ready': self.ready, 'pid': self.pid, 'steps': list(self.steps)}
+
+
+def ready(request):
+    warmup = request.registry['warmup']
+    if warmup.app is not None and warmup.pid != os.getpid():
+        warmup.start(warmup.app)
+    response = render_json(request, warmup.stats())
+    if not warmup.ready:
+        response.status = 503
+        response.headers['Retry-After'] = RETRY_AFTER
+    return response
+
+
+def includeme(config):
+    settings = config.get_settings().get('warmup') or {}
+    warmup = Warmup(settings)
+    config.registry['warmup'] = warmup
+    config.add_route('ready', '/ready')
+    config.add_view(ready, route_name='ready')
+
+    if not settings.get('enabled', True):
+        warmup.ready = True
+        warmup.pid = os.getpid()
+        return
+
+    def _start(event):
+        warmup.start(event.app)
+
+    config.add_subscriber(_start, ApplicationCreated)
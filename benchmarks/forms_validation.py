@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark validasi form
+    ~~~~~~~~~
+
+    Per-submission cost of ``UserAddForm``: the old path (schema instance
+    plus ``bind`` clone per request) against the prebuilt schema.
+
+        python -m benchmarks.forms_validation
+
+    forms_validation.py
+"""
+import timeit
+
+from pyramid import testing
+from webob.multidict import MultiDict
+
+from CircleApp.users.form import UserAddForm
+
+NUMBER = 5000
+
+
+class _User(object):
+    @classmethod
+    def get_by_email(cls, session, email):
+        return None
+
+    @classmethod
+    def get_by_username(cls, session, username):
+        return None
+
+
+def _request():
+    request = testing.DummyRequest()
+    request.params = MultiDict({
+        'username': 'surya.kencana',
+        'email': 'surya@kencana.id',
+        'password': 'rahasia',
+        'password_confirm': 'rahasia',
+    })
+    request.db = None
+    request.find_model = lambda name: _User
+    return request
+
+
+def bind_per_request(request):
+    form = UserAddForm(request)
+    form.schema = form._schema().bind(request=request)
+    return form.validate()
+
+
+def prebuilt(request):
+    form = UserAddForm(request)
+    return form.validate()
+
+
+def main():
+    request = _request()
+    assert bind_per_request(request) and prebuilt(request)
+    for fn in (bind_per_request, prebuilt):
+        secs = min(timeit.repeat(lambda: fn(request), number=NUMBER, repeat=3))
+        print('{:<18} {:8.2f} us/submit'.format(fn.__name__, secs / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark encoding JSON
+    ~~~~~~~~~
+
+    Encoding a ``daftar_pengguna`` payload of 100 and 10k rows: the old
+    path (``serialize`` per value then the stdlib ``json`` renderer) against
+    :func:`CircleApp.encoders.dumps` on raw values.
+
+        python -m benchmarks.json_encoding
+
+    json_encoding.py
+"""
+import datetime
+import json
+import timeit
+import uuid
+from decimal import Decimal
+
+from baka.renderers import JSONEncoder
+
+from CircleApp import encoders
+from CircleApp.utils import serialize
+
+
+def _rows(n):
+    now = datetime.datetime.utcnow()
+    return [{
+        'pid': 'usr{:05d}'.format(i),
+        'uid': uuid.uuid4(),
+        'username': 'pengguna{}'.format(i),
+        'email': 'pengguna{}@circle.id'.format(i),
+        'registered_date': now,
+        'password_updated': now,
+        'saldo': Decimal('1000.50'),
+    } for i in range(n)]
+
+
+def renderer(rows):
+    data = [{k: serialize(v) for k, v in row.items()} for row in rows]
+    return json.dumps({'data': data}, cls=JSONEncoder).encode('utf-8')
+
+
+def encoder(rows):
+    return encoders.dumps({'data': rows})
+
+
+def main():
+    print('encoder: {}'.format(encoders.use_encoder()))
+    for n, number in ((100, 500), (10000, 5)):
+        rows = _rows(n)
+        assert json.loads(renderer(rows)) == json.loads(encoder(rows))
+        for fn in (renderer, encoder):
+            secs = min(timeit.repeat(lambda: fn(rows), number=number, repeat=3))
+            print('{:>6} rows {:<10} {:10.3f} ms'.format(
+                n, fn.__name__, secs / number * 1e3))
+
+
+if __name__ == '__main__':
+    main()
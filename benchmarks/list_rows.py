@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark daftar pengguna
+    ~~~~~~~~~
+
+    ``daftar_pengguna`` pages of 100 rows and a 10k row export: ORM entities
+    through ``query.all()`` + ``mapper_alchemy`` against the read only
+    :meth:`CircleApp.jsonapi.QueryBuilder.get_collection_rows`. Time and
+    peak memory (tracemalloc) per request, on an in-memory SQLite.
+
+    ``daftar_pengguna`` never called ``get_fields``, so the ORM path ran
+    ``load_only()`` without columns and every attribute was lazy loaded
+    with its own SELECT per row.
+
+        python -m benchmarks.list_rows
+
+    list_rows.py
+"""
+import datetime
+import timeit
+import tracemalloc
+import uuid
+
+import sqlalchemy
+from baka_tenshi import Model
+from pyramid.testing import DummyRequest
+from sqlalchemy.orm import sessionmaker
+from webob.multidict import MultiDict
+
+from CircleApp import encoders
+from CircleApp.jsonapi import QueryBuilder
+from CircleApp.users.model import Pengguna
+from CircleApp.utils import mapper_alchemy
+
+
+def _session(n):
+    engine = sqlalchemy.create_engine('sqlite://')
+    Model.metadata.create_all(engine)
+    now = datetime.datetime.utcnow()
+    engine.execute(Pengguna.__table__.insert(), [{
+        'pid': 'u{:07d}'.format(i),
+        'uid': uuid.uuid4(),
+        'nama_pengguna': 'pengguna{}'.format(i),
+        'email_pengguna': 'pengguna{}@circle.id'.format(i),
+        'tgl_ubah_kunci': now,
+        'kunci_pengguna': '$2b$12$' + 'x' * 53,
+        'kunci_ubah_pengguna': now,
+    } for i in range(n)])
+    return sessionmaker(bind=engine)()
+
+
+def _request(session, limit):
+    request = DummyRequest(params=MultiDict({'page[limit]': str(limit)}))
+    request.db = session
+    return request
+
+
+def orm(request):
+    builder = QueryBuilder(request, Pengguna)
+    query, pagination = builder.get_collection_query()
+    data = [mapper_alchemy(Pengguna, row, raw=True) for row in query.all()]
+    request.db.expunge_all()
+    return data
+
+
+def rows(request):
+    data, pagination = QueryBuilder(request, Pengguna).get_collection_rows()
+    return data
+
+
+def _peak(fn, request):
+    tracemalloc.start()
+    fn(request)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    for n, number, repeat in ((100, 20, 3), (10000, 1, 1)):
+        session = _session(n)
+        QueryBuilder.max_limit = n
+        request = _request(session, n)
+        assert encoders.dumps(orm(request)) == encoders.dumps(rows(request))
+        for fn in (orm, rows):
+            secs = min(timeit.repeat(lambda: fn(request), number=number, repeat=repeat))
+            print('{:>6} rows {:<6} {:10.3f} ms {:10.1f} KiB peak'.format(
+                n, fn.__name__, secs / number * 1e3, _peak(fn, request) / 1024))
+
+
+if __name__ == '__main__':
+    main()
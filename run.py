@@ -1,3 +1,3 @@
 from CircleApp.app import app
 
-app.run(use_reloader=True, host='0.0.0.0')
+app.run(use_reloader=True, host='0.0.0.0', threaded=True)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+    Fixture bersama
+    ~~~~~~~~~
+
+    Database SQLite di memori dengan schema model sekarang, dan factory
+    baris ``pengguna`` lewat Core (tanpa event ORM, jadi rollup tidak ikut
+    berubah).
+
+    conftest.py
+"""
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy
+from baka_tenshi import Model
+from sqlalchemy.orm import sessionmaker
+
+from CircleApp.users.model import Pengguna
+
+
+def insert_pengguna(connection, n, password=None, **values):
+    """Insert ``n`` pengguna ``pengguna<i>`` (id ``i + 1``), return
+    uid-nya. ``values`` (nama kolom) berlaku untuk semua baris.
+    ``password`` di-hash oleh ``PasswordType`` saat bind, default acak."""
+    now = datetime.datetime.utcnow()
+    uids = [uuid.uuid4() for _ in range(n)]
+    connection.execute(Pengguna.__table__.insert(), [dict({
+        'id': i + 1,
+        'pid': 'u{:07d}'.format(i),
+        'uid': uid,
+        'nama_pengguna': 'pengguna{}'.format(i),
+        'email_pengguna': 'pengguna{}@circle.id'.format(i),
+        'tgl_ubah_kunci': now,
+        'kunci_pengguna': password or uuid.uuid4().hex,
+    }, **values) for i, uid in enumerate(uids)])
+    return uids
+
+
+@pytest.fixture
+def engine():
+    engine = sqlalchemy.create_engine('sqlite://')
+    Model.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    return sessionmaker(bind=engine)()
+
+
+@pytest.fixture
+def pengguna():
+    """Factory :func:`insert_pengguna`."""
+    return insert_pengguna
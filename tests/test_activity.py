@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+    Test aktivitas pengguna
+    ~~~~~~~~~
+
+    Buffer write-behind :class:`CircleApp.activity.ActivityBuffer`: batas
+    buffer, flush yang gagal, waktu yang tidak mundur dan flush saat
+    proses berhenti. Kolom ``Pengguna.last_login``/``last_seen`` tidak
+    di-expose list/DataTables dan tidak bisa dipakai filter/sort.
+
+    test_activity.py
+"""
+import datetime
+import os
+
+import pytest
+import sqlalchemy
+from pyramid import testing
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.testing import DummyRequest
+from sqlalchemy.orm import sessionmaker
+from webob.multidict import MultiDict
+
+from CircleApp import activity
+from CircleApp.jsonapi import QueryBuilder
+from CircleApp.users.model import Pengguna
+from CircleApp.utils import model_fields
+
+
+@pytest.mark.parametrize('key', ['last_login', 'last_seen'])
+@pytest.mark.parametrize('param', ['sort', 'filter[{}:eq]'])
+def test_activity_private(session, key, param):
+    assert key not in model_fields(Pengguna)
+    request = DummyRequest(params=MultiDict({param.format(key): key}))
+    request.db = session
+    with pytest.raises(HTTPBadRequest):
+        QueryBuilder(request, Pengguna).get_collection_rows()
+
+
+OLD = datetime.datetime(2020, 1, 1)
+T1 = datetime.datetime(2021, 1, 1)
+T2 = datetime.datetime(2021, 1, 2)
+
+
+@pytest.fixture
+def session_factory(engine, pengguna):
+    """Tiga pengguna dengan ``modified`` lama, ``pengguna2`` nonaktif."""
+    with engine.begin() as connection:
+        pengguna(connection, 3, modified=OLD)
+        table = Pengguna.__table__
+        connection.execute(table.update().where(table.c.id == 3).values(
+            aktif_pengguna=False, modified=OLD))
+    return sessionmaker(bind=engine)
+
+
+def _buffer(session_factory, **kw):
+    buffer = activity.ActivityBuffer(session_factory, **kw)
+    # tanpa thread flush background
+    buffer._pid = os.getpid()
+    return buffer
+
+
+def _columns(session_factory):
+    table = Pengguna.__table__
+    session = session_factory()
+    try:
+        return [tuple(row) for row in session.execute(sqlalchemy.select([
+            table.c.terlihat_terakhir, table.c.login_terakhir, table.c.modified,
+        ]).order_by(table.c.id))]
+    finally:
+        session.close()
+
+
+def _broken():
+    # database tanpa tabel: setiap flush gagal
+    return sessionmaker(bind=sqlalchemy.create_engine('sqlite://'))()
+
+
+def test_flush(session_factory):
+    buffer = _buffer(session_factory)
+    buffer.seen(1, T1)
+    buffer.event(2, 'login', when=T2)
+    assert buffer.flush() == 4
+    assert _columns(session_factory) == [(T1, None, OLD), (T2, T2, OLD), (None, None, OLD)]
+    session = session_factory()
+    assert [(a.user_id, a.jenis) for a in session.query(activity.AktivitasPengguna)] == [(2, 'login')]
+    assert buffer.flush() == 0
+    assert buffer.stats()['flushes'] == 1
+
+
+def test_flush_never_backwards(session_factory):
+    buffer = _buffer(session_factory)
+    buffer.seen(1, T2)
+    buffer.flush()
+    buffer.seen(1, T1)
+    buffer.flush()
+    assert _columns(session_factory)[0] == (T2, None, OLD)
+
+
+def test_flush_skips_inactive(session_factory):
+    buffer = _buffer(session_factory)
+    buffer.event(3, 'logout', when=T1)
+    buffer.flush()
+    assert _columns(session_factory)[2] == (None, None, OLD)
+
+
+def test_max_users(session_factory):
+    buffer = _buffer(session_factory, max_users=2)
+    for user_id in (1, 2, 3, 1):
+        buffer.seen(user_id, T1)
+    stats = buffer.stats()
+    assert (stats['users'], stats['dropped']) == (2, 1)
+
+
+def test_max_events(session_factory):
+    buffer = _buffer(session_factory, max_events=2)
+    for user_id in (1, 2, 3):
+        buffer.event(user_id, 'logout', when=T1)
+    stats = buffer.stats()
+    assert (stats['events'], stats['users'], stats['dropped']) == (2, 3, 1)
+
+
+def test_flush_failed_requeues(session_factory):
+    buffer = _buffer(session_factory)
+    buffer.session_factory = _broken
+    buffer.seen(1, T1)
+    buffer.event(2, 'login', when=T1)
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        buffer.flush()
+    stats = buffer.stats()
+    assert (stats['users'], stats['logins'], stats['events']) == (2, 1, 1)
+
+    buffer.session_factory = session_factory
+    assert buffer.flush() == 4
+    assert _columns(session_factory)[1] == (T1, T1, OLD)
+
+
+def test_restore_keeps_newer(session_factory):
+    buffer = _buffer(session_factory, max_users=2, max_events=1)
+    buffer.seen(1, T2)
+    buffer.event(2, 'login', when=T2)
+    buffer._restore({1: T1, 3: T1}, {}, [{'user_id': 1}])
+    assert buffer._seen == {1: T2, 2: T2}
+    assert len(buffer._events) == 1
+    assert buffer.dropped == 2
+
+
+def test_close_at_exit(session_factory, monkeypatch):
+    registered = []
+    monkeypatch.setattr(activity.atexit, 'register', registered.append)
+    config = testing.setUp(settings={'activity': {'interval': 60}})
+    try:
+        config.registry['db_session'] = session_factory
+        activity.includeme(config)
+        buffer = config.registry['activity']
+        assert registered == [buffer.close]
+    finally:
+        testing.tearDown()
+
+    buffer._pid = os.getpid()
+    buffer.seen(1, T1)
+    registered[0]()
+    assert _columns(session_factory)[0] == (T1, None, OLD)
+
+    # gagal saat berhenti hanya di-log
+    buffer.session_factory = _broken
+    buffer.seen(1, T2)
+    registered[0]()
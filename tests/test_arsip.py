@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+    Test arsip pengguna
+    ~~~~~~~~~
+
+    Pemindahan pengguna tidak aktif ke arsip dan kembali
+    (:mod:`CircleApp.users.arsip`), cek unik dan login yang membaca arsip,
+    ``include_archived`` di list dan DataTables, dan tugas lanjutan setelah
+    ``MAX_BATCHES``.
+
+    test_arsip.py
+"""
+import calendar
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy
+from pyramid.testing import DummyRequest
+from webob.multidict import MultiDict
+
+from CircleApp.datatables import DataTablesQuery
+from CircleApp.jobs import JobQueue
+from CircleApp.jsonapi import QueryBuilder
+from CircleApp.users import arsip
+from CircleApp.users.form import LoginForm, UserAddForm
+from CircleApp.users.model import Pengguna, Profile, pengguna_arsip, profile_arsip
+
+
+PASSWORD = 'rahasia'
+CUTOFF = datetime.datetime.utcnow() - datetime.timedelta(days=arsip.INACTIVE_DAYS)
+
+
+@pytest.fixture
+def engine(engine, pengguna):
+    """Empat pengguna; ``pengguna0`` dan ``pengguna2`` tidak aktif,
+    ``pengguna1`` lama tapi baru terlihat. ``pengguna0`` punya profile."""
+    old = CUTOFF - datetime.timedelta(days=30)
+    table = Pengguna.__table__
+    with engine.begin() as connection:
+        pengguna(connection, 4, password=PASSWORD, modified=old)
+        connection.execute(table.update().where(table.c.id == 4).values(
+            modified=datetime.datetime.utcnow()))
+        connection.execute(table.update().where(table.c.id == 2).values(
+            terlihat_terakhir=datetime.datetime.utcnow(), modified=old))
+        connection.execute(Profile.__table__.insert().values(
+            id=1, uid=uuid.uuid4(), user_id=1, nama_depan='nol', modified=old))
+    return engine
+
+
+@pytest.fixture
+def archived(engine):
+    assert arsip.arsipkan(engine, CUTOFF) == (2, None)
+    return engine
+
+
+def _ids(connection, table, column='id'):
+    return [row[0] for row in connection.execute(
+        sqlalchemy.select([table.c[column]]).order_by(table.c[column]))]
+
+
+def _request(session, **params):
+    request = DummyRequest(params=MultiDict(params))
+    request.db = session
+    request.find_model = lambda name: Pengguna
+    return request
+
+
+def test_arsipkan_dry_run(engine):
+    assert arsip.arsipkan(engine, CUTOFF, dry_run=True) == (2, None)
+    with engine.connect() as connection:
+        assert _ids(connection, Pengguna.__table__) == [1, 2, 3, 4]
+
+
+def test_arsipkan_pulihkan(archived, session):
+    with archived.connect() as connection:
+        assert _ids(connection, Pengguna.__table__) == [2, 4]
+        assert _ids(connection, pengguna_arsip) == [1, 3]
+        assert _ids(connection, profile_arsip, 'user_id') == [1]
+        assert _ids(connection, Profile.__table__) == []
+
+    before = datetime.datetime.utcnow().replace(microsecond=0)
+    user = Pengguna.restore(session, 1)
+    session.commit()
+    assert user.username == 'pengguna0' and not user.archived
+    # modified baru, jadi tidak langsung diarsipkan lagi
+    assert user.modified >= before
+    assert user.check_password(PASSWORD)
+    assert session.query(Profile.first_name).filter_by(user_id=1).scalar() == 'nol'
+    session.close()
+
+    with archived.connect() as connection:
+        assert _ids(connection, Pengguna.__table__) == [1, 2, 4]
+        assert _ids(connection, pengguna_arsip) == [3]
+        assert _ids(connection, profile_arsip, 'user_id') == []
+    assert arsip.arsipkan(archived, CUTOFF) == (0, None)
+
+
+def test_lookup_archived(archived, session):
+    user = Pengguna.get_by_username(session, 'pengguna0')
+    assert user.archived and user.id == 1
+    assert Pengguna.get_by_email(session, 'PENGGUNA2@circle.id').username == 'pengguna2'
+    assert Pengguna.get_by_username(session, 'tidak-ada') is None
+    # pencarian saja tidak memindahkan pengguna
+    assert session.query(Pengguna).get(1) is None
+
+
+@pytest.mark.parametrize('username, email', [
+    ('pengguna0', 'baru@circle.id'),
+    ('baru', 'pengguna0@circle.id'),
+])
+def test_register_taken_by_archived(archived, session, username, email):
+    form = UserAddForm(_request(
+        session, username=username, email=email,
+        password=PASSWORD, password_confirm=PASSWORD))
+    assert not form.validate()
+
+
+def test_login_restores_archived(archived, session):
+    form = LoginForm(_request(session, email_or_username='pengguna0', password=PASSWORD))
+    assert form.validate()
+    user = form.submit()
+    session.commit()
+    assert user.id == 1 and not user.archived
+    with archived.connect() as connection:
+        assert _ids(connection, pengguna_arsip) == [3]
+
+
+def test_login_wrong_password_stays_archived(archived, session):
+    form = LoginForm(_request(session, email_or_username='pengguna0', password='salah'))
+    assert form.validate()
+    assert form.submit() is None
+    session.commit()
+    with archived.connect() as connection:
+        assert _ids(connection, pengguna_arsip) == [1, 3]
+
+
+@pytest.mark.parametrize('include_archived, names', [
+    (False, ['pengguna1', 'pengguna3']),
+    (True, ['pengguna0', 'pengguna1', 'pengguna2', 'pengguna3']),
+])
+def test_list_include_archived(archived, session, include_archived, names):
+    builder = QueryBuilder(_request(session, sort='username'), Pengguna,
+                           include_archived=include_archived)
+    data, pagination = builder.get_collection_rows()
+    assert [row['username'] for row in data] == names
+    assert pagination['total'] == len(names)
+
+
+@pytest.mark.parametrize('include_archived, search, total, filtered', [
+    (False, '', 2, 2),
+    (False, 'pengguna0', 2, 0),
+    (True, '', 4, 4),
+    (True, 'pengguna0', 4, 1),
+    (True, 'pengguna', 4, 4),
+])
+def test_table_include_archived(archived, session, include_archived, search, total, filtered):
+    request = _request(session, **{
+        'columns[0][data]': 'username',
+        'search[value]': search,
+    })
+    response = DataTablesQuery(request, Pengguna, include_archived=include_archived).response()
+    assert (response['recordsTotal'], response['recordsFiltered']) == (total, filtered)
+
+
+def test_tugas_lanjutan(engine, tmp_path, monkeypatch):
+    path = str(tmp_path / 'jobs.db')
+    monkeypatch.setenv('JOBS_DATABASE', path)
+    monkeypatch.setattr(arsip, 'engine', lambda: engine)
+    monkeypatch.setattr(arsip, 'MAX_BATCHES', 1)
+    monkeypatch.setattr(arsip, 'PAUSE', 0)
+    cutoff = calendar.timegm(CUTOFF.utctimetuple())
+    queue = JobQueue(path)
+
+    arsip.arsipkan_tugas({'cutoff': cutoff, 'batch_size': 1, 'after_id': 0})
+    (_, name, payload, _), = queue.claim('test')
+    assert name == arsip.TASK
+    # lanjut dari id terakhir dengan cutoff yang sama
+    assert payload == {'cutoff': cutoff, 'batch_size': 1, 'after_id': 1}
+
+    arsip.arsipkan_tugas(payload)
+    (_, _, payload, _), = queue.claim('test')
+    assert payload['after_id'] == 3
+
+    # batch terakhir kurang dari batch_size, tidak ada lanjutan
+    arsip.arsipkan_tugas(payload)
+    assert queue.claim('test') == []
+    with engine.connect() as connection:
+        assert _ids(connection, pengguna_arsip) == [1, 3]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    Test assets
+    ~~~~~~~~~
+
+    Environment webassets :mod:`CircleApp.assets` yang dibuat saat pertama
+    dipakai, dan versi baka_armor yang disalin.
+
+    test_assets.py
+"""
+import baka_armor
+import pytest
+import yaml
+from pyramid import testing
+from pyramid.path import AssetResolver
+
+from CircleApp import assets
+
+
+@pytest.fixture
+def config():
+    path = AssetResolver().resolve('CircleApp:config/config.yaml').abspath()
+    with open(path) as f:
+        armor = yaml.safe_load(f)['armor']
+    config = testing.setUp(settings={'package': 'CircleApp', 'armor': armor})
+    yield config
+    testing.tearDown()
+
+
+def test_baka_armor_version():
+    # includeme disalin dari versi ini, cocokkan ulang saat upgrade
+    assert baka_armor.__version__ == assets.BAKA_ARMOR_VERSION
+
+
+def test_environment_lazy(config):
+    config.include(assets)
+    config.commit()
+    assert 'web_env' not in config.registry
+
+    env = assets.get_environment(config.registry)
+    assert isinstance(env, baka_armor.Environment)
+    assert sorted(env._named_bundles) == ['css-vendor', 'js-vendor']
+    assert assets.get_environment(config.registry) is env
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+    Test bulk update pengguna
+    ~~~~~~~~~
+
+    Allowlist ``__bulk_update__`` di
+    :meth:`CircleApp.jsonapi.QueryBuilder.bulk_update` dan principal admin
+    untuk ``PATCH``/``DELETE /users/list``, kolom izin yang privat.
+
+    test_bulk.py
+"""
+import pytest
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.testing import DummyRequest
+from webob.multidict import MultiDict
+
+from CircleApp import auth
+from CircleApp.jsonapi import QueryBuilder
+from CircleApp.users.model import Pengguna, Profile
+from CircleApp.utils import model_fields
+
+
+@pytest.fixture
+def session(session, pengguna):
+    """Tiga pengguna, ``pengguna0`` admin."""
+    table = Pengguna.__table__
+    pengguna(session.connection(), 3)
+    session.execute(table.update().where(table.c.id == 1).values(admin_pengguna=True))
+    session.commit()
+    return session
+
+
+def _builder(session, **params):
+    params.setdefault('filter[username:like]', 'pengguna%')
+    request = DummyRequest(params=MultiDict(params))
+    request.db = session
+    builder = QueryBuilder(request, Pengguna)
+    builder.get_fields(None)
+    return builder
+
+
+def test_bulk_update_fields():
+    assert Pengguna.__bulk_update__ == ('active',)
+    assert not hasattr(Profile, '__bulk_update__')
+
+
+def test_bulk_update_requires_filter(session):
+    request = DummyRequest(params=MultiDict())
+    request.db = session
+    builder = QueryBuilder(request, Pengguna)
+    builder.get_fields(None)
+    with pytest.raises(HTTPBadRequest):
+        builder.bulk_update({'active': False})
+
+
+def test_bulk_update_allowed(session):
+    builder = _builder(session, **{'filter[username:eq]': 'pengguna1'})
+    assert builder.bulk_update({'active': False}) == 1
+    assert [u.username for u in session.query(Pengguna).filter_by(active=False)] == ['pengguna1']
+
+
+def test_bulk_update_dry_run(session):
+    builder = _builder(session)
+    assert builder.bulk_update({'active': False}, dry_run=True) == 3
+    assert session.query(Pengguna).filter_by(active=False).count() == 0
+
+
+@pytest.mark.parametrize('values', [
+    {},
+    {'is_admin': True},
+    {'email': 'x@circle.id'},
+    {'permissions_version': 0},
+    {'_password': 'rahasia'},
+    {'password': 'rahasia'},
+    {'active': False, 'is_admin': True},
+])
+def test_bulk_update_rejects_fields(session, values):
+    with pytest.raises(HTTPBadRequest):
+        _builder(session).bulk_update(values)
+    assert session.query(Pengguna).filter_by(is_admin=True).count() == 1
+
+
+@pytest.mark.parametrize('value', [None, 'no', 0])
+def test_bulk_update_rejects_values(session, value):
+    with pytest.raises(HTTPBadRequest):
+        _builder(session).bulk_update({'active': value})
+
+
+@pytest.mark.parametrize('key', ['is_admin', 'active', 'permissions_version'])
+def test_private_fields(session, key):
+    assert key not in model_fields(Pengguna)
+    assert key not in _builder(session).get_collection_rows()[0][0]
+    for param in ('sort', 'filter[{}:eq]'.format(key)):
+        with pytest.raises(HTTPBadRequest):
+            _builder(session, **{param: key}).get_collection_rows()
+
+
+def test_bulk_update_without_allowlist(session):
+    request = DummyRequest(params=MultiDict({'filter[first_name:eq]': 'x'}))
+    request.db = session
+    builder = QueryBuilder(request, Profile)
+    builder.get_fields(None)
+    with pytest.raises(HTTPBadRequest):
+        builder.bulk_update({'first_name': 'x'})
+
+
+def test_groupfinder(session):
+    request = DummyRequest()
+    request.db = session
+    admin, user = [session.query(Pengguna).filter_by(username=name).one().id
+                   for name in ('pengguna0', 'pengguna1')]
+    assert auth.groupfinder(admin, request) == [auth.ADMIN]
+    assert auth.groupfinder(user, request) == []
+    assert auth.groupfinder(999, request) is None
+
+    _builder(session, **{'filter[username:eq]': 'pengguna0'}).bulk_update({'active': False})
+    assert auth.groupfinder(admin, request) is None
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+    Test antrian tugas
+    ~~~~~~~~~
+
+    Retry dengan backoff di :mod:`CircleApp.jobs` dan hasil per email dari
+    :func:`CircleApp.mail.send_batch`.
+
+    test_jobs.py
+"""
+import smtplib
+import time
+
+import pytest
+
+from CircleApp import jobs, mail
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobs.JobQueue(str(tmp_path / 'jobs.db'))
+
+
+def _rows(queue):
+    return queue.conn.execute(
+        'SELECT id, status, percobaan, jadwal, kesalahan FROM antrian_tugas ORDER BY id'
+    ).fetchall()
+
+
+def _run(queue):
+    jobs.run_jobs(queue, queue.claim('test'))
+
+
+def test_fail_backoff(queue):
+    job_id = queue.enqueue('tes')
+    for attempts in range(jobs.MAX_ATTEMPTS - 1):
+        before = time.time()
+        queue.fail(job_id, attempts, ValueError('x'))
+        _, status, percobaan, jadwal, kesalahan = _rows(queue)[0]
+        assert (status, percobaan, kesalahan) == ('antri', attempts + 1, "ValueError('x')")
+        delay = jobs.BACKOFF * 2 ** attempts
+        assert before + delay <= jadwal <= time.time() + delay
+
+
+def test_fail_max_attempts(queue):
+    job_id = queue.enqueue('tes')
+    queue.fail(job_id, jobs.MAX_ATTEMPTS - 1, ValueError('x'))
+    assert _rows(queue)[0][1:3] == ('gagal', jobs.MAX_ATTEMPTS)
+    assert queue.claim('test') == []
+
+
+def test_run_jobs_retry(queue, monkeypatch):
+    calls = []
+
+    def handler(payload):
+        calls.append(payload['i'])
+        if payload['i'] == 1:
+            raise ValueError('gagal')
+
+    monkeypatch.setitem(jobs.TASKS, 'tes', (handler, False))
+    for i in range(3):
+        queue.enqueue('tes', {'i': i})
+    _run(queue)
+
+    assert calls == [0, 1, 2]
+    assert [row[1:3] for row in _rows(queue)] == [('selesai', 0), ('antri', 1), ('selesai', 0)]
+    # belum waktunya diulang
+    assert queue.claim('test') == []
+
+
+def test_run_jobs_batch_partial(queue, monkeypatch):
+    def handler(payloads):
+        return [ValueError('x') if p['i'] == 1 else None for p in payloads]
+
+    monkeypatch.setitem(jobs.TASKS, 'tes', (handler, True))
+    for i in range(3):
+        queue.enqueue('tes', {'i': i})
+    _run(queue)
+
+    assert [row[1] for row in _rows(queue)] == ['selesai', 'antri', 'selesai']
+
+
+@pytest.mark.parametrize('result', [[None], [], None])
+def test_run_jobs_batch_missing_results(queue, monkeypatch, result):
+    monkeypatch.setitem(jobs.TASKS, 'tes', (lambda payloads: result, True))
+    for i in range(3):
+        queue.enqueue('tes', {'i': i})
+    _run(queue)
+
+    done = len(result or ())
+    rows = _rows(queue)
+    assert [row[1] for row in rows] == ['selesai'] * done + ['antri'] * (3 - done)
+    assert all(row[4].startswith('RuntimeError(') for row in rows[done:])
+
+
+def test_run_jobs_batch_raises(queue, monkeypatch):
+    def handler(payloads):
+        raise ValueError('x')
+
+    monkeypatch.setitem(jobs.TASKS, 'tes', (handler, True))
+    for i in range(2):
+        queue.enqueue('tes', {'i': i})
+    _run(queue)
+
+    assert [row[1:3] for row in _rows(queue)] == [('antri', 1), ('antri', 1)]
+
+
+def test_run_jobs_unknown_task(queue):
+    queue.enqueue('tidak-ada')
+    _run(queue)
+
+    _, status, percobaan, _, kesalahan = _rows(queue)[0]
+    assert (status, percobaan) == ('antri', 1)
+    assert kesalahan.startswith('LookupError(')
+
+
+class _SMTP(mail.DummySMTP):
+
+    def send_message(self, message):
+        if message['To'] == 'putus@circle.id':
+            raise smtplib.SMTPServerDisconnected('putus')
+        if message['To'] == 'tolak@circle.id':
+            raise smtplib.SMTPRecipientsRefused({})
+        super(_SMTP, self).send_message(message)
+
+    def quit(self):
+        raise smtplib.SMTPServerDisconnected('quit')
+
+
+def _email(to):
+    return {'to': to, 'subject': 'tes', 'body': 'tes'}
+
+
+def test_send_batch_per_message(monkeypatch):
+    connections = []
+
+    def connect(settings):
+        connections.append(settings)
+        return _SMTP()
+
+    monkeypatch.setattr(mail, 'connect', connect)
+    errors = mail.send_batch([
+        _email('a@circle.id'),
+        {'to': 'b@circle.id'},
+        _email('tolak@circle.id'),
+        _email('putus@circle.id'),
+        _email('c@circle.id'),
+    ])
+
+    assert errors[0] is None
+    assert isinstance(errors[1], KeyError)
+    assert isinstance(errors[2], smtplib.SMTPRecipientsRefused)
+    assert isinstance(errors[3], smtplib.SMTPServerDisconnected)
+    assert errors[4] is None
+    # koneksi dibuka lagi setelah putus
+    assert len(connections) == 2
+
+
+def test_send_batch_connect_failed(monkeypatch):
+    def connect(settings):
+        raise ConnectionRefusedError('tolak')
+
+    monkeypatch.setattr(mail, 'connect', connect)
+    errors = mail.send_batch([_email('a@circle.id'), _email('b@circle.id')])
+    assert len(errors) == 2
+    assert all(isinstance(e, ConnectionRefusedError) for e in errors)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+    Test migrasi
+    ~~~~~~~~~
+
+    Migrasi ``profile_user_id_unique`` (hapus profile duplikat lalu buat
+    unique index untuk :meth:`CircleApp.users.model.Profile.upsert`) dan
+    ``upgrade`` yang idempotent, dan rollup pendaftaran yang diisi saat
+    tabelnya dibuat.
+
+    test_migrations.py
+"""
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy
+from baka_tenshi import Model
+from sqlalchemy.orm import sessionmaker
+
+from CircleApp import migrations
+from CircleApp.users.model import Pengguna, Profile, RekapPendaftaran
+
+
+@pytest.fixture
+def duplicates(engine, pengguna):
+    """Database lama: tanpa unique index, pengguna 1 punya tiga profile
+    dan pengguna 2 satu."""
+    with engine.begin() as connection:
+        connection.execute('DROP INDEX uq_profile_user_id')
+        pengguna(connection, 2)
+        now = datetime.datetime.utcnow()
+        connection.execute(Profile.__table__.insert(), [{
+            'id': id_,
+            'uid': uuid.uuid4(),
+            'user_id': user_id,
+            'nama_depan': name,
+            'modified': now - datetime.timedelta(days=days),
+        } for id_, user_id, name, days in (
+            (1, 1, 'lama', 3),
+            (2, 1, 'baru', 1),
+            (3, 1, 'tengah', 2),
+            (4, 2, 'satu', 5),
+        )])
+    return engine
+
+
+def _profiles(connection):
+    table = Profile.__table__
+    return connection.execute(
+        sqlalchemy.select([table.c.user_id, table.c.nama_depan]).order_by(table.c.user_id)
+    ).fetchall()
+
+
+def _has_index(connection):
+    return migrations._has_index(connection, 'profile', 'uq_profile_user_id')
+
+
+def test_profile_user_id_unique_dry_run(duplicates):
+    with duplicates.begin() as connection:
+        assert migrations.profile_user_id_unique(connection, dry_run=True) == 2
+        assert len(_profiles(connection)) == 4
+        assert not _has_index(connection)
+
+
+def test_profile_user_id_unique(duplicates):
+    with duplicates.begin() as connection:
+        assert migrations.profile_user_id_unique(connection) == 2
+        assert [tuple(row) for row in _profiles(connection)] == [(1, 'baru'), (2, 'satu')]
+        assert _has_index(connection)
+        # sudah dimigrasi
+        assert migrations.profile_user_id_unique(connection) == 0
+
+
+def test_profile_user_id_unique_rejects_duplicates(duplicates):
+    with duplicates.begin() as connection:
+        migrations.profile_user_id_unique(connection)
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        duplicates.execute(Profile.__table__.insert().values(uid=uuid.uuid4(), user_id=1))
+
+
+def test_profile_upsert_after_migration(duplicates):
+    with duplicates.begin() as connection:
+        migrations.profile_user_id_unique(connection)
+        uid = connection.execute(
+            sqlalchemy.select([Pengguna.__table__.c.uid]).where(Pengguna.__table__.c.id == 1)
+        ).scalar()
+
+    session = sessionmaker(bind=duplicates)()
+    assert Profile.upsert(session, uid, {'first_name': 'upsert'}) == 1
+    assert Profile.upsert(session, uuid.uuid4(), {'first_name': 'tidak ada'}) == 0
+    session.commit()
+
+    with duplicates.connect() as connection:
+        assert [tuple(row) for row in _profiles(connection)] == [(1, 'upsert'), (2, 'satu')]
+
+
+def test_upgrade_idempotent(pengguna):
+    engine = sqlalchemy.create_engine('sqlite://')
+    with engine.begin() as connection:
+        Pengguna.__table__.create(connection)
+        pengguna(connection, 2)
+    with engine.begin() as connection:
+        first = dict(migrations.upgrade(connection))
+    assert first['tabel_baru'] == len(Model.metadata.tables) - 1
+    with engine.begin() as connection:
+        assert all(rows == 0 for _, rows in migrations.upgrade(connection))
+        assert _has_index(connection)
+        # rollup diisi dari pengguna yang sudah ada
+        assert connection.execute('SELECT sum(jumlah) FROM rekap_pendaftaran').scalar() == 2
+
+
+def test_create_all_fills_rekap(pengguna):
+    # mode development: create_all tanpa migrasi
+    engine = sqlalchemy.create_engine('sqlite://')
+    with engine.begin() as connection:
+        Pengguna.__table__.create(connection)
+        pengguna(connection, 3)
+    Model.metadata.create_all(engine)
+    with engine.connect() as connection:
+        assert connection.execute('SELECT sum(jumlah) FROM rekap_pendaftaran').scalar() == 3
+        # create_all berikutnya tidak membuat tabel, rollup tidak dihitung ulang
+        connection.execute(RekapPendaftaran.__table__.delete())
+        Model.metadata.create_all(connection)
+        assert connection.execute('SELECT count(*) FROM rekap_pendaftaran').scalar() == 0
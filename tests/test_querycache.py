@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+    Test query cache
+    ~~~~~~~~~
+
+    LRU dan TTL :class:`CircleApp.querycache.QueryCache`, versi tabel yang
+    naik dari event ``Session``, dan ``/_status/query_cache`` yang hanya
+    untuk admin.
+
+    test_querycache.py
+"""
+import pytest
+from pyramid import testing
+
+from CircleApp import querycache
+from CircleApp.users.model import Pengguna
+
+
+class _Clock(object):
+    """Pengganti modul ``time`` di :mod:`CircleApp.querycache`."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(querycache, 'time', clock)
+    return clock
+
+
+@pytest.fixture(scope='module')
+def cache():
+    # listener Session global, cukup didaftarkan sekali
+    cache = querycache.QueryCache()
+    querycache.track_flushes(cache)
+    return cache
+
+
+def test_lru_eviction():
+    cache = querycache.QueryCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['entries'] == 2
+
+
+def test_ttl(clock):
+    cache = querycache.QueryCache(ttl=30)
+    cache.set('a', 1)
+    clock.now += 30
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_ttl_disabled(clock):
+    cache = querycache.QueryCache(ttl=0)
+    cache.set('a', 1)
+    clock.now += 10 ** 6
+    assert cache.get('a') == 1
+
+
+def test_get_or_set():
+    cache = querycache.QueryCache()
+    calls = []
+
+    def create():
+        calls.append(1)
+        return [len(calls)]
+
+    assert cache.get_or_set('a', create) == [1]
+    assert cache.get_or_set('a', create) == [1]
+    assert len(calls) == 1
+
+
+def test_flush_commit_bump(cache, session):
+    before = cache.version('pengguna')[0]
+    user = Pengguna()
+    user.username = 'budi'
+    user.email = 'budi@circle.id'
+    user.password = 'rahasia'
+    session.add(user)
+    session.flush()
+    assert cache.version('pengguna') == (before + 1,)
+    session.commit()
+    # sekali lagi saat commit
+    assert cache.version('pengguna') == (before + 2,)
+
+
+def test_bulk_rollback_bump(cache, session):
+    before = cache.version('pengguna')[0]
+    session.query(Pengguna).filter(Pengguna.id == 0).update(
+        {'active': False}, synchronize_session=False)
+    assert cache.version('pengguna') == (before + 1,)
+    session.rollback()
+    assert cache.version('pengguna') == (before + 2,)
+
+
+def test_stats_versions_str(cache, session):
+    cache.bump(Pengguna.__table__.name)
+    assert all(type(key) is str for key in cache.stats()['versions'])
+
+
+def test_status_admin_only():
+    config = testing.setUp(settings={'query_cache': {'enabled': False}})
+    try:
+        config.include(querycache)
+        config.commit()
+        introspector = config.registry.introspector
+        view, = [
+            item['introspectable'] for item in introspector.get_category('views')
+            if item['introspectable']['route_name'] == 'status_query_cache'
+        ]
+        permissions = [item['value'] for item in introspector.related(view)
+                       if item.category_name == 'permissions']
+        assert permissions == ['admin']
+    finally:
+        testing.tearDown()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+    Test template cache
+    ~~~~~~~~~
+
+    ``filesystem_checks`` di :func:`CircleApp.templating.configure_lookup`
+    mengikuti mode startup.
+
+    test_templating.py
+"""
+import pytest
+from pyramid.registry import Registry
+
+from CircleApp import templating
+
+
+class _Lookup(object):
+
+    def __init__(self):
+        self.template_args = {}
+        self.filesystem_checks = None
+
+
+@pytest.mark.parametrize('mode, configured, expected', [
+    ('development', None, True),
+    ('development', False, False),
+    ('production', None, False),
+    ('production', True, False),
+])
+def test_filesystem_checks(mode, configured, expected):
+    registry = Registry()
+    templates = {} if configured is None else {'filesystem_checks': configured}
+    registry.settings = {'startup': {'mode': mode}, 'templates': templates}
+    lookup = _Lookup()
+    templating.configure_lookup(registry, lookup)
+    assert lookup.filesystem_checks is expected
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+    Test token login
+    ~~~~~~~~~
+
+    Tanda tangan dan verifikasi :mod:`CircleApp.tokens`, secret dari
+    environment, pencabutan token di :mod:`CircleApp.auth`, dan cookie
+    session mode ``session``.
+
+    test_tokens.py
+"""
+import datetime
+import os
+
+import pytest
+import sqlalchemy
+from pyramid import testing
+from pyramid.exceptions import ConfigurationError
+from pyramid.interfaces import ISessionFactory
+from pyramid.response import Response
+from pyramid.session import JSONSerializer, SignedCookieSessionFactory
+from pyramid.testing import DummyRequest
+from sqlalchemy.orm import sessionmaker
+
+from CircleApp import auth, tokens
+
+
+SECRET = 'x' * 32
+
+
+@pytest.fixture
+def session_factory():
+    engine = sqlalchemy.create_engine('sqlite://')
+    auth.PencabutanSesi.__table__.create(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def revocations(session_factory):
+    revocations = auth.Revocations(session_factory)
+    # tanpa thread sync background
+    revocations._pid = os.getpid()
+    return revocations
+
+
+def test_sign_unsign():
+    token = tokens.sign({'sub': 1}, SECRET, 'login', 60)
+    payload = tokens.unsign(token, SECRET, 'login')
+    assert payload['sub'] == 1
+    assert payload['exp'] > 0
+
+
+@pytest.mark.parametrize('secret, purpose', [
+    ('y' * 32, 'login'),
+    (tokens.DEFAULT_SECRET, 'login'),
+    (SECRET, 'reset-kunci'),
+])
+def test_unsign_other_secret_or_purpose(secret, purpose):
+    token = tokens.sign({'sub': 1}, SECRET, 'login', 60)
+    assert tokens.unsign(token, secret, purpose) is None
+
+
+def test_unsign_expired():
+    token = tokens.sign({'sub': 1}, SECRET, 'login', -1)
+    assert tokens.unsign(token, SECRET, 'login') is None
+
+
+@pytest.mark.parametrize('token', ['', 'abc', 'a.b.c', '!!!.???'])
+def test_unsign_malformed(token):
+    assert tokens.unsign(token, SECRET, 'login') is None
+
+
+def test_unsign_tampered():
+    token = tokens.sign({'sub': 1}, SECRET, 'login', 60)
+    sig = token.split('.')[1]
+    forged = tokens.sign({'sub': 2}, SECRET, 'login', 60).split('.')[0]
+    assert tokens.unsign('{}.{}'.format(forged, sig), SECRET, 'login') is None
+
+
+@pytest.mark.parametrize('secret', [None, '', tokens.DEFAULT_SECRET, 'pendek'])
+def test_configured_secret_rejected(secret):
+    with pytest.raises(ConfigurationError):
+        tokens.configured_secret({'auth.secret': secret}, 'auth.secret', 'AUTH_SECRET')
+
+
+def test_configured_secret():
+    settings = {'auth.secret': SECRET}
+    assert tokens.configured_secret(settings, 'auth.secret', 'AUTH_SECRET') == SECRET
+
+
+def test_revoked_jti(revocations):
+    expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    revocations.add([{'jti': 'a' * 32, 'kedaluwarsa': expires}])
+    assert revocations.revoked({'sub': 1, 'pv': 0, 'jti': 'a' * 32})
+    assert not revocations.revoked({'sub': 1, 'pv': 0, 'jti': 'b' * 32})
+
+
+def test_revoked_permissions_version(revocations):
+    expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    revocations.add([{'user_id': 1, 'versi': 2, 'kedaluwarsa': expires}])
+    assert revocations.revoked({'sub': 1, 'pv': 1, 'jti': 'a' * 32})
+    assert not revocations.revoked({'sub': 1, 'pv': 2, 'jti': 'a' * 32})
+    assert not revocations.revoked({'sub': 2, 'pv': 0, 'jti': 'a' * 32})
+
+
+def test_sync_loads_and_purges(session_factory, revocations):
+    now = datetime.datetime.utcnow()
+    session = session_factory()
+    session.execute(auth.PencabutanSesi.__table__.insert(), [
+        {'jti': 'a' * 32, 'kedaluwarsa': now + datetime.timedelta(hours=1)},
+        {'jti': 'b' * 32, 'kedaluwarsa': now - datetime.timedelta(hours=1)},
+    ])
+    session.commit()
+
+    revocations.sync()
+
+    assert revocations.revoked({'sub': 1, 'jti': 'a' * 32})
+    assert not revocations.revoked({'sub': 1, 'jti': 'b' * 32})
+    assert session.query(auth.PencabutanSesi).count() == 1
+
+
+def _login_request(policy, **kw):
+    headers = dict(policy.remember(DummyRequest(), 1, **kw))
+    token = headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+    return DummyRequest(cookies={auth.COOKIE: token})
+
+
+def test_policy_remember(revocations):
+    policy = auth.TokenAuthenticationPolicy(SECRET, revocations)
+    assert policy.unauthenticated_userid(_login_request(policy)) == 1
+
+
+def test_policy_rejects_default_secret_token(revocations):
+    policy = auth.TokenAuthenticationPolicy(SECRET, revocations)
+    forged = auth.TokenAuthenticationPolicy(tokens.DEFAULT_SECRET, revocations)
+    assert policy.unauthenticated_userid(_login_request(forged)) is None
+
+
+def test_policy_revoked_version(revocations):
+    policy = auth.TokenAuthenticationPolicy(SECRET, revocations)
+    request = _login_request(policy, permissions_version=0)
+    revocations.add([{
+        'user_id': 1, 'versi': 1,
+        'kedaluwarsa': datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+    }])
+    assert policy.unauthenticated_userid(request) is None
+
+
+def test_policy_forget_revokes_jti(session_factory, revocations):
+    policy = auth.TokenAuthenticationPolicy(SECRET, revocations)
+    request = _login_request(policy)
+    request.db = session_factory()
+    policy.forget(request)
+    rows = request.db.info.pop('revocations')
+    request.db.commit()
+
+    assert request.db.query(auth.PencabutanSesi.jti).scalar() == policy.payload(request)['jti']
+    revocations.add(rows)
+    assert policy.unauthenticated_userid(DummyRequest(cookies=request.cookies)) is None
+
+
+@pytest.fixture
+def session_mode():
+    """Include :mod:`CircleApp.auth` mode ``session`` dengan ``settings``."""
+    def include(**settings):
+        config = testing.setUp(settings=dict(settings, auth={'mode': 'session'}))
+        config.include(auth)
+        config.commit()
+        return config.registry.getUtility(ISessionFactory)
+    yield include
+    testing.tearDown()
+
+
+def _cookie(factory, **values):
+    request = DummyRequest()
+    request.response = Response()
+    session = factory(request)
+    session.update(values)
+    session._set_cookie(request.response)
+    return request.response.headers['Set-Cookie']
+
+
+def _load(factory, cookie):
+    return factory(DummyRequest(cookies={'session': cookie.split(';')[0].split('=', 1)[1]}))
+
+
+@pytest.mark.parametrize('secret', [None, tokens.DEFAULT_SECRET])
+def test_session_mode_requires_secret(session_mode, secret):
+    with pytest.raises(ConfigurationError):
+        session_mode(**{'session.secret': secret})
+
+
+def test_session_mode_cookie(session_mode):
+    factory = session_mode(**{'session.secret': SECRET})
+    cookie = _cookie(factory, **{'auth.userid': 1})
+    assert 'HttpOnly' in cookie and 'SameSite=Lax' in cookie
+    assert _load(factory, cookie)['auth.userid'] == 1
+
+
+def test_session_mode_rejects_default_secret_cookie(session_mode):
+    factory = session_mode(**{'session.secret': SECRET})
+    forged = SignedCookieSessionFactory(tokens.DEFAULT_SECRET, serializer=JSONSerializer())
+    assert 'auth.userid' not in _load(factory, _cookie(forged, **{'auth.userid': 1}))
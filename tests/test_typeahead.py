@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    Test typeahead pengguna
+    ~~~~~~~~~
+
+    Pencarian prefix :class:`CircleApp.users.typeahead.PrefixIndex` dan
+    hasilnya yang tanpa email.
+
+    test_typeahead.py
+"""
+import uuid
+
+from CircleApp.users import typeahead
+
+
+def _index():
+    index = typeahead.PrefixIndex()
+    index.load([
+        (1, uuid.UUID(int=1), 'budi', 'budi@circle.id'),
+        (2, uuid.UUID(int=2), 'Budiman', 'bm@circle.id'),
+        (3, uuid.UUID(int=3), 'ani', 'budi.ani@circle.id'),
+    ])
+    return index
+
+
+def test_search_prefix():
+    assert [e['username'] for e in _index().search('BUD')] == ['budi', 'ani', 'Budiman']
+    assert _index().search('') == []
+    assert _index().search('bud', limit=1) == [{'uid': str(uuid.UUID(int=1)), 'username': 'budi'}]
+
+
+def test_search_hides_email():
+    result = _index().search('bm@')
+    assert result == [{'uid': str(uuid.UUID(int=2)), 'username': 'Budiman'}]
+
+
+def test_add_remove():
+    index = _index()
+    index.add(2, uuid.UUID(int=2), 'citra', 'citra@circle.id')
+    assert [e['username'] for e in index.search('bud')] == ['budi', 'ani']
+    index.remove(1)
+    assert [e['username'] for e in index.search('bud')] == ['ani']
+    assert len(index) == 2